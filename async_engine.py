@@ -0,0 +1,157 @@
+"""
+Асинхронный интерфейс StegoGhost
+Внедрение и извлечение для asyncio-сервисов без блокировки цикла событий
+"""
+
+import asyncio
+import inspect
+import io
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Union
+
+from PIL import Image
+
+from stego_engine import CapacityReport, ImageSource, StegoEngine
+from crypto_module import CryptoModule
+
+# Изображение для асинхронных вызовов: байты, файлоподобный объект
+# (в том числе с асинхронным read) или любой источник StegoEngine
+AsyncImageSource = Union[bytes, bytearray, memoryview, io.IOBase, ImageSource]
+
+
+class AsyncStegoEngine:
+    """
+    Асинхронная обертка над StegoEngine и CryptoModule
+
+    Вся работа с пикселями, PBKDF2 и кодирование PNG выполняются в пуле
+    потоков, одновременно не больше max_concurrency операций. Вызываются
+    те же методы синхронного движка, поэтому результаты совпадают.
+    """
+
+    def __init__(self, engine: Optional[StegoEngine] = None, crypto: Optional[CryptoModule] = None,
+                 max_concurrency: Optional[int] = None, executor: Optional[Executor] = None):
+        """
+        Args:
+            engine: Настроенный движок (по умолчанию - новый StegoEngine)
+            crypto: Криптомодуль (по умолчанию - новый с кэшем ключей)
+            max_concurrency: Максимум одновременных операций (по умолчанию - число CPU)
+            executor: Пул для вычислений (по умолчанию - собственный пул потоков)
+        """
+        self.engine = engine or StegoEngine()
+        if crypto is None:
+            crypto = CryptoModule()
+            crypto.enable_key_cache()
+        self.crypto = crypto
+        self.max_concurrency = max(1, max_concurrency or os.cpu_count() or 1)
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                       thread_name_prefix='stegoghost')
+        self._semaphore = None
+
+    async def _run(self, func, *args):
+        """Выполняет функцию в пуле с ограничением одновременности"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def _resolve(self, image: AsyncImageSource) -> ImageSource:
+        """Приводит байты и потоки к источнику, понятному StegoEngine"""
+        read = getattr(image, 'read', None)
+        if read is not None and inspect.iscoroutinefunction(read):
+            image = await read()
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image = io.BytesIO(image)
+        if isinstance(image, io.IOBase) or hasattr(image, 'read'):
+            # Декодирование откладывается до пула: Image.open читает только заголовок
+            image = Image.open(image)
+        return image
+
+    # Тонкие обертки над синхронным API
+
+    async def embed_data(self, image: AsyncImageSource, data: bytes, password: str) -> Image.Image:
+        """Асинхронный StegoEngine.embed_data"""
+        return await self._run(self.engine.embed_data, await self._resolve(image), data, password)
+
+    async def extract_data(self, image: AsyncImageSource, password: str) -> Optional[bytes]:
+        """Асинхронный StegoEngine.extract_data"""
+        return await self._run(self.engine.extract_data, await self._resolve(image), password)
+
+    async def encrypt(self, plaintext: Union[str, bytes], password: str) -> bytes:
+        """Асинхронный CryptoModule.encrypt"""
+        return await self._run(self.crypto.encrypt, plaintext, password)
+
+    async def decrypt(self, encrypted_data: bytes, password: str) -> Optional[str]:
+        """Асинхронный CryptoModule.decrypt"""
+        return await self._run(self.crypto.decrypt, encrypted_data, password)
+
+    # Операции целиком
+
+    async def capacity(self, image: AsyncImageSource) -> CapacityReport:
+        """
+        Отчет о вместимости (по заголовку изображения, без декодирования пикселей)
+        """
+        overhead = self.crypto.get_encrypted_size(0)
+        return await self._run(self.engine.analyze_capacity, await self._resolve(image), overhead)
+
+    async def hide(self, image: AsyncImageSource, message: Union[str, bytes], password: str) -> bytes:
+        """
+        Шифрует сообщение и внедряет его в изображение
+
+        Args:
+            image: Байты изображения, поток или источник StegoEngine
+            message: Сообщение (строка или байты)
+            password: Пароль
+
+        Returns:
+            Байты PNG с внедренным сообщением
+        """
+        return await self._run(self._hide, await self._resolve(image), message, password)
+
+    def _hide(self, image: ImageSource, message: Union[str, bytes], password: str) -> bytes:
+        plaintext = message.encode() if isinstance(message, str) else message
+        report = self.engine.analyze_capacity(image)
+        encrypted_size = self.crypto.get_encrypted_size(len(plaintext))
+        if not report.fits(encrypted_size):
+            raise ValueError(f"Недостаточная вместимость: {encrypted_size} > {report.capacity} байт")
+
+        encrypted_data = self.crypto.encrypt(message, password)
+        output = io.BytesIO()
+        self.engine.save_png(self.engine.embed(image, encrypted_data, password), output)
+        return output.getvalue()
+
+    async def extract(self, image: AsyncImageSource, password: str, binary: bool = False) -> Union[str, bytes, None]:
+        """
+        Извлекает и расшифровывает сообщение
+
+        Args:
+            image: Байты изображения, поток или источник StegoEngine
+            password: Пароль
+            binary: Вернуть байты вместо строки
+
+        Returns:
+            Сообщение или None, если оно не найдено или не расшифровано
+        """
+        return await self._run(self._extract, await self._resolve(image), password, binary)
+
+    def _extract(self, image: ImageSource, password: str, binary: bool) -> Union[str, bytes, None]:
+        encrypted_data = self.engine.extract_data(image, password)
+        if not encrypted_data:
+            return None
+        if binary:
+            return self.crypto.decrypt_bytes(encrypted_data, password)
+        return self.crypto.decrypt(encrypted_data, password)
+
+    async def close(self):
+        """Останавливает собственный пул потоков"""
+        if self._owns_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -0,0 +1,393 @@
+"""
+Пакетная обработка StegoGhost
+Параллельное скрытие и извлечение на пуле процессов с ограничением нагрузки
+"""
+
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from PIL import Image
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from stego_engine import StegoEngine
+from stego_image import StegoImage
+from crypto_module import CryptoModule, CryptoSession, DEFAULT_CHUNK_SIZE
+
+
+# Атрибуты StegoEngine, которые передаются в рабочие процессы
+ENGINE_SETTINGS = ('format_version', 'bits_per_channel', 'channels', 'legacy_fallback',
+                   'tile_size', 'tile_workers',
+                   'png_compress_level', 'png_compress_type', 'png_optimize')
+
+
+@dataclass
+class BatchJob:
+    """Задача пакетной обработки одного изображения"""
+    kind: str  # 'hide', 'extract' или 'capacity'
+    image_path: str
+    message: Optional[str] = None  # Сообщение для 'hide'
+    output_path: Optional[str] = None  # Куда сохранить результат
+    payload_path: Optional[str] = None  # Файл произвольного размера для потокового 'hide'
+    binary: bool = False  # Потоковое 'extract' в двоичный файл
+
+
+@dataclass
+class BatchResult:
+    """Результат задачи: статус, данные и ошибка (если была)"""
+    job: BatchJob
+    status: str  # 'ok', 'not_found' или 'error'
+    data: dict = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 'ok'
+
+    def to_record(self) -> dict:
+        """Преобразует результат в запись для JSON Lines"""
+        record = {'input': self.job.image_path, 'status': self.status}
+        record.update(self.data)
+        if self.error is not None:
+            record['error'] = self.error
+        return record
+
+
+def hide_file(engine: StegoEngine, crypto: CryptoModule, image_path: str, message: str,
+              password: str, output_path: str, session: Optional[CryptoSession] = None) -> dict:
+    """
+    Скрывает сообщение в одном изображении и сохраняет результат как PNG
+
+    Если передана сессия шифрования, используется ее ключ (без PBKDF2).
+    """
+    image, data = embed_message(engine, crypto, image_path, message, password, output_path, session)
+    engine.save_png(image, output_path)
+    return data
+
+
+def embed_message(engine: StegoEngine, crypto: CryptoModule, image_path: str, message: str,
+                  password: str, output_path: str,
+                  session: Optional[CryptoSession] = None) -> Tuple[StegoImage, dict]:
+    """Шифрует и внедряет сообщение без сохранения (см. hide_file)"""
+    capacity = engine.calculate_capacity(image_path)
+    encrypted_size = crypto.get_encrypted_size(len(message.encode()))
+    if encrypted_size > capacity:
+        raise ValueError(f"Недостаточная вместимость: {encrypted_size} > {capacity} байт")
+
+    if session is not None:
+        encrypted_data = session.encrypt(message)
+    else:
+        encrypted_data = crypto.encrypt(message, password)
+    # Внедряем в декодированный буфер, который затем сохраняется без промежуточных копий
+    image = engine.embed(image_path, encrypted_data, password)
+    return image, {'output': output_path, 'bytes': len(encrypted_data)}
+
+
+def extract_file(engine: StegoEngine, crypto: CryptoModule, image_path: str, password: str,
+                 output_path: Optional[str]) -> Optional[dict]:
+    """
+    Извлекает и расшифровывает сообщение из одного изображения
+
+    Returns:
+        Данные результата или None, если сообщение не найдено
+    """
+    encrypted_data = engine.extract_data(image_path, password)
+    if not encrypted_data:
+        return None
+
+    message = crypto.decrypt(encrypted_data, password)
+    if message is None:
+        raise ValueError("Не удалось расшифровать")
+
+    result = {'bytes': len(encrypted_data)}
+    if output_path is None:
+        result['message'] = message
+    else:
+        Path(output_path).write_text(message, encoding='utf-8')
+        result['output'] = output_path
+    return result
+
+
+def hide_payload_file(engine: StegoEngine, crypto: CryptoModule, image_path: str, payload_path: str,
+                      password: str, output_path: str, session: Optional[CryptoSession] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Потоково шифрует файл и скрывает его в одном изображении
+
+    Файл читается блоками, поэтому в памяти не держится целиком.
+    """
+    image, data = embed_payload(engine, crypto, image_path, payload_path, password, output_path,
+                                session, chunk_size)
+    engine.save_png(image, output_path)
+    return data
+
+
+def embed_payload(engine: StegoEngine, crypto: CryptoModule, image_path: str, payload_path: str,
+                  password: str, output_path: str, session: Optional[CryptoSession] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[Image.Image, dict]:
+    """Потоково шифрует и внедряет файл без сохранения (см. hide_payload_file)"""
+    payload_size = Path(payload_path).stat().st_size
+    capacity = engine.calculate_capacity(image_path)
+    encrypted_size = crypto.get_stream_encrypted_size(payload_size, chunk_size)
+    if encrypted_size > capacity:
+        raise ValueError(f"Недостаточная вместимость: {encrypted_size} > {capacity} байт")
+
+    with open(payload_path, 'rb') as source:
+        if session is not None:
+            chunks = session.iter_encrypt(source, chunk_size)
+        else:
+            chunks = crypto.iter_encrypt(source, password, chunk_size)
+        result_image = engine.embed_stream(image_path, chunks, password, chunk_size)
+    return result_image, {'output': output_path, 'bytes': encrypted_size}
+
+
+def extract_payload_file(engine: StegoEngine, crypto: CryptoModule, image_path: str, password: str,
+                         output_path: str) -> Optional[dict]:
+    """
+    Потоково извлекает и расшифровывает файл из одного изображения
+
+    Файл результата удаляется, если данные повреждены или ключ не подошел.
+
+    Returns:
+        Данные результата или None, если данные не найдены
+    """
+    chunks = engine.iter_extract(image_path, password)
+    first = next(chunks, None)
+    if first is None:
+        return None
+
+    def all_chunks():
+        yield first
+        yield from chunks
+
+    written = 0
+    try:
+        with open(output_path, 'wb') as out:
+            for plaintext in crypto.iter_decrypt(all_chunks(), password):
+                out.write(plaintext)
+                written += len(plaintext)
+    except ValueError:
+        Path(output_path).unlink(missing_ok=True)
+        raise
+    return {'bytes': written, 'output': output_path}
+
+
+def capacity_file(engine: StegoEngine, crypto: CryptoModule, image_path: str) -> dict:
+    """Оценивает вместимость одного изображения по заголовку файла"""
+    return engine.analyze_capacity(image_path, crypto.get_encrypted_size(0)).to_dict()
+
+
+def _error_result(job: BatchJob, error: Exception) -> BatchResult:
+    """Результат задачи, завершившейся исключением"""
+    return BatchResult(job, 'error', error=str(error) or traceback.format_exc(limit=1))
+
+
+def _completed(result: BatchResult) -> Future:
+    """Future с уже готовым результатом"""
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class _Worker:
+    """
+    Состояние рабочего процесса: движок, криптомодуль и пароль
+
+    Ключ PBKDF2 выводится один раз на процесс: скрытие использует общую
+    сессию шифрования, извлечение - кэш ключей по соли.
+    """
+
+    def __init__(self, password: Optional[str], engine_settings: dict, cache_bytes: int = 0):
+        self.engine = StegoEngine()
+        for name, value in engine_settings.items():
+            setattr(self.engine, name, value)
+        if cache_bytes > 0:
+            # Кэш не передается между процессами: у каждого процесса свой с тем же бюджетом
+            self.engine.enable_permutation_cache(cache_bytes)
+        self.crypto = CryptoModule()
+        self.crypto.enable_key_cache()
+        self.password = password
+        self._session = None
+
+    def session(self) -> CryptoSession:
+        """Возвращает сессию шифрования процесса, создавая ее при первом вызове"""
+        if self._session is None:
+            self._session = self.crypto.session(self.password)
+        return self._session
+
+    def run(self, job: BatchJob) -> BatchResult:
+        """Выполняет задачу, перехватывая любые ошибки"""
+        try:
+            return self._execute(job)
+        except Exception as e:
+            return _error_result(job, e)
+
+    def submit(self, job: BatchJob, encoder: Executor) -> Future:
+        """
+        Выполняет задачу, передавая кодирование PNG в пул потоков
+
+        Внедрение идет в текущем потоке, а сжатие zlib (отпускающее GIL)
+        перекрывается с обработкой следующих изображений.
+
+        Returns:
+            Future с результатом задачи
+        """
+        if job.kind != 'hide':
+            return _completed(self.run(job))
+        try:
+            if job.payload_path is not None:
+                image, data = embed_payload(self.engine, self.crypto, job.image_path, job.payload_path,
+                                            self.password, job.output_path, session=self.session())
+            else:
+                image, data = embed_message(self.engine, self.crypto, job.image_path, job.message,
+                                            self.password, job.output_path, session=self.session())
+        except Exception as e:
+            return _completed(_error_result(job, e))
+        return encoder.submit(self._encode, job, image, data)
+
+    def _encode(self, job: BatchJob, image, data: dict) -> BatchResult:
+        """Сохраняет результат внедрения (выполняется в потоке кодирования)"""
+        try:
+            self.engine.save_png(image, job.output_path)
+            return BatchResult(job, 'ok', data)
+        except Exception as e:
+            return _error_result(job, e)
+
+    def _execute(self, job: BatchJob) -> BatchResult:
+        """Выполняет задачу синхронно"""
+        if job.kind == 'hide' and job.payload_path is not None:
+            data = hide_payload_file(self.engine, self.crypto, job.image_path, job.payload_path,
+                                     self.password, job.output_path, session=self.session())
+        elif job.kind == 'hide':
+            data = hide_file(self.engine, self.crypto, job.image_path, job.message,
+                             self.password, job.output_path, session=self.session())
+        elif job.kind == 'extract':
+            if job.binary:
+                data = extract_payload_file(self.engine, self.crypto, job.image_path,
+                                            self.password, job.output_path)
+            else:
+                data = extract_file(self.engine, self.crypto, job.image_path, self.password, job.output_path)
+            if data is None:
+                return BatchResult(job, 'not_found')
+        elif job.kind == 'capacity':
+            data = capacity_file(self.engine, self.crypto, job.image_path)
+        else:
+            raise ValueError(f"Неизвестный тип задачи: {job.kind}")
+        return BatchResult(job, 'ok', data)
+
+
+# Состояние текущего рабочего процесса (создается инициализатором пула)
+_worker = None
+
+
+def _init_worker(password: Optional[str], engine_settings: dict, cache_bytes: int):
+    """Инициализатор процесса пула: создает движок один раз на процесс"""
+    global _worker
+    _worker = _Worker(password, engine_settings, cache_bytes)
+
+
+def _run_job(job: BatchJob) -> BatchResult:
+    """Выполняет задачу в рабочем процессе"""
+    return _worker.run(job)
+
+
+class BatchProcessor:
+    """
+    Пакетная обработка изображений на пуле процессов
+
+    Задачи берутся из итератора лениво: одновременно в работе не больше
+    max_in_flight задач, поэтому память не растет на больших пакетах.
+    Результаты выдаются в порядке задач или по мере готовности.
+    """
+
+    def __init__(self, password: Optional[str] = None, workers: int = 1,
+                 max_in_flight: Optional[int] = None, ordered: bool = True,
+                 engine: Optional[StegoEngine] = None, encode_threads: int = 0,
+                 cache_bytes: Optional[int] = None):
+        """
+        Args:
+            password: Пароль для всех задач пакета
+            workers: Количество процессов (1 - обработка в текущем процессе)
+            max_in_flight: Максимум задач в работе (по умолчанию 2 * workers или 2 * encode_threads)
+            ordered: Выдавать результаты в порядке задач
+            engine: Движок, настройки которого копируются в рабочие процессы
+            encode_threads: Потоки кодирования PNG при обработке в текущем процессе
+                (0 - кодирование сразу после внедрения)
+            cache_bytes: Бюджет кэша перестановок каждого процесса (0 - без кэша;
+                по умолчанию - бюджет кэша движка, если он включен)
+        """
+        self.password = password
+        self.workers = max(1, workers)
+        self.encode_threads = max(0, encode_threads)
+        default_in_flight = 2 * (self.encode_threads + 1 if self.workers == 1 else self.workers)
+        self.max_in_flight = max(1, max_in_flight or default_in_flight)
+        self.ordered = ordered
+        engine = engine or StegoEngine()
+        self.engine_settings = {name: getattr(engine, name) for name in ENGINE_SETTINGS}
+        if cache_bytes is None:
+            cache_bytes = engine.permutation_cache.max_bytes if engine.permutation_cache is not None else 0
+        self.cache_bytes = cache_bytes
+
+    def run(self, jobs: Iterable[BatchJob]) -> Iterator[BatchResult]:
+        """
+        Выполняет задачи и выдает результаты по мере готовности
+
+        Args:
+            jobs: Задачи (может быть ленивым итератором)
+
+        Returns:
+            Итератор результатов
+        """
+        if self.workers == 1 and self.encode_threads == 0:
+            worker = _Worker(self.password, self.engine_settings, self.cache_bytes)
+            for job in jobs:
+                yield worker.run(job)
+            return
+
+        if self.workers == 1:
+            # Внедрение в текущем потоке, кодирование PNG - в пуле потоков
+            worker = _Worker(self.password, self.engine_settings, self.cache_bytes)
+            with ThreadPoolExecutor(max_workers=self.encode_threads) as encoder:
+                yield from self._stream(jobs, lambda job: worker.submit(job, encoder))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.password, self.engine_settings, self.cache_bytes)) as pool:
+            yield from self._stream(jobs, lambda job: pool.submit(_run_job, job))
+
+    def _stream(self, jobs: Iterable[BatchJob], submit: Callable[[BatchJob], Future]) -> Iterator[BatchResult]:
+        """Держит в работе не больше max_in_flight задач и выдает их результаты"""
+        job_iter = iter(jobs)
+        pending = deque()
+
+        def submit_next() -> bool:
+            job = next(job_iter, None)
+            if job is None:
+                return False
+            pending.append((job, submit(job)))
+            return True
+
+        while len(pending) < self.max_in_flight and submit_next():
+            pass
+
+        while pending:
+            if self.ordered:
+                job, future = pending.popleft()
+                yield self._collect(job, future)
+                submit_next()
+            else:
+                wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+                for item in [item for item in pending if item[1].done()]:
+                    pending.remove(item)
+                    yield self._collect(*item)
+                    submit_next()
+
+    @staticmethod
+    def _collect(job: BatchJob, future) -> BatchResult:
+        """Получает результат задачи, превращая сбои пула в ошибку задачи"""
+        try:
+            return future.result()
+        except Exception as e:
+            return BatchResult(job, 'error', error=f"{type(e).__name__}: {e}")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк векторного внедрения/извлечения StegoEngine
+Сравнение с исходной реализацией на поэлементных циклах Python
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Добавляем корень проекта в путь поиска модулей
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stego_engine import StegoEngine, FORMAT_LEGACY
+
+
+def loop_embed(engine: StegoEngine, image: Image.Image, data: bytes, password: str) -> Image.Image:
+    """Эталонное внедрение: исходный побитовый цикл по красному каналу"""
+    pixels = np.array(image.convert('RGB'), dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    full_data = struct.pack('>I', len(data)) + data
+
+    bits = []
+    for byte in full_data:
+        for i in range(7, -1, -1):
+            bits.append((byte >> i) & 1)
+
+    seed = password.encode() + b'stegoghost'
+    pixel_indices = engine._generate_pixel_sequence(seed, height * width, len(bits))
+
+    flat_pixels = pixels.reshape(-1, 3).copy()
+    for bit_idx, pixel_idx in enumerate(pixel_indices):
+        red_value = flat_pixels[pixel_idx][0]
+        flat_pixels[pixel_idx][0] = (red_value & 0xFE) | bits[bit_idx]
+
+    return Image.fromarray(flat_pixels.reshape(height, width, 3), mode='RGB')
+
+
+def loop_extract(engine: StegoEngine, image: Image.Image, data_length: int, password: str) -> bytes:
+    """Эталонное извлечение: исходный побитовый цикл по красному каналу"""
+    pixels = np.array(image.convert('RGB'), dtype=np.uint8)
+    total_pixels = pixels.shape[0] * pixels.shape[1]
+    flat_pixels = pixels.reshape(-1, 3)
+
+    seed = password.encode() + b'stegoghost'
+    header_bits_count = engine.header_size * 8
+    data_indices = engine._generate_pixel_sequence(
+        seed, total_pixels, data_length * 8, offset=header_bits_count
+    )
+
+    data_bits = []
+    for pixel_idx in data_indices:
+        data_bits.append(flat_pixels[pixel_idx][0] & 1)
+
+    return engine._bits_to_bytes(data_bits)[:data_length]
+
+
+def best_of(func, repeats: int) -> float:
+    """Возвращает лучшее время из нескольких запусков"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """Точка входа бенчмарка"""
+    parser = argparse.ArgumentParser(description="Сравнение векторного и циклического LSB-внедрения")
+    parser.add_argument('--width', type=int, default=2000)
+    parser.add_argument('--height', type=int, default=1500)
+    parser.add_argument('--payload', type=int, default=32 * 1024, help="Размер полезной нагрузки в байтах")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    # Эталонные циклы реализуют формат 1, поэтому сравниваем в нем
+    engine = StegoEngine()
+    engine.format_version = FORMAT_LEGACY
+    password = "benchmark-password"
+    rng = np.random.default_rng(0)
+
+    carrier_path = Path(__file__).resolve().parent / '_bench_carrier.png'
+    carrier = Image.fromarray(rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8), mode='RGB')
+    carrier.save(carrier_path, "PNG")
+    payload = os.urandom(args.payload)
+
+    try:
+        # Проверяем побайтовую идентичность результатов
+        vector_image = engine.embed_data(str(carrier_path), payload, password)
+        loop_image = loop_embed(engine, carrier, payload, password)
+        identical = np.array_equal(np.array(vector_image), np.array(loop_image))
+
+        stego_path = Path(__file__).resolve().parent / '_bench_stego.png'
+        vector_image.save(stego_path, "PNG")
+        try:
+            extracted = engine.extract_data(str(stego_path), password)
+            roundtrip = extracted == payload and loop_extract(engine, vector_image, len(payload), password) == payload
+
+            t_vector_embed = best_of(lambda: engine.embed_data(str(carrier_path), payload, password), args.repeats)
+            t_loop_embed = best_of(lambda: loop_embed(engine, Image.open(carrier_path), payload, password), args.repeats)
+            t_vector_extract = best_of(lambda: engine.extract_data(str(stego_path), password), args.repeats)
+            t_loop_extract = best_of(lambda: loop_extract(engine, Image.open(stego_path), len(payload), password), args.repeats)
+        finally:
+            stego_path.unlink()
+    finally:
+        carrier_path.unlink()
+
+    print(f"Изображение: {args.width}x{args.height}, полезная нагрузка: {args.payload} байт")
+    print(f"Идентичность с циклом: {'да' if identical else 'НЕТ'}, round-trip: {'да' if roundtrip else 'НЕТ'}")
+    print(f"Внедрение:  цикл {t_loop_embed:.3f} с, вектор {t_vector_embed:.3f} с, "
+          f"ускорение x{t_loop_embed / t_vector_embed:.1f}")
+    print(f"Извлечение: цикл {t_loop_extract:.3f} с, вектор {t_vector_extract:.3f} с, "
+          f"ускорение x{t_loop_extract / t_vector_extract:.1f}")
+
+    return 0 if identical and roundtrip else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
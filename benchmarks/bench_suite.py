@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Воспроизводимый набор бенчмарков StegoEngine и CryptoModule
+Синтетические носители и нагрузки, время и память по стадиям, результат в JSON
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+import PIL
+from PIL import Image
+
+# Добавляем корень проекта в путь поиска модулей
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from stego_engine import StegoEngine
+from stego_image import StegoImage
+from crypto_module import CryptoModule
+
+# Стадии и единицы пропускной способности
+STAGES = {
+    'decode': 'MP/s',
+    'permutation': 'MP/s',
+    'bit_conversion': 'MB/s',
+    'embed': 'MB/s',
+    'extract': 'MB/s',
+    'encode': 'MP/s',
+    'aes_gcm': 'MB/s',
+}
+
+PASSWORD = "benchmark-password"
+
+
+def parse_size(text: str) -> Optional[int]:
+    """Размер нагрузки: байты, суффиксы k/m или 'max' (вся вместимость, None)"""
+    text = text.strip().lower()
+    if text == 'max':
+        return None
+    multiplier = {'k': 1024, 'm': 1024 * 1024}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+def make_carrier(megapixels: float, seed: int) -> np.ndarray:
+    """Синтетический RGB-носитель 4:3 из шума (детерминирован по seed)"""
+    width = max(8, int(round((megapixels * 1e6 * 4 / 3) ** 0.5)))
+    height = max(8, int(round(megapixels * 1e6 / width)))
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def measure(func: Callable, setup: Optional[Callable], repeats: int, with_memory: bool) -> dict:
+    """
+    Время стадии (лучшее и медиана из repeats запусков) и пик памяти
+
+    setup выполняется до каждого запуска и не входит во время; его
+    результат передается в func. Пик памяти измеряется отдельным
+    запуском под tracemalloc, чтобы трассировка не искажала время.
+    """
+    times = []
+    for _ in range(repeats):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+
+    result = {'seconds': min(times), 'median_seconds': float(np.median(times))}
+    if with_memory:
+        args = setup() if setup else ()
+        tracemalloc.start()
+        try:
+            func(*args)
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def add_throughput(stage: dict, amount: float, unit: str) -> dict:
+    """Дополняет результат стадии пропускной способностью"""
+    stage['throughput'] = round(amount / stage['seconds'], 3) if stage['seconds'] > 0 else None
+    stage['unit'] = unit
+    stage['seconds'] = round(stage['seconds'], 6)
+    stage['median_seconds'] = round(stage['median_seconds'], 6)
+    return stage
+
+
+def bench_kdf(crypto: CryptoModule, repeats: int) -> dict:
+    """PBKDF2: не зависит от размера носителя, измеряется один раз"""
+    salt = os.urandom(crypto.salt_size)
+    stage = measure(lambda: crypto._derive_key(PASSWORD, salt), None, repeats, with_memory=False)
+    stage = add_throughput(stage, 1, 'keys/s')
+    stage['iterations'] = crypto.iterations
+    return stage
+
+
+def bench_case(engine: StegoEngine, crypto: CryptoModule, pixels: np.ndarray, png_bytes: bytes,
+               payload_size: int, stages: List[str], repeats: int, with_memory: bool) -> dict:
+    """Все стадии для одной пары носитель/нагрузка"""
+    height, width = pixels.shape[:2]
+    megapixels = width * height / 1e6
+    payload = os.urandom(payload_size)
+    payload_mb = payload_size / 1e6
+    seed = PASSWORD.encode() + b'stegoghost'
+    _, bits_per_channel, channels = engine._current_layout()
+    header_pixels = engine._header_size() * 8
+    data_pixels = -(-payload_size * 8 // (bits_per_channel * len(channels)))
+
+    results = {}
+    if 'decode' in stages:
+        results['decode'] = add_throughput(measure(
+            lambda: StegoImage.open(io.BytesIO(png_bytes), with_alpha=False),
+            None, repeats, with_memory), megapixels, STAGES['decode'])
+
+    if 'permutation' in stages:
+        # Перестановка для заголовка и данных, как при внедрении
+        needed = header_pixels + data_pixels
+        results['permutation'] = add_throughput(measure(
+            lambda: engine._create_permutation(seed, width * height, engine.format_version).take(0, needed),
+            None, repeats, with_memory), needed / 1e6, STAGES['permutation'])
+
+    if 'bit_conversion' in stages:
+        # Байты -> биты -> байты через вспомогательные методы движка
+        results['bit_conversion'] = add_throughput(measure(
+            lambda: engine._bits_to_bytes(engine._bytes_to_bits(payload)),
+            None, repeats, with_memory), payload_mb, STAGES['bit_conversion'])
+
+    if 'embed' in stages or 'extract' in stages or 'encode' in stages:
+        stego = engine.embed(StegoImage.from_array(pixels), payload, PASSWORD)
+
+    if 'embed' in stages:
+        # Копия буфера готовится вне замера: embed изменяет его на месте
+        results['embed'] = add_throughput(measure(
+            lambda image: engine.embed(image, payload, PASSWORD),
+            lambda: (StegoImage.from_array(pixels),), repeats, with_memory), payload_mb, STAGES['embed'])
+
+    if 'extract' in stages:
+        if engine.extract_data(stego, PASSWORD) != payload:
+            raise RuntimeError("Извлеченные данные не совпадают с внедренными")
+        results['extract'] = add_throughput(measure(
+            lambda: engine.extract_data(stego, PASSWORD),
+            None, repeats, with_memory), payload_mb, STAGES['extract'])
+
+    if 'encode' in stages:
+        results['encode'] = add_throughput(measure(
+            lambda: engine.save_png(stego, io.BytesIO()),
+            None, repeats, with_memory), megapixels, STAGES['encode'])
+
+    if 'aes_gcm' in stages:
+        # Шифрование готовым ключом: только AES-GCM, без PBKDF2
+        salt = os.urandom(crypto.salt_size)
+        key = crypto._derive_key(PASSWORD, salt)
+        results['aes_gcm'] = add_throughput(measure(
+            lambda: crypto._encrypt_with_key(key, salt, payload),
+            None, repeats, with_memory), payload_mb, STAGES['aes_gcm'])
+
+    return {
+        'megapixels': round(megapixels, 3),
+        'width': width,
+        'height': height,
+        'payload_bytes': payload_size,
+        'stages': results,
+    }
+
+
+def git_revision() -> Optional[str]:
+    """Текущий коммит репозитория (None вне git)"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                  capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return revision.stdout.strip() or None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Пиковый RSS процесса (None, если недоступен)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux сообщает килобайты, macOS - байты
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def compare(current: dict, baseline_path: str):
+    """Печатает отношение времени стадий к сохраненному запуску"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(case['megapixels'], case['payload_bytes']): case['stages'] for case in baseline['results']}
+
+    print(f"\nСравнение с {baseline['meta'].get('revision') or baseline_path} (>1 - быстрее):")
+    for case in current['results']:
+        old = previous.get((case['megapixels'], case['payload_bytes']))
+        if old is None:
+            continue
+        ratios = []
+        for name, stage in case['stages'].items():
+            if name in old and stage['seconds'] > 0:
+                ratios.append(f"{name} x{old[name]['seconds'] / stage['seconds']:.2f}")
+        print(f"  {case['megapixels']} MP, {case['payload_bytes']} B: {', '.join(ratios)}")
+
+
+def main():
+    """Точка входа бенчмарка"""
+    parser = argparse.ArgumentParser(description="Бенчмарк стадий StegoEngine и CryptoModule")
+    parser.add_argument('--sizes', default='0.3,2,12',
+                        help="Размеры носителей в мегапикселях через запятую (например, 0.3,12,100)")
+    parser.add_argument('--payloads', default='32,4k,64k,max',
+                        help="Размеры нагрузки через запятую: байты, k, m или max (вся вместимость)")
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help="Стадии через запятую: " + ', '.join(STAGES))
+    parser.add_argument('--format', type=int, default=StegoEngine().format_version, help="Версия формата")
+    parser.add_argument('--bits-per-channel', type=int, default=1)
+    parser.add_argument('--channels', default='R')
+    parser.add_argument('--png-preset', choices=('fast', 'balanced', 'small'), default='balanced')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="Не измерять пик памяти (быстрее)")
+    parser.add_argument('--kdf-repeats', type=int, default=3, help="Запусков PBKDF2 (0 - пропустить)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed синтетических носителей")
+    parser.add_argument('--output', help="Файл JSON с результатами (по умолчанию - stdout)")
+    parser.add_argument('--compare', help="JSON предыдущего запуска для сравнения")
+    args = parser.parse_args()
+
+    stages = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Неизвестные стадии: {', '.join(sorted(unknown))}")
+
+    engine = StegoEngine()
+    engine.format_version = args.format
+    engine.bits_per_channel = args.bits_per_channel
+    engine.channels = args.channels
+    engine.set_png_preset(args.png_preset)
+    # Формат 1 при извлечении отвергает длины больше max_message_length * 10
+    engine.max_message_length = 2 ** 32
+    _, bits_per_channel, channels = engine._current_layout()
+    if 'A' in channels:
+        parser.error("Синтетические носители не содержат альфа-канала")
+    crypto = CryptoModule()
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'format_version': engine.format_version,
+            'layout': {'bits_per_channel': bits_per_channel, 'channels': channels},
+            'png_preset': args.png_preset,
+            'repeats': args.repeats,
+            'seed': args.seed,
+        },
+        'results': [],
+    }
+    if args.kdf_repeats > 0:
+        report['kdf'] = bench_kdf(crypto, args.kdf_repeats)
+
+    for size in (float(value) for value in args.sizes.split(',')):
+        pixels = make_carrier(size, args.seed)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, mode='RGB').save(buffer, "PNG", compress_level=1)
+        png_bytes = buffer.getvalue()
+        capacity = engine.capacity_for_pixels(pixels.shape[0] * pixels.shape[1], engine.format_version,
+                                              bits_per_channel, channels)
+
+        for payload in args.payloads.split(','):
+            payload_size = parse_size(payload)
+            payload_size = capacity if payload_size is None else payload_size
+            if payload_size > capacity:
+                print(f"Пропуск: {payload_size} B не помещается в {size} MP ({capacity} B)", file=sys.stderr)
+                continue
+            case = bench_case(engine, crypto, pixels, png_bytes, payload_size, stages,
+                              args.repeats, not args.no_memory)
+            report['results'].append(case)
+            summary = ', '.join(f"{name} {stage['seconds']:.4f}s" for name, stage in case['stages'].items())
+            print(f"{case['megapixels']} MP, {payload_size} B: {summary}", file=sys.stderr)
+
+    report['meta']['peak_rss_bytes'] = peak_rss_bytes()
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Консольный интерфейс StegoGhost
+Пакетное скрытие, извлечение и оценка вместимости без GUI
+
+Модуль не импортирует PyQt5, поэтому пригоден для серверов и конвейеров.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+from stego_engine import StegoEngine, FORMAT_CHECKED, PNG_PRESETS, PNG_STRATEGIES
+from batch import BatchJob, BatchProcessor, BatchResult
+
+
+PASSWORD_ENV = 'STEGOGHOST_PASSWORD'
+
+
+def expand_inputs(patterns: Iterable[str], manifest: Optional[str], formats: set) -> List[Path]:
+    """
+    Разворачивает входные пути: файлы, папки, glob-шаблоны и файл-манифест
+
+    Args:
+        patterns: Пути, папки или glob-шаблоны
+        manifest: Файл со списком путей (по одному на строку, # - комментарий)
+        formats: Поддерживаемые расширения для обхода папок
+
+    Returns:
+        Список файлов без повторов в порядке появления
+    """
+    candidates = list(patterns)
+    if manifest:
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    candidates.append(line)
+
+    files = []
+    for candidate in candidates:
+        path = Path(candidate)
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.is_file() and p.suffix.lower() in formats))
+        elif glob.has_magic(candidate):
+            files.extend(sorted(Path(p) for p in glob.glob(candidate, recursive=True) if Path(p).is_file()))
+        else:
+            files.append(path)
+
+    seen = set()
+    unique = []
+    for path in files:
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    return unique
+
+
+def resolve_password(args) -> str:
+    """Получает пароль из аргумента, файла или переменной окружения"""
+    if args.password:
+        return args.password
+    if args.password_file:
+        with open(args.password_file, 'r', encoding='utf-8') as f:
+            return f.readline().rstrip('\r\n')
+    password = os.environ.get(PASSWORD_ENV)
+    if not password:
+        raise SystemExit(f"Пароль не задан: используйте --password, --password-file или {PASSWORD_ENV}")
+    return password
+
+
+def configure_engine(args) -> StegoEngine:
+    """Создает движок со схемой размещения из аргументов"""
+    engine = StegoEngine()
+    engine.format_version = args.format
+    engine.bits_per_channel = args.bits_per_channel
+    engine.channels = args.channels
+    engine.tile_size = args.tile_size
+    engine.tile_workers = args.tile_workers
+    if args.command == 'hide':
+        engine.set_png_preset(args.png_preset)
+        if args.compress_level is not None:
+            engine.png_compress_level = args.compress_level
+        if args.compress_type is not None:
+            engine.png_compress_type = PNG_STRATEGIES[args.compress_type]
+        if args.optimize is not None:
+            engine.png_optimize = args.optimize
+    return engine
+
+
+def write_results(results: Iterable[BatchResult], out: TextIO) -> int:
+    """
+    Пишет результаты в формате JSON Lines по мере их поступления
+
+    Returns:
+        Количество неуспешных задач
+    """
+    failures = 0
+    for result in results:
+        if not result.ok:
+            failures += 1
+        out.write(json.dumps(result.to_record(), ensure_ascii=False) + '\n')
+        out.flush()
+    return failures
+
+
+def parse_pipeline(value: str) -> tuple:
+    """Разбирает число потоков стадий конвейера: 'R,P,W'"""
+    try:
+        counts = tuple(int(part) for part in value.split(','))
+    except ValueError:
+        counts = ()
+    if len(counts) != 3 or min(counts) < 1:
+        raise argparse.ArgumentTypeError("ожидается три положительных числа через запятую, например 2,2,2")
+    return counts
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Создает парсер аргументов командной строки"""
+    parser = argparse.ArgumentParser(
+        prog='stegoghost',
+        description="StegoGhost: скрытие зашифрованных сообщений в изображениях",
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(sub, with_password: bool = True):
+        sub.add_argument('inputs', nargs='*', help="Файлы, папки или glob-шаблоны")
+        sub.add_argument('--manifest', help="Файл со списком путей, по одному на строку")
+        sub.add_argument('--results', help="Файл для результатов JSON Lines (по умолчанию stdout)")
+        if with_password:
+            sub.add_argument('--password', help=f"Пароль (безопаснее через {PASSWORD_ENV})")
+            sub.add_argument('--password-file', help="Файл, первая строка которого - пароль")
+        sub.add_argument('--workers', type=int, default=1, help="Количество рабочих процессов")
+        sub.add_argument('--max-in-flight', type=int, help="Максимум одновременно обрабатываемых файлов")
+        sub.add_argument('--unordered', action='store_true', help="Выводить результаты по мере готовности")
+        sub.add_argument('--cache-mb', type=int, default=0,
+                         help="Бюджет кэша перестановок на процесс, МБ (0 - без кэша)")
+        sub.add_argument('--pipeline', metavar='R,P,W', type=parse_pipeline,
+                         help="Конвейер на потоках: число потоков чтения, обработки и записи (например 2,2,2)")
+        sub.add_argument('--stats', action='store_true',
+                         help="Вывести статистику стадий конвейера в stderr (с --pipeline)")
+
+    def add_layout(sub):
+        sub.add_argument('--format', type=int, choices=[1, 2, 3, 4], default=FORMAT_CHECKED,
+                         help="Версия формата внедрения")
+        sub.add_argument('--bits-per-channel', type=int, choices=[1, 2, 3], default=1,
+                         help="Младших бит на канал")
+        sub.add_argument('--channels', default='R', help="Каналы для данных, например R, RGB, RGBA")
+        sub.add_argument('--tile-size', type=int, default=256, help="Сторона плитки в пикселях (формат 4)")
+        sub.add_argument('--tile-workers', type=int, default=1, help="Потоки для обработки плиток (формат 4)")
+
+    hide = subparsers.add_parser('hide', help="Скрыть сообщение в изображениях")
+    add_common(hide)
+    add_layout(hide)
+    message = hide.add_mutually_exclusive_group(required=True)
+    message.add_argument('--message', help="Текст сообщения")
+    message.add_argument('--message-file', help="Файл с текстом сообщения (UTF-8)")
+    message.add_argument('--payload-file', help="Произвольный файл, шифруется и внедряется потоково")
+    hide.add_argument('--output-dir', required=True, help="Папка для результатов")
+    hide.add_argument('--suffix', default='', help="Суффикс имени выходного файла")
+    png = hide.add_argument_group("кодирование PNG")
+    png.add_argument('--png-preset', choices=sorted(PNG_PRESETS), default='balanced',
+                     help="Профиль: fast - скорость, small - размер")
+    png.add_argument('--compress-level', type=int, choices=range(10), metavar='0-9',
+                     help="Уровень zlib (переопределяет профиль)")
+    png.add_argument('--compress-type', choices=sorted(PNG_STRATEGIES), help="Стратегия zlib")
+    png.add_argument('--optimize', action=argparse.BooleanOptionalAction, default=None,
+                     help="Дополнительный проход оптимизации размера")
+    png.add_argument('--encode-threads', type=int, default=0,
+                     help="Потоки кодирования PNG при --workers 1 (0 - без перекрытия)")
+
+    extract = subparsers.add_parser('extract', help="Извлечь сообщения из изображений")
+    add_common(extract)
+    extract.add_argument('--output-dir', help="Папка для извлеченных сообщений (иначе - в результатах)")
+    extract.add_argument('--legacy', action=argparse.BooleanOptionalAction, default=False,
+                         help="Искать и данные формата 1 (полное перемешивание O(N) на каждое "
+                              "изображение без данных форматов 2-4)")
+    extract.add_argument('--binary', action='store_true',
+                         help="Потоково извлечь двоичные данные в <имя>.bin (требует --output-dir)")
+
+    serve = subparsers.add_parser('serve', help="Запустить локальный HTTP-сервис")
+    serve.add_argument('--host', default='127.0.0.1', help="Адрес для прослушивания")
+    serve.add_argument('--port', type=int, default=8080, help="Порт")
+    serve.add_argument('--workers', type=int, default=4, help="Потоки пула обработки")
+    serve.add_argument('--max-body-size', type=int,
+                       help="Максимальный размер тела запроса в байтах (по умолчанию 64 МБ)")
+    serve.add_argument('--max-queue', type=int, default=64, help="Максимум запросов в пуле (сверх - 503)")
+    serve.add_argument('--cache-mb', type=int, default=256, help="Бюджет кэша перестановок, МБ")
+    serve.add_argument('--quiet', action='store_true', help="Не писать журнал запросов")
+    add_layout(serve)
+
+    capacity = subparsers.add_parser('capacity', help="Оценить вместимость изображений")
+    add_common(capacity, with_password=False)
+    add_layout(capacity)
+
+    return parser
+
+
+def build_jobs(args, paths: List[Path]) -> Iterator[BatchJob]:
+    """Создает задачи пакетной обработки для выбранной команды"""
+    if args.command == 'hide':
+        if args.message_file:
+            message = Path(args.message_file).read_text(encoding='utf-8')
+        else:
+            message = args.message
+        output_dir = Path(args.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for path in paths:
+            output_path = output_dir / f"{path.stem}{args.suffix}.png"
+            yield BatchJob('hide', str(path), message=message, output_path=str(output_path),
+                           payload_path=args.payload_file)
+    elif args.command == 'extract':
+        output_dir = Path(args.output_dir) if args.output_dir else None
+        if output_dir is not None:
+            output_dir.mkdir(parents=True, exist_ok=True)
+        suffix = '.bin' if args.binary else '.txt'
+        for path in paths:
+            output_path = str(output_dir / f"{path.stem}{suffix}") if output_dir is not None else None
+            yield BatchJob('extract', str(path), output_path=output_path, binary=args.binary)
+    else:
+        for path in paths:
+            yield BatchJob('capacity', str(path))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Точка входа CLI"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'extract' and args.binary and not args.output_dir:
+        parser.error("--binary требует --output-dir")
+
+    if args.command == 'serve':
+        # Сервер и конвейер импортируются только своими командами
+        from server import DEFAULT_MAX_BODY_SIZE, StegoService, serve
+        max_body_size = DEFAULT_MAX_BODY_SIZE if args.max_body_size is None else args.max_body_size
+        service = StegoService(configure_engine(args), workers=args.workers, max_body_size=max_body_size,
+                               max_queue=args.max_queue, cache_bytes=args.cache_mb * 1024 * 1024)
+        print(f"StegoGhost слушает http://{args.host}:{args.port}", file=sys.stderr)
+        serve(args.host, args.port, service, quiet=args.quiet)
+        return 0
+
+    if args.command == 'extract':
+        engine = StegoEngine()
+        # Сканирование пакета: формат 1 только по запросу, иначе каждое
+        # изображение без данных стоит полного перемешивания
+        engine.legacy_fallback = args.legacy
+    else:
+        engine = configure_engine(args)
+
+    if args.cache_mb > 0:
+        # Бюджет передается и в рабочие процессы пакета
+        engine.enable_permutation_cache(args.cache_mb * 1024 * 1024)
+
+    paths = expand_inputs(args.inputs, args.manifest, engine.supported_formats)
+    if not paths:
+        print("Не найдено ни одного входного файла", file=sys.stderr)
+        return 2
+
+    password = resolve_password(args) if args.command != 'capacity' else None
+    if args.pipeline:
+        from pipeline import PipelineProcessor
+        read_threads, process_threads, write_threads = args.pipeline
+        processor = PipelineProcessor(password, engine=engine, read_threads=read_threads,
+                                      process_threads=process_threads, write_threads=write_threads,
+                                      ordered=not args.unordered)
+    else:
+        processor = BatchProcessor(password, workers=args.workers, max_in_flight=args.max_in_flight,
+                                   ordered=not args.unordered, engine=engine,
+                                   encode_threads=getattr(args, 'encode_threads', 0))
+    results = processor.run(build_jobs(args, paths))
+
+    if args.results:
+        with open(args.results, 'w', encoding='utf-8') as out:
+            failures = write_results(results, out)
+    else:
+        try:
+            failures = write_results(results, sys.stdout)
+        except BrokenPipeError:
+            # Читатель закрыл канал (например, | head): завершаемся без трассировки.
+            # stdout переводится на devnull, чтобы сброс буфера при выходе не упал снова
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            return 1
+
+    if args.stats and args.pipeline:
+        print(json.dumps(processor.stats()), file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,154 @@
 """
 
 import os
+import hashlib
+import struct
+import threading
+from collections import OrderedDict
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.backends import default_backend
-from typing import Tuple, Optional
+from typing import BinaryIO, Iterable, Iterator, Tuple, Optional, Union
+
+
+# Версия потокового формата шифрования
+STREAM_VERSION = 1
+
+# Размер сегмента потокового шифрования по умолчанию
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def check_chunk_size(chunk_size: int):
+    """Проверяет размер блока потоковой обработки"""
+    if chunk_size < 1:
+        raise ValueError(f"Размер блока должен быть положительным: {chunk_size}")
+
+
+def iter_source_chunks(source: Union[BinaryIO, Iterable[bytes]], chunk_size: int) -> Iterator[bytes]:
+    """
+    Читает источник по частям
+    
+    Args:
+        source: Файлоподобный объект с методом read() или итерируемое байтовых блоков
+        chunk_size: Размер блока для чтения файлоподобного объекта
+    """
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        for chunk in source:
+            if chunk:
+                yield bytes(chunk)
+
+
+class KeyCache:
+    """
+    Ограниченный кэш ключей PBKDF2 по паре (пароль, соль)
+    
+    Пароль хранится только в виде SHA-256, ключи - в bytearray, которые
+    обнуляются при вытеснении и очистке. Обнуление затрагивает копии,
+    принадлежащие кэшу; копии внутри библиотеки шифрования не контролируются.
+    """
+    
+    def __init__(self, max_entries: int = 32):
+        """
+        Args:
+            max_entries: Максимальное количество хранимых ключей
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+    @staticmethod
+    def _make_key(password: str, salt: bytes) -> tuple:
+        return hashlib.sha256(password.encode()).digest(), bytes(salt)
+    
+    def get(self, password: str, salt: bytes) -> Optional[bytes]:
+        """Возвращает копию ключа или None при промахе"""
+        cache_key = self._make_key(password, salt)
+        with self._lock:
+            key = self._entries.get(cache_key)
+            if key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return bytes(key)
+    
+    def put(self, password: str, salt: bytes, key: bytes):
+        """Сохраняет ключ, вытесняя (и обнуляя) давно не использованные"""
+        cache_key = self._make_key(password, salt)
+        with self._lock:
+            if cache_key in self._entries:
+                self._entries.move_to_end(cache_key)
+                return
+            self._entries[cache_key] = bytearray(key)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._zeroize(evicted)
+    
+    def clear(self):
+        """Обнуляет и удаляет все ключи"""
+        with self._lock:
+            for key in self._entries.values():
+                self._zeroize(key)
+            self._entries.clear()
+    
+    @staticmethod
+    def _zeroize(key: bytearray):
+        key[:] = bytes(len(key))
+    
+    def stats(self) -> dict:
+        """Возвращает статистику использования кэша"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class CryptoSession:
+    """
+    Сессия шифрования с одним выведенным ключом
+    
+    Ключ выводится из пароля один раз со случайной солью; каждое сообщение
+    шифруется со свежим nonce. Формат данных совпадает с CryptoModule.encrypt,
+    поэтому расшифровка выполняется обычным CryptoModule.decrypt.
+    """
+    
+    def __init__(self, crypto: 'CryptoModule', password: str):
+        self.crypto = crypto
+        self.salt = os.urandom(crypto.salt_size)
+        self._key = bytearray(crypto._derive_key(password, self.salt))
+        
+    def encrypt(self, plaintext: Union[str, bytes]) -> bytes:
+        """Шифрует сообщение ключом сессии"""
+        if self._key is None:
+            raise ValueError("Сессия шифрования закрыта")
+        return self.crypto._encrypt_with_key(self._key, self.salt, plaintext)
+    
+    def iter_encrypt(self, source: Union[BinaryIO, Iterable[bytes]],
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        """Потоково шифрует источник ключом сессии (см. CryptoModule.iter_encrypt)"""
+        if self._key is None:
+            raise ValueError("Сессия шифрования закрыта")
+        check_chunk_size(chunk_size)
+        return self.crypto._iter_encrypt_with_key(self._key, self.salt, source, chunk_size)
+    
+    def close(self):
+        """Обнуляет ключ сессии"""
+        if self._key is not None:
+            self._key[:] = bytes(len(self._key))
+            self._key = None
+            
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
 
 class CryptoModule:
@@ -20,6 +163,32 @@ class CryptoModule:
         self.tag_size = 16   # 128 бит
         self.key_size = 32   # 256 бит
         self.iterations = 100000  # Итерации PBKDF2
+        self.key_cache = None  # Кэш ключей PBKDF2 (по умолчанию отключен)
+        
+    def enable_key_cache(self, max_entries: int = 32) -> KeyCache:
+        """
+        Включает кэширование ключей PBKDF2 по паре (пароль, соль)
+        
+        Повторная расшифровка данных с той же солью (например, пакета,
+        зашифрованного одной сессией) обходится без повторного PBKDF2.
+        
+        Args:
+            max_entries: Максимальное количество хранимых ключей
+            
+        Returns:
+            Созданный кэш (доступна статистика hits/misses)
+        """
+        self.key_cache = KeyCache(max_entries)
+        return self.key_cache
+        
+    def session(self, password: str) -> CryptoSession:
+        """
+        Создает сессию шифрования: один PBKDF2 на множество сообщений
+        
+        Args:
+            password: Пароль для шифрования
+        """
+        return CryptoSession(self, password)
         
     def _derive_key(self, password: str, salt: bytes) -> bytes:
         """
@@ -32,6 +201,11 @@ class CryptoModule:
         Returns:
             32-байтный ключ
         """
+        if self.key_cache is not None:
+            key = self.key_cache.get(password, salt)
+            if key is not None:
+                return key
+        
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=self.key_size,
@@ -39,26 +213,38 @@ class CryptoModule:
             iterations=self.iterations,
             backend=default_backend()
         )
-        return kdf.derive(password.encode())
+        key = kdf.derive(password.encode())
+        
+        if self.key_cache is not None:
+            self.key_cache.put(password, salt, key)
+        return key
     
-    def encrypt(self, plaintext: str, password: str) -> bytes:
+    def encrypt(self, plaintext: Union[str, bytes], password: str) -> bytes:
         """
-        Шифрует текст используя AES-256-GCM
+        Шифрует текст или двоичные данные используя AES-256-GCM
         
         Args:
-            plaintext: Исходный текст
+            plaintext: Исходный текст (кодируется в UTF-8) или байты
             password: Пароль для шифрования
             
         Returns:
             Зашифрованные данные в формате: salt + nonce + tag + ciphertext
         """
-        # Генерируем случайные salt и nonce
+        # Генерируем случайную соль и выводим ключ из пароля
         salt = os.urandom(self.salt_size)
-        nonce = os.urandom(self.nonce_size)
-        
-        # Выводим ключ из пароля
         key = self._derive_key(password, salt)
         
+        return self._encrypt_with_key(key, salt, plaintext)
+    
+    def _encrypt_with_key(self, key: bytes, salt: bytes, plaintext: Union[str, bytes]) -> bytes:
+        """
+        Шифрует данные готовым ключом со свежим nonce
+        
+        Returns:
+            Зашифрованные данные в формате: salt + nonce + tag + ciphertext
+        """
+        nonce = os.urandom(self.nonce_size)
+        
         # Создаем шифр
         cipher = Cipher(
             algorithms.AES(key),
@@ -68,8 +254,9 @@ class CryptoModule:
         encryptor = cipher.encryptor()
         
         # Шифруем данные
-        plaintext_bytes = plaintext.encode('utf-8')
-        ciphertext = encryptor.update(plaintext_bytes) + encryptor.finalize()
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode('utf-8')
+        ciphertext = encryptor.update(plaintext) + encryptor.finalize()
         
         # Получаем тег аутентификации
         tag = encryptor.tag
@@ -90,6 +277,25 @@ class CryptoModule:
         Returns:
             Расшифрованный текст или None при ошибке
         """
+        plaintext_bytes = self.decrypt_bytes(encrypted_data, password)
+        if plaintext_bytes is None:
+            return None
+        try:
+            return plaintext_bytes.decode('utf-8')
+        except UnicodeDecodeError:
+            return None
+    
+    def decrypt_bytes(self, encrypted_data: bytes, password: str) -> Optional[bytes]:
+        """
+        Расшифровывает двоичные данные
+        
+        Args:
+            encrypted_data: Зашифрованные данные
+            password: Пароль для расшифровки
+            
+        Returns:
+            Расшифрованные байты или None при ошибке
+        """
         try:
             # Проверяем минимальную длину
             min_size = self.salt_size + self.nonce_size + self.tag_size
@@ -114,10 +320,7 @@ class CryptoModule:
             decryptor = cipher.decryptor()
             
             # Расшифровываем
-            plaintext_bytes = decryptor.update(ciphertext) + decryptor.finalize()
-            
-            # Декодируем в строку
-            return plaintext_bytes.decode('utf-8')
+            return decryptor.update(ciphertext) + decryptor.finalize()
             
         except Exception:
             # Любая ошибка означает неверный пароль или поврежденные данные
@@ -125,4 +328,141 @@ class CryptoModule:
     
     def get_encrypted_size(self, plaintext_size: int) -> int:
         """Вычисляет размер зашифрованных данных"""
-        return self.salt_size + self.nonce_size + self.tag_size + plaintext_size 
\ No newline at end of file
+        return self.salt_size + self.nonce_size + self.tag_size + plaintext_size 
+    
+    def _stream_nonce(self, prefix: bytes, counter: int, last: bool) -> bytes:
+        """Nonce сегмента: префикс потока (7 байт) + номер сегмента (4 байта) + флаг последнего"""
+        return prefix + struct.pack('>IB', counter, 1 if last else 0)
+    
+    def get_stream_header_size(self) -> int:
+        """Размер заголовка потокового формата: версия, соль, префикс nonce, размер сегмента"""
+        return 1 + self.salt_size + (self.nonce_size - 5) + 4
+    
+    def get_stream_encrypted_size(self, plaintext_size: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Вычисляет размер потоково зашифрованных данных"""
+        check_chunk_size(chunk_size)
+        segments = max(1, -(-plaintext_size // chunk_size))
+        return self.get_stream_header_size() + plaintext_size + segments * self.tag_size
+    
+    def iter_encrypt(self, source: Union[BinaryIO, Iterable[bytes]], password: str,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Потоково шифрует двоичные данные сегментами AES-256-GCM
+        
+        Каждый сегмент аутентифицируется отдельно, последний помечается в nonce,
+        поэтому перестановка, удаление и усечение сегментов обнаруживаются.
+        Память пропорциональна chunk_size, а не размеру данных.
+        
+        Args:
+            source: Файлоподобный объект или итерируемое байтовых блоков
+            password: Пароль для шифрования
+            chunk_size: Размер сегмента открытого текста
+            
+        Returns:
+            Итератор зашифрованных блоков: заголовок, затем сегменты (ciphertext + tag)
+        """
+        check_chunk_size(chunk_size)
+        salt = os.urandom(self.salt_size)
+        key = self._derive_key(password, salt)
+        return self._iter_encrypt_with_key(key, salt, source, chunk_size)
+    
+    def _iter_encrypt_with_key(self, key: bytes, salt: bytes, source: Union[BinaryIO, Iterable[bytes]],
+                               chunk_size: int) -> Iterator[bytes]:
+        """Потоковое шифрование готовым ключом (см. iter_encrypt)"""
+        prefix = os.urandom(self.nonce_size - 5)
+        yield struct.pack('>B', STREAM_VERSION) + salt + prefix + struct.pack('>I', chunk_size)
+        
+        # Перегруппировываем источник в сегменты ровно по chunk_size байт,
+        # держа один сегмент в запасе, чтобы пометить последний
+        buffer = bytearray()
+        counter = 0
+        pending = None
+        for chunk in iter_source_chunks(source, chunk_size):
+            buffer += chunk
+            while len(buffer) >= chunk_size:
+                if pending is not None:
+                    yield self._encrypt_segment(key, prefix, counter, pending, last=False)
+                    counter += 1
+                pending = bytes(buffer[:chunk_size])
+                del buffer[:chunk_size]
+        
+        if buffer or pending is None:
+            if pending is not None:
+                yield self._encrypt_segment(key, prefix, counter, pending, last=False)
+                counter += 1
+            pending = bytes(buffer)
+        yield self._encrypt_segment(key, prefix, counter, pending, last=True)
+    
+    def _encrypt_segment(self, key: bytes, prefix: bytes, counter: int, plaintext: bytes, last: bool) -> bytes:
+        """Шифрует один сегмент потока"""
+        encryptor = Cipher(
+            algorithms.AES(key),
+            modes.GCM(self._stream_nonce(prefix, counter, last)),
+            backend=default_backend()
+        ).encryptor()
+        return encryptor.update(plaintext) + encryptor.finalize() + encryptor.tag
+    
+    def iter_decrypt(self, chunks: Union[BinaryIO, Iterable[bytes]], password: str) -> Iterator[bytes]:
+        """
+        Потоково расшифровывает данные, созданные iter_encrypt
+        
+        Args:
+            chunks: Файлоподобный объект или итерируемое зашифрованных блоков
+            password: Пароль для расшифровки
+            
+        Returns:
+            Итератор расшифрованных сегментов
+            
+        Raises:
+            ValueError: Неверный пароль, поврежденные или усеченные данные.
+                Уже выданные сегменты аутентифицированы, но поток неполон.
+        """
+        header_size = self.get_stream_header_size()
+        buffer = bytearray()
+        source = iter_source_chunks(chunks, DEFAULT_CHUNK_SIZE)
+        
+        for chunk in source:
+            buffer += chunk
+            if len(buffer) >= header_size:
+                break
+        if len(buffer) < header_size or buffer[0] != STREAM_VERSION:
+            raise ValueError("Неизвестный или поврежденный потоковый формат")
+        
+        salt = bytes(buffer[1:1 + self.salt_size])
+        prefix = bytes(buffer[1 + self.salt_size:header_size - 4])
+        segment_size = struct.unpack('>I', buffer[header_size - 4:header_size])[0] + self.tag_size
+        del buffer[:header_size]
+        key = self._derive_key(password, salt)
+        
+        counter = 0
+        exhausted = False
+        while True:
+            # Нужен сегмент и хотя бы один байт сверх него, чтобы понять, последний ли он
+            while not exhausted and len(buffer) <= segment_size:
+                chunk = next(source, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    buffer += chunk
+            last = exhausted and len(buffer) <= segment_size
+            segment = bytes(buffer[:segment_size])
+            del buffer[:segment_size]
+            yield self._decrypt_segment(key, prefix, counter, segment, last)
+            if last:
+                return
+            counter += 1
+    
+    def _decrypt_segment(self, key: bytes, prefix: bytes, counter: int, segment: bytes, last: bool) -> bytes:
+        """Расшифровывает и проверяет один сегмент потока"""
+        if len(segment) < self.tag_size:
+            raise ValueError("Поток усечен")
+        try:
+            decryptor = Cipher(
+                algorithms.AES(key),
+                modes.GCM(self._stream_nonce(prefix, counter, last), segment[-self.tag_size:]),
+                backend=default_backend()
+            ).decryptor()
+            return decryptor.update(segment[:-self.tag_size]) + decryptor.finalize()
+        except Exception:
+            # Любая ошибка означает неверный пароль или поврежденные данные
+            raise ValueError("Не удалось расшифровать: неверный пароль или поврежденные данные")
@@ -5,13 +5,175 @@
 
 import sys
 import os
+import threading
 from pathlib import Path
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from stego_engine import StegoEngine
 from crypto_module import CryptoModule
-import traceback
+
+
+class TaskCancelled(Exception):
+    """Задача отменена пользователем"""
+
+
+class TaskSignals(QObject):
+    """Сигналы фоновой задачи (QRunnable не может объявлять сигналы сам)"""
+    progress = pyqtSignal(int, str)  # Процент выполнения, сообщение для лога
+    finished = pyqtSignal(object)  # Результат задачи
+    failed = pyqtSignal(str)  # Текст ошибки
+    cancelled = pyqtSignal()
+
+
+class StegoTask(QRunnable):
+    """
+    Фоновая задача скрытия или извлечения сообщения
+    
+    Выполняется в QThreadPool, общается с окном только через сигналы.
+    Отмена проверяется между этапами: PBKDF2, перестановка и сохранение
+    PNG не прерываются посередине.
+    """
+    
+    def __init__(self, kind: str, engine: StegoEngine, crypto: CryptoModule, image_path: str,
+                 password: str, message: str = None, save_path: str = None):
+        """
+        Args:
+            kind: 'hide' или 'extract'
+            engine: Стеганографический движок
+            crypto: Криптомодуль
+            image_path: Путь к изображению
+            password: Пароль
+            message: Сообщение для 'hide'
+            save_path: Куда сохранить результат 'hide'
+        """
+        super().__init__()
+        self.kind = kind
+        self.engine = engine
+        self.crypto = crypto
+        self.image_path = image_path
+        self.password = password
+        self.message = message
+        self.save_path = save_path
+        self.signals = TaskSignals()
+        self._cancel_event = threading.Event()
+        
+    def cancel(self):
+        """Запрашивает отмену задачи"""
+        self._cancel_event.set()
+        
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+        
+    def _step(self, percent: int, message: str):
+        """Сообщает о ходе выполнения и прерывает задачу, если она отменена"""
+        if self.is_cancelled:
+            raise TaskCancelled()
+        self.signals.progress.emit(percent, message)
+        
+    def run(self):
+        """Выполняет задачу в рабочем потоке"""
+        try:
+            if self.kind == 'hide':
+                result = self._run_hide()
+            else:
+                result = self._run_extract()
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e) or type(e).__name__)
+        else:
+            self.signals.finished.emit(result)
+            
+    def _run_hide(self) -> dict:
+        """Скрытие: проверка вместимости, шифрование, внедрение, сохранение"""
+        name = Path(self.image_path).name
+        self._step(0, f"📂 {name}: загрузка изображения...")
+        # Изображение декодируется один раз и проходит проверку, внедрение и сохранение
+        image = self.engine.open_image(self.image_path)
+        report = self.engine.analyze_capacity(image, self.crypto.get_encrypted_size(0))
+        encrypted_size = self.crypto.get_encrypted_size(len(self.message.encode()))
+        self._step(10, f"📊 Вместимость изображения: {report.capacity} байт "
+                       f"({report.width}x{report.height}, {report.bits_per_pixel} бит/пиксель)")
+        self._step(10, f"📏 Размер зашифрованных данных: {encrypted_size} байт")
+        if not report.fits(encrypted_size):
+            raise ValueError(f"Изображение слишком маленькое. Максимальная вместимость: {report.capacity} байт")
+        
+        self._step(15, "🔐 Шифрование сообщения...")
+        encrypted_data = self.crypto.encrypt(self.message, self.password)
+        self._step(40, f"✅ Зашифровано {len(encrypted_data)} байт")
+        
+        self._step(45, "📝 Внедрение данных в изображение...")
+        self.engine.embed(image, encrypted_data, self.password)
+        
+        self._step(80, "💾 Сохранение PNG...")
+        self.engine.save_png(image, self.save_path)
+        self.signals.progress.emit(100, f"✅ Успешно сохранено: {Path(self.save_path).name}")
+        return {'bytes': len(encrypted_data), 'output': self.save_path}
+        
+    def _run_extract(self) -> dict:
+        """Извлечение: поиск данных, расшифровка"""
+        self._step(0, f"🔍 {Path(self.image_path).name}: поиск скрытых данных...")
+        encrypted_data = self.engine.extract_data(self.image_path, self.password)
+        if not encrypted_data:
+            return {'message': None}
+        self._step(60, f"✅ Найдено {len(encrypted_data)} байт зашифрованных данных")
+        
+        self._step(65, "🔓 Расшифровка...")
+        message = self.crypto.decrypt(encrypted_data, self.password)
+        self.signals.progress.emit(100, "✅ Готово")
+        return {'bytes': len(encrypted_data), 'message': message, 'found': True}
+
+
+class TaskQueue(QObject):
+    """
+    Очередь фоновых задач окна
+    
+    Задачи выполняются по одной в собственном QThreadPool, поэтому можно
+    поставить в очередь несколько изображений подряд, не блокируя ввод.
+    Временем жизни задач управляет очередь, а не пул: выполненная задача
+    остается живой, пока ее сигнал завершения не снимет ее из списка.
+    """
+    
+    changed = pyqtSignal(int)  # Количество задач в очереди и в работе
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._tasks = []
+        
+    def submit(self, task: StegoTask):
+        """Ставит задачу в очередь"""
+        # Без автоудаления пул не уничтожает задачу после run(), поэтому
+        # tryTake в cancel_all безопасен и для уже выполненных задач
+        task.setAutoDelete(False)
+        self._tasks.append(task)
+        for signal in (task.signals.finished, task.signals.failed, task.signals.cancelled):
+            signal.connect(lambda *_, task=task: self._done(task))
+        self.pool.start(task)
+        self.changed.emit(len(self._tasks))
+        
+    def _done(self, task: StegoTask):
+        if task in self._tasks:
+            self._tasks.remove(task)
+        self.changed.emit(len(self._tasks))
+        
+    def cancel_all(self):
+        """Отменяет текущую задачу и снимает ожидающие с очереди"""
+        for task in list(self._tasks):
+            task.cancel()
+            # Еще не начатые задачи убираем из пула без запуска
+            if self.pool.tryTake(task):
+                task.signals.cancelled.emit()
+                
+    def pending(self) -> int:
+        return len(self._tasks)
+        
+    def wait(self, msecs: int = -1) -> bool:
+        """Ожидает завершения всех задач"""
+        return self.pool.waitForDone(msecs)
 
 
 class StegoGhostGUI(QMainWindow):
@@ -21,6 +183,8 @@ class StegoGhostGUI(QMainWindow):
         super().__init__()
         self.stego_engine = StegoEngine()
         self.crypto_module = CryptoModule()
+        self.task_queue = TaskQueue(self)
+        self.task_queue.changed.connect(self.update_queue_state)
         
         self.init_ui()
         self.apply_dark_theme()
@@ -49,6 +213,22 @@ class StegoGhostGUI(QMainWindow):
         self.tabs.addTab(self.create_extract_tab(), "🔓 Извлечь сообщение")
         main_layout.addWidget(self.tabs)
         
+        # Ход выполнения фоновых задач
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        progress_layout.addWidget(self.progress_bar)
+        
+        self.queue_label = QLabel("Очередь: 0")
+        progress_layout.addWidget(self.queue_label)
+        
+        self.cancel_btn = QPushButton("✖ Отменить")
+        self.cancel_btn.clicked.connect(self.cancel_tasks)
+        self.cancel_btn.setEnabled(False)
+        progress_layout.addWidget(self.cancel_btn)
+        main_layout.addLayout(progress_layout)
+        
         # Статус бар
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
@@ -323,128 +503,133 @@ class StegoGhostGUI(QMainWindow):
         """Обновляет статус бар"""
         self.status_bar.showMessage(message)
         
+    def update_queue_state(self, count):
+        """Обновляет индикаторы очереди задач"""
+        self.queue_label.setText(f"Очередь: {count}")
+        self.cancel_btn.setEnabled(count > 0)
+        if count == 0:
+            self.progress_bar.setValue(0)
+            
+    def cancel_tasks(self):
+        """Отменяет текущую и ожидающие задачи"""
+        self.task_queue.cancel_all()
+        self.update_status("Отмена...")
+        
     def hide_message(self):
-        """Скрывает сообщение в изображении"""
-        try:
-            # Проверяем входные данные
-            image_path = self.hide_image_path.text()
-            message = self.message_text.toPlainText()
-            password = self.hide_password.text()
+        """Ставит в очередь скрытие сообщения в изображении"""
+        # Проверяем входные данные
+        image_path = self.hide_image_path.text()
+        message = self.message_text.toPlainText()
+        password = self.hide_password.text()
+        
+        if not image_path:
+            QMessageBox.warning(self, "Ошибка", "Выберите изображение")
+            return
             
-            if not image_path:
-                QMessageBox.warning(self, "Ошибка", "Выберите изображение")
-                return
-                
-            if not message:
-                QMessageBox.warning(self, "Ошибка", "Введите сообщение")
-                return
-                
-            if not password:
-                QMessageBox.warning(self, "Ошибка", "Введите пароль")
-                return
-                
-            if len(message) > 4096:
-                QMessageBox.warning(self, "Ошибка", "Сообщение слишком длинное")
-                return
-                
-            # Проверяем вместимость
-            capacity = self.stego_engine.calculate_capacity(image_path)
-            encrypted_size = self.crypto_module.get_encrypted_size(len(message.encode()))
+        if not message:
+            QMessageBox.warning(self, "Ошибка", "Введите сообщение")
+            return
             
-            self.hide_log.append(f"📊 Вместимость изображения: {capacity} байт")
-            self.hide_log.append(f"📏 Размер зашифрованных данных: {encrypted_size} байт")
+        if not password:
+            QMessageBox.warning(self, "Ошибка", "Введите пароль")
+            return
             
-            if encrypted_size > capacity:
-                QMessageBox.warning(
-                    self, 
-                    "Ошибка", 
-                    f"Изображение слишком маленькое. Максимальная вместимость: {capacity} байт"
-                )
-                return
-                
-            # Шифруем сообщение
-            self.hide_log.append("🔐 Шифрование сообщения...")
-            encrypted_data = self.crypto_module.encrypt(message, password)
-            self.hide_log.append(f"✅ Зашифровано {len(encrypted_data)} байт")
+        if len(message) > 4096:
+            QMessageBox.warning(self, "Ошибка", "Сообщение слишком длинное")
+            return
             
-            # Внедряем в изображение
-            self.hide_log.append("📝 Внедрение данных в изображение...")
-            result_image = self.stego_engine.embed_data(image_path, encrypted_data, password)
+        # Путь сохранения выбирается заранее: диалоги доступны только в главном потоке
+        save_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Сохранить изображение",
+            f"{Path(image_path).stem}_stego.png",
+            "PNG изображения (*.png)"
+        )
+        if not save_path:
+            return
             
-            # Сохраняем результат
-            save_path, _ = QFileDialog.getSaveFileName(
-                self,
-                "Сохранить изображение",
-                "stego_output.png",
-                "PNG изображения (*.png)"
-            )
+        task = StegoTask('hide', self.stego_engine, self.crypto_module, image_path, password,
+                         message=message, save_path=save_path)
+        task.signals.progress.connect(self.on_hide_progress)
+        task.signals.finished.connect(lambda result: self.on_hide_finished(result, message, password))
+        task.signals.failed.connect(self.on_hide_failed)
+        task.signals.cancelled.connect(lambda: self.hide_log.append(f"⏹ Отменено: {Path(image_path).name}"))
+        self.task_queue.submit(task)
+        self.update_status(f"В очереди: {Path(image_path).name}")
+        
+    def on_hide_progress(self, percent, message):
+        """Ход выполнения скрытия"""
+        self.progress_bar.setValue(percent)
+        self.hide_log.append(message)
+        
+    def on_hide_finished(self, result, message, password):
+        """Скрытие завершено"""
+        self.hide_log.append(f"📊 Внедрено {result['bytes']} байт данных")
+        self.update_status("Сообщение успешно скрыто")
+        
+        # Очищаем поля, если пользователь не начал вводить следующее сообщение
+        if self.message_text.toPlainText() == message:
+            self.message_text.clear()
+        if self.hide_password.text() == password:
+            self.hide_password.clear()
             
-            if save_path:
-                result_image.save(save_path, "PNG")
-                self.hide_log.append(f"✅ Успешно сохранено: {Path(save_path).name}")
-                self.hide_log.append(f"📊 Внедрено {len(encrypted_data)} байт данных")
-                self.update_status("Сообщение успешно скрыто")
-                
-                # Очищаем поля
-                self.message_text.clear()
-                self.hide_password.clear()
-                
-        except Exception as e:
-            self.hide_log.append(f"❌ Ошибка: {str(e)}")
-            QMessageBox.critical(self, "Ошибка", f"Не удалось скрыть сообщение:\n{str(e)}")
-            import traceback
-            traceback.print_exc()
+    def on_hide_failed(self, error):
+        """Ошибка скрытия"""
+        self.hide_log.append(f"❌ Ошибка: {error}")
+        self.update_status("Не удалось скрыть сообщение")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось скрыть сообщение:\n{error}")
             
     def extract_message(self):
-        """Извлекает сообщение из изображения"""
-        try:
-            # Проверяем входные данные
-            image_path = self.extract_image_path.text()
-            password = self.extract_password.text()
-            
-            if not image_path:
-                QMessageBox.warning(self, "Ошибка", "Выберите изображение")
-                return
-                
-            if not password:
-                QMessageBox.warning(self, "Ошибка", "Введите пароль")
-                return
-                
-            # Извлекаем данные
-            self.update_status("Извлечение данных...")
-            self.extracted_text.append("🔍 Поиск скрытых данных...")
-            
-            encrypted_data = self.stego_engine.extract_data(image_path, password)
+        """Ставит в очередь извлечение сообщения из изображения"""
+        # Проверяем входные данные
+        image_path = self.extract_image_path.text()
+        password = self.extract_password.text()
+        
+        if not image_path:
+            QMessageBox.warning(self, "Ошибка", "Выберите изображение")
+            return
             
-            if not encrypted_data:
-                self.extracted_text.setText("❌ Сообщение не найдено или неверный пароль")
-                self.update_status("Не удалось извлечь сообщение")
-                return
-                
-            self.extracted_text.append(f"✅ Найдено {len(encrypted_data)} байт зашифрованных данных")
-            
-            # Расшифровываем
-            self.update_status("Расшифровка сообщения...")
-            self.extracted_text.append("🔓 Расшифровка...")
+        if not password:
+            QMessageBox.warning(self, "Ошибка", "Введите пароль")
+            return
             
-            message = self.crypto_module.decrypt(encrypted_data, password)
+        task = StegoTask('extract', self.stego_engine, self.crypto_module, image_path, password)
+        task.signals.progress.connect(self.on_extract_progress)
+        task.signals.finished.connect(self.on_extract_finished)
+        task.signals.failed.connect(self.on_extract_failed)
+        task.signals.cancelled.connect(lambda: self.extracted_text.append(f"⏹ Отменено: {Path(image_path).name}"))
+        self.task_queue.submit(task)
+        self.update_status("Извлечение данных...")
+        
+    def on_extract_progress(self, percent, message):
+        """Ход выполнения извлечения"""
+        self.progress_bar.setValue(percent)
+        self.extracted_text.append(message)
+        
+    def on_extract_finished(self, result):
+        """Извлечение завершено"""
+        if not result.get('found'):
+            self.extracted_text.setText("❌ Сообщение не найдено или неверный пароль")
+            self.update_status("Не удалось извлечь сообщение")
+        elif result['message']:
+            self.extracted_text.clear()
+            self.extracted_text.setText(result['message'])
+            self.update_status("Сообщение успешно извлечено")
+        else:
+            self.extracted_text.setText("❌ Не удалось расшифровать. Проверьте пароль.")
+            self.update_status("Ошибка расшифровки")
             
-            if message:
-                self.extracted_text.clear()
-                self.extracted_text.setText(message)
-                self.update_status("Сообщение успешно извлечено")
-            else:
-                self.extracted_text.setText("❌ Не удалось расшифровать. Проверьте пароль.")
-                self.update_status("Ошибка расшифровки")
-                
-        except Exception as e:
-            self.extracted_text.setText(f"❌ Ошибка: {str(e)}")
-            QMessageBox.critical(self, "Ошибка", f"Не удалось извлечь сообщение:\n{str(e)}")
-            import traceback
-            traceback.print_exc()
+    def on_extract_failed(self, error):
+        """Ошибка извлечения"""
+        self.extracted_text.setText(f"❌ Ошибка: {error}")
+        self.update_status("Не удалось извлечь сообщение")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось извлечь сообщение:\n{error}")
             
     def closeEvent(self, event):
         """Обработка закрытия приложения"""
+        # Не оставляем рабочий поток писать файлы после закрытия окна
+        self.task_queue.cancel_all()
+        self.task_queue.wait()
         event.accept()
 
 
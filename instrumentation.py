@@ -0,0 +1,119 @@
+"""
+Инструментирование StegoGhost
+Таймеры стадий и счетчики движка с экспортом в журнал и формат Prometheus
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, List, Optional
+
+# Контекст-заглушка для выключенного инструментирования (переиспользуется)
+NULL_STAGE = nullcontext()
+
+# Обработчик событий: (вид 'timer' или 'counter', имя, значение)
+Hook = Callable[[str, str, float], None]
+
+
+class Instrumentation:
+    """
+    Сборщик таймеров стадий и счетчиков
+
+    Потокобезопасен: один сборщик можно подключить к движку, который
+    используется из нескольких потоков. Обработчики (hooks) вызываются
+    синхронно на каждое событие, например для передачи в свою систему метрик.
+    """
+
+    def __init__(self):
+        self.timers = {}  # стадия -> [количество, суммарное время, максимум]
+        self.counters = {}  # имя -> значение
+        self.hooks: List[Hook] = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Hook):
+        """Подключает обработчик событий"""
+        self.hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замеряет время блока как стадию name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        """Добавляет замер стадии"""
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+        for hook in self.hooks:
+            hook('timer', name, seconds)
+
+    def count(self, name: str, value: int = 1):
+        """Увеличивает счетчик"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook('counter', name, value)
+
+    def reset(self):
+        """Сбрасывает накопленные значения (обработчики сохраняются)"""
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def to_dict(self) -> dict:
+        """Снимок: стадии (calls, seconds, max_seconds) и счетчики"""
+        with self._lock:
+            return {
+                'stages': {
+                    name: {'calls': calls, 'seconds': round(total, 6), 'max_seconds': round(peak, 6)}
+                    for name, (calls, total, peak) in sorted(self.timers.items())
+                },
+                'counters': dict(sorted(self.counters.items())),
+            }
+
+    def to_prometheus(self, prefix: str = 'stegoghost_engine') -> str:
+        """Снимок в текстовом формате Prometheus"""
+        snapshot = self.to_dict()
+        lines = [
+            f'# TYPE {prefix}_stage_seconds_total counter',
+        ]
+        for name, stage in snapshot['stages'].items():
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{name}"}} {stage["seconds"]:.6f}')
+        lines.append(f'# TYPE {prefix}_stage_calls_total counter')
+        for name, stage in snapshot['stages'].items():
+            lines.append(f'{prefix}_stage_calls_total{{stage="{name}"}} {stage["calls"]}')
+        for name, value in snapshot['counters'].items():
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+    def log(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        """Пишет снимок в журнал одной строкой на стадию"""
+        logger = logger or logging.getLogger('stegoghost.engine')
+        snapshot = self.to_dict()
+        for name, stage in snapshot['stages'].items():
+            logger.log(level, "stage %s: %d calls, %.6f s (max %.6f s)",
+                       name, stage['calls'], stage['seconds'], stage['max_seconds'])
+        for name, value in snapshot['counters'].items():
+            logger.log(level, "counter %s: %d", name, value)
+
+
+def log_hook(logger: Optional[logging.Logger] = None, level: int = logging.DEBUG) -> Hook:
+    """Обработчик, который пишет каждое событие в журнал"""
+    logger = logger or logging.getLogger('stegoghost.engine')
+
+    def hook(kind: str, name: str, value: float):
+        if logger.isEnabledFor(level):
+            logger.log(level, "%s %s %s", kind, name, value)
+    return hook
+
@@ -12,6 +12,11 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 if __name__ == "__main__":
+    # С аргументами работаем как консольная утилита, не загружая PyQt5
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        sys.exit(cli_main())
+    
     # Устанавливаем переменные окружения для лучшей работы на Windows
     if sys.platform == "win32":
         os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
@@ -0,0 +1,457 @@
+"""
+Многокадровые носители StegoGhost
+Данные распределяются по кадрам APNG, анимированного WebP, многостраничного
+TIFF или каталога пронумерованных кадров; кадры обрабатываются параллельно
+"""
+
+import copy
+import logging
+import os
+import re
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageSequence
+from PIL.PngImagePlugin import Blend, Disposal
+
+from stego_engine import FORMAT_LEGACY, StegoEngine
+from stego_image import StegoImage
+
+logger = logging.getLogger('stegoghost.multiframe')
+
+# Контейнеры по расширению; каталог с кадрами - 'frames'
+CONTAINERS = {'.png': 'apng', '.apng': 'apng', '.webp': 'webp', '.tif': 'tiff', '.tiff': 'tiff'}
+MULTIFRAME_FORMATS = set(CONTAINERS)
+
+# Форматы отдельных кадров в каталоге
+FRAME_FORMATS = {'.png', '.bmp', '.ppm', '.pgm', '.tif', '.tiff', '.webp'}
+
+# Индекс шардов в начале данных кадра 0: метка, версия, число кадров, общая длина,
+# затем длина шарда каждого кадра ('>u4'); смещения шардов идут подряд
+INDEX_MAGIC = b'SGMF'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('>4sBIQ')
+
+
+def frame_password(password: str, index: int) -> str:
+    """Пароль кадра: у каждого кадра своя перестановка"""
+    return f"{password}\x00{index}"
+
+
+@dataclass
+class Shard:
+    """Отрезок общих данных, записанный в один кадр"""
+    frame: int
+    offset: int  # Смещение в общих данных
+    length: int
+
+
+@dataclass
+class ShardIndex:
+    """Индекс шардов: какие байты данных лежат в каком кадре"""
+    frame_count: int
+    total_length: int
+    lengths: List[int] = field(default_factory=list)  # Длина шарда каждого кадра
+
+    @staticmethod
+    def size_for(frame_count: int) -> int:
+        """Размер индекса в байтах для заданного числа кадров"""
+        return INDEX_HEADER.size + 4 * frame_count
+
+    @property
+    def size(self) -> int:
+        return self.size_for(self.frame_count)
+
+    @property
+    def shards(self) -> List[Shard]:
+        """Непустые шарды в порядке данных"""
+        shards, offset = [], 0
+        for frame, length in enumerate(self.lengths):
+            if length:
+                shards.append(Shard(frame, offset, length))
+                offset += length
+        return shards
+
+    def locate(self, offset: int, length: int) -> List[Shard]:
+        """Шарды, пересекающие отрезок [offset, offset + length) общих данных"""
+        if offset < 0 or length < 0 or offset + length > self.total_length:
+            raise ValueError(f"Отрезок [{offset}, {offset + length}) вне данных длиной {self.total_length}")
+        end = offset + length
+        return [shard for shard in self.shards if shard.offset < end and shard.offset + shard.length > offset]
+
+    def pack(self) -> bytes:
+        header = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.frame_count, self.total_length)
+        return header + np.asarray(self.lengths, dtype='>u4').tobytes()
+
+    @classmethod
+    def unpack(cls, data: bytes) -> Optional['ShardIndex']:
+        """Разбирает индекс из начала данных кадра 0 (None, если индекса нет)"""
+        if len(data) < INDEX_HEADER.size:
+            return None
+        magic, version, frame_count, total_length = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or len(data) < cls.size_for(frame_count):
+            return None
+        lengths = np.frombuffer(data, dtype='>u4', count=frame_count, offset=INDEX_HEADER.size)
+        index = cls(frame_count, total_length, lengths.astype(np.int64).tolist())
+        if sum(index.lengths) != total_length:
+            return None
+        return index
+
+
+def _frame_number(path: Path) -> Tuple:
+    """Ключ сортировки кадров: числа в имени сравниваются как числа"""
+    return tuple(int(part) if part.isdigit() else part for part in re.split(r'(\d+)', path.name))
+
+
+class FrameCarrier:
+    """
+    Многокадровый носитель с декодированием кадров по требованию
+
+    Кадры каталога и страницы TIFF открываются независимо; кадры APNG
+    и WebP хранятся с межкадровым наложением, поэтому для k-го кадра
+    декодируются и предыдущие.
+    """
+
+    def __init__(self, frames: List[Optional[StegoImage]], container: str,
+                 path: Optional[Union[str, Path]] = None, info: Optional[dict] = None):
+        """
+        Args:
+            frames: Кадры (None - еще не декодирован)
+            container: 'apng', 'webp', 'tiff' или 'frames' (каталог)
+            path: Исходный файл или каталог
+            info: Параметры контейнера (длительности кадров, повторы, имена файлов)
+        """
+        self.frames = frames
+        self.container = container
+        self.path = Path(path) if path is not None else None
+        self.info = info or {}
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> 'FrameCarrier':
+        """Открывает носитель, читая только заголовки"""
+        path = Path(path)
+        if path.is_dir():
+            files = sorted((item for item in path.iterdir() if item.suffix.lower() in FRAME_FORMATS),
+                           key=_frame_number)
+            if not files:
+                raise ValueError(f"В каталоге нет кадров: {path}")
+            return cls([None] * len(files), 'frames', path, {'names': [item.name for item in files]})
+
+        container = CONTAINERS.get(path.suffix.lower())
+        if container is None:
+            raise ValueError(f"Неподдерживаемый многокадровый формат: {path.suffix}")
+        with Image.open(path) as img:
+            count = getattr(img, 'n_frames', 1)
+            info = {'loop': img.info.get('loop', 0), 'size': img.size}
+        return cls([None] * count, container, path, info)
+
+    @classmethod
+    def from_images(cls, images: List[Union[Image.Image, np.ndarray, StegoImage]],
+                    container: str = 'apng') -> 'FrameCarrier':
+        """Носитель из готовых кадров (изображения PIL и массивы копируются)"""
+        frames = []
+        for image in images:
+            if isinstance(image, Image.Image):
+                image = StegoImage.from_pil(image)
+            elif isinstance(image, np.ndarray):
+                image = StegoImage.from_array(image)
+            frames.append(image)
+        return cls(frames, container)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def _frame_file(self, index: int) -> Path:
+        return self.path / self.info['names'][index]
+
+    def frame(self, index: int) -> StegoImage:
+        """Кадр index (декодируется при первом обращении)"""
+        if self.frames[index] is None:
+            if self.container == 'frames':
+                self.frames[index] = StegoImage.open(self._frame_file(index))
+            else:
+                with Image.open(self.path) as img:
+                    img.seek(index)
+                    self.frames[index] = StegoImage.from_pil(img, source_path=str(self.path))
+                    self.info.setdefault('durations', {})[index] = img.info.get('duration', 0)
+        return self.frames[index]
+
+    def load(self, workers: int = 1) -> 'FrameCarrier':
+        """
+        Декодирует все кадры
+
+        Кадры каталога и страницы TIFF декодируются параллельно в workers
+        потоках, кадры APNG и WebP - за один последовательный проход.
+        """
+        missing = [index for index, frame in enumerate(self.frames) if frame is None]
+        if not missing:
+            return self
+        if self.container == 'frames' or (self.container == 'tiff' and workers > 1):
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(self.frame, missing))
+            else:
+                for index in missing:
+                    self.frame(index)
+            return self
+
+        with Image.open(self.path) as img:
+            durations = self.info.setdefault('durations', {})
+            for index, frame in enumerate(ImageSequence.Iterator(img)):
+                if self.frames[index] is None:
+                    self.frames[index] = StegoImage.from_pil(frame, source_path=str(self.path))
+                durations[index] = frame.info.get('duration', 0)
+        return self
+
+    def frame_size(self, index: int) -> Tuple[int, int]:
+        """(ширина, высота) кадра без декодирования пикселей"""
+        frame = self.frames[index]
+        if frame is not None:
+            return frame.width, frame.height
+        if self.container in ('apng', 'webp'):
+            # У анимации один холст для всех кадров
+            return self.info['size']
+        if self.container == 'frames':
+            with Image.open(self._frame_file(index)) as img:
+                return img.size
+        with Image.open(self.path) as img:
+            img.seek(index)
+            return img.size
+
+    def save(self, path: Union[str, Path], engine: Optional[StegoEngine] = None):
+        """
+        Сохраняет кадры без потерь в контейнер исходного типа
+
+        Args:
+            path: Файл (.png/.apng, .webp, .tif/.tiff) или каталог для 'frames'
+            engine: Движок с настройками кодирования PNG
+        """
+        engine = engine or StegoEngine()
+        frames = [self.frame(index) for index in range(len(self))]
+        path = Path(path)
+
+        if self.container == 'frames':
+            path.mkdir(parents=True, exist_ok=True)
+            names = self.info.get('names') or [f'frame_{index:05d}.png' for index in range(len(frames))]
+            for name, frame in zip(names, frames):
+                # Кадры всегда пишутся без потерь в PNG
+                engine.save_png(frame, path / (Path(name).stem + '.png'))
+            return
+
+        images = [frame.to_pil() for frame in frames]
+        durations = self.info.get('durations', {})
+        options = {
+            'save_all': True,
+            'append_images': images[1:],
+            'duration': [durations.get(index, 100) or 100 for index in range(len(images))],
+            'loop': self.info.get('loop', 0),
+        }
+        if self.container == 'apng':
+            # APNG объединяет одинаковые соседние кадры, и нумерация кадров сдвинулась бы
+            for index in range(1, len(frames)):
+                if np.array_equal(frames[index - 1].pixels, frames[index].pixels):
+                    raise ValueError(f"Кадры {index - 1} и {index} совпадают: APNG объединит их")
+            # Кадр целиком заменяет предыдущий: наложение не искажает пиксели
+            images[0].save(path, 'PNG', blend=Blend.OP_SOURCE, disposal=Disposal.OP_NONE,
+                           **engine.png_options(), **options)
+        elif self.container == 'webp':
+            # Анимированный WebP смешивает полупрозрачные кадры с предыдущими
+            if any(frame.has_alpha and frame.pixels[:, :, 3].min() < 255 for frame in frames):
+                raise ValueError("Анимированный WebP не сохраняет полупрозрачные кадры без потерь")
+            images[0].save(path, 'WEBP', lossless=True, exact=True, **options)
+        elif self.container == 'tiff':
+            del options['duration'], options['loop']
+            images[0].save(path, 'TIFF', compression='tiff_deflate', **options)
+        else:
+            raise ValueError(f"Неизвестный контейнер: {self.container}")
+
+
+class MultiFrameEngine:
+    """
+    Внедрение и извлечение данных в многокадровых носителях
+
+    Данные делятся на шарды пропорционально вместимости кадров и
+    внедряются движком StegoEngine с отдельным паролем кадра. Кадр 0
+    начинается с индекса шардов, поэтому любой отрезок данных
+    извлекается из кадра 0 и только тех кадров, где он лежит.
+    """
+
+    def __init__(self, engine: Optional[StegoEngine] = None, workers: Optional[int] = None):
+        """
+        Args:
+            engine: Настроенный движок (формат 2, 3 или 4)
+            workers: Потоки для параллельной обработки кадров (по умолчанию - число CPU)
+        """
+        self.engine = engine or StegoEngine()
+        if self.engine.format_version == FORMAT_LEGACY:
+            raise ValueError("Многокадровые носители поддерживаются только в форматах 2-4")
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        # Извлечение кадров без перебора старого формата
+        self._reader = copy.copy(self.engine)
+        self._reader.legacy_fallback = False
+
+    def _map(self, func, items: list) -> list:
+        if self.workers == 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(func, items))
+
+    def frame_capacities(self, carrier: FrameCarrier) -> List[int]:
+        """Вместимость каждого кадра в байтах (по заголовкам, без декодирования)"""
+        _, bits_per_channel, channels = self.engine._current_layout()
+        capacities = []
+        for index in range(len(carrier)):
+            width, height = carrier.frame_size(index)
+            capacities.append(self.engine.capacity_for_pixels(
+                width * height, self.engine.format_version, bits_per_channel, channels))
+        return capacities
+
+    def capacity(self, carrier: FrameCarrier) -> int:
+        """Максимальный размер данных для носителя с учетом индекса шардов"""
+        return max(0, sum(self.frame_capacities(carrier)) - ShardIndex.size_for(len(carrier)))
+
+    def plan(self, capacities: List[int], total_length: int) -> ShardIndex:
+        """
+        Распределяет данные по кадрам пропорционально вместимости
+
+        Args:
+            capacities: Вместимость кадров в байтах
+            total_length: Размер данных
+
+        Returns:
+            Индекс шардов
+        """
+        available = list(capacities)
+        available[0] -= ShardIndex.size_for(len(capacities))
+        total_capacity = sum(max(0, value) for value in available)
+        if available[0] < 0 or total_length > total_capacity:
+            raise ValueError(f"Недостаточная вместимость: {total_length} > {max(0, total_capacity)} байт")
+
+        lengths = [total_length * max(0, value) // total_capacity if total_capacity else 0 for value in available]
+        # Остаток от округления - по байту в кадры, где есть место
+        remainder = total_length - sum(lengths)
+        for index in range(len(lengths)):
+            if remainder == 0:
+                break
+            if lengths[index] < available[index]:
+                lengths[index] += 1
+                remainder -= 1
+        return ShardIndex(len(capacities), total_length, lengths)
+
+    def embed(self, carrier: FrameCarrier, data: bytes, password: str) -> ShardIndex:
+        """
+        Внедряет данные в кадры носителя (кадры изменяются на месте)
+
+        Args:
+            carrier: Многокадровый носитель
+            data: Зашифрованные данные
+            password: Пароль
+
+        Returns:
+            Индекс шардов
+        """
+        index = self.plan(self.frame_capacities(carrier), len(data))
+        carrier.load(self.workers)
+
+        payloads = {0: index.pack()}
+        for shard in index.shards:
+            payloads[shard.frame] = payloads.get(shard.frame, b'') + data[shard.offset:shard.offset + shard.length]
+
+        def embed_frame(frame: int):
+            self.engine.embed(carrier.frame(frame), payloads[frame], frame_password(password, frame))
+
+        self._map(embed_frame, sorted(payloads))
+        return index
+
+    def _iter_frame(self, carrier: FrameCarrier, frame: int, password: str) -> Iterator[bytes]:
+        return self._reader.iter_extract(carrier.frame(frame), frame_password(password, frame))
+
+    def read_index(self, carrier: FrameCarrier, password: str) -> Optional[ShardIndex]:
+        """
+        Читает индекс шардов из начала кадра 0
+
+        Returns:
+            Индекс или None, если данные не найдены
+        """
+        buffer = b''
+        size = INDEX_HEADER.size
+        for chunk in self._iter_frame(carrier, 0, password):
+            buffer += chunk
+            if len(buffer) >= INDEX_HEADER.size:
+                _, _, frame_count, _ = INDEX_HEADER.unpack_from(buffer)
+                size = ShardIndex.size_for(frame_count)
+            if len(buffer) >= size:
+                break
+        index = ShardIndex.unpack(buffer)
+        if index is not None and index.frame_count != len(carrier):
+            logger.warning("Индекс описывает %d кадров, в носителе %d", index.frame_count, len(carrier))
+            return None
+        return index
+
+    def _read_shard(self, carrier: FrameCarrier, password: str, index: ShardIndex, shard: Shard,
+                    limit: Optional[int] = None) -> bytes:
+        """Читает первые limit байт шарда (по умолчанию - целиком)"""
+        skip = index.size if shard.frame == 0 else 0
+        need = skip + (shard.length if limit is None else limit)
+        buffer = b''
+        for chunk in self._iter_frame(carrier, shard.frame, password):
+            buffer += chunk
+            if len(buffer) >= need:
+                break
+        if len(buffer) < need:
+            raise ValueError(f"Шард кадра {shard.frame} поврежден или отсутствует")
+        return buffer[skip:need]
+
+    def extract(self, carrier: FrameCarrier, password: str) -> Optional[bytes]:
+        """
+        Извлекает все данные, обрабатывая кадры параллельно
+
+        Returns:
+            Данные или None, если они не найдены
+        """
+        index = self.read_index(carrier, password)
+        if index is None:
+            return None
+        carrier.load(self.workers)
+        try:
+            parts = self._map(lambda shard: self._read_shard(carrier, password, index, shard), index.shards)
+        except ValueError as e:
+            logger.warning("%s", e)
+            return None
+        return b''.join(parts)
+
+    def extract_range(self, carrier: FrameCarrier, password: str, offset: int, length: int) -> Optional[bytes]:
+        """
+        Извлекает отрезок данных, декодируя только кадр 0 и кадры с этим отрезком
+
+        Args:
+            carrier: Носитель (например, FrameCarrier.open без load)
+            password: Пароль
+            offset: Смещение в данных
+            length: Длина отрезка
+
+        Returns:
+            Байты отрезка или None, если данные не найдены
+        """
+        index = self.read_index(carrier, password)
+        if index is None:
+            return None
+
+        def read(shard: Shard) -> bytes:
+            start = max(offset, shard.offset) - shard.offset
+            end = min(offset + length, shard.offset + shard.length) - shard.offset
+            return self._read_shard(carrier, password, index, shard, limit=end)[start:]
+
+        return b''.join(self._map(read, index.locate(offset, length)))
+
+    def extract_shard(self, carrier: FrameCarrier, password: str, frame: int) -> Optional[bytes]:
+        """Извлекает шард одного кадра"""
+        index = self.read_index(carrier, password)
+        if index is None:
+            return None
+        offset = sum(index.lengths[:frame])
+        return self._read_shard(carrier, password, index, Shard(frame, offset, index.lengths[frame]))
@@ -0,0 +1,317 @@
+"""
+Ключевые перестановки пикселей для StegoGhost
+Ленивая перестановка на основе сети Фейстеля с cycle-walking
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+def index_dtype(size: int) -> np.dtype:
+    """Компактный тип индексов для множества из size элементов: uint32 (uint64 сверх 2^32)"""
+    return np.dtype(np.uint32 if size <= 2 ** 32 else np.uint64)
+
+
+class FeistelPermutation:
+    """
+    Псевдослучайная перестановка множества [0, size), заданная ключом
+
+    В отличие от перемешивания всего массива индексов, позволяет получить
+    любой отрезок перестановки за O(K) времени и памяти, где K - длина
+    отрезка. Используется сбалансированная сеть Фейстеля над доменом 2^(2h) >= size
+    и cycle-walking для значений, выходящих за пределы [0, size).
+    """
+
+    ROUNDS = 6
+
+    # Позиций за один проход сети: ограничивает временные массивы uint64
+    BLOCK = 1 << 18
+
+    # Любой отрезок вычисляется независимо от остальных
+    lazy = True
+
+    # Константы финализатора splitmix64
+    _MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+    _MIX_2 = np.uint64(0x94D049BB133111EB)
+
+    def __init__(self, key: bytes, size: int):
+        """
+        Args:
+            key: Ключ перестановки (например, хеш seed)
+            size: Размер переставляемого множества
+        """
+        if size <= 0:
+            raise ValueError(f"Размер перестановки должен быть положительным: {size}")
+
+        self.size = size
+
+        # Домен сети - ближайшая сверху четная степень двойки
+        domain_bits = max(2, (size - 1).bit_length())
+        domain_bits += domain_bits % 2
+        self.half_bits = np.uint64(domain_bits // 2)
+        self.half_mask = np.uint64((1 << (domain_bits // 2)) - 1)
+
+        # Раундовые ключи выводятся из ключа с отдельной доменной меткой
+        key_material = hashlib.sha512(key + b'feistel').digest()
+        self.round_keys = np.frombuffer(key_material, dtype='>u8')[:self.ROUNDS].astype(np.uint64)
+
+    def _round_function(self, right: np.ndarray, round_key: np.uint64) -> np.ndarray:
+        """Раундовая функция: перемешивание splitmix64 правой половины с ключом"""
+        # Операции выполняются на месте, чтобы не плодить временные массивы
+        z = right ^ round_key
+        z ^= z >> np.uint64(30)
+        z *= self._MIX_1
+        z ^= z >> np.uint64(27)
+        z *= self._MIX_2
+        z ^= z >> np.uint64(31)
+        z &= self.half_mask
+        return z
+
+    def _encrypt(self, values: np.ndarray) -> np.ndarray:
+        """Один проход сети Фейстеля по домену 2^(2h)"""
+        left = values >> self.half_bits
+        right = values & self.half_mask
+        for round_key in self.round_keys:
+            left ^= self._round_function(right, round_key)
+            left, right = right, left
+        left <<= self.half_bits
+        left |= right
+        return left
+
+    def permute(self, values: np.ndarray) -> np.ndarray:
+        """
+        Применяет перестановку к массиву значений из [0, size)
+
+        Значения, вышедшие за пределы множества, повторно шифруются
+        (cycle-walking), пока не попадут в [0, size).
+        """
+        result = self._encrypt(np.asarray(values, dtype=np.uint64))
+        outside = result >= self.size
+        while outside.any():
+            result[outside] = self._encrypt(result[outside])
+            outside = result >= self.size
+        return result
+
+    def take(self, offset: int, count: int) -> np.ndarray:
+        """
+        Возвращает элементы перестановки с позиций [offset, offset + count)
+
+        Args:
+            offset: Начальная позиция в перестановке
+            count: Количество элементов
+
+        Returns:
+            Массив индексов uint32 (uint64 для множеств больше 2^32)
+        """
+        if offset + count > self.size:
+            raise ValueError(f"Недостаточно пикселей: нужно {offset + count}, доступно {self.size}")
+        # Сеть считается блоками в uint64, результат хранится в компактном типе
+        result = np.empty(count, dtype=index_dtype(self.size))
+        for start in range(0, count, self.BLOCK):
+            stop = min(count, start + self.BLOCK)
+            result[start:stop] = self.permute(np.arange(offset + start, offset + stop, dtype=np.uint64))
+        return result
+
+
+class LegacyPermutation:
+    """
+    Перестановка формата 1: полное перемешивание RandomState
+
+    Перемешивание выполняется один раз при первом обращении, после чего
+    любые отрезки берутся из уже готового массива.
+    """
+
+    # Для любого отрезка требуется полное перемешивание
+    lazy = False
+
+    def __init__(self, seed_int: int, size: int):
+        """
+        Args:
+            seed_int: Seed генератора RandomState
+            size: Размер переставляемого множества
+        """
+        self.seed_int = seed_int
+        self.size = size
+        self._indices = None
+
+    def _all_indices(self) -> np.ndarray:
+        """Возвращает полную перестановку, вычисляя ее при первом вызове"""
+        if self._indices is None:
+            rng = np.random.RandomState(self.seed_int)
+            # ВАЖНО: Всегда генерируем ВСЕ индексы для консистентности
+            indices = np.arange(self.size)
+            rng.shuffle(indices)
+            # RandomState быстро перемешивает только intp; хранится компактная копия
+            self._indices = indices.astype(index_dtype(self.size))
+        return self._indices
+
+    def take(self, offset: int, count: int) -> np.ndarray:
+        """
+        Возвращает элементы перестановки с позиций [offset, offset + count)
+
+        Args:
+            offset: Начальная позиция в перестановке
+            count: Количество элементов
+
+        Returns:
+            Массив индексов uint32 (uint64 для множеств больше 2^32)
+        """
+        if offset + count > self.size:
+            raise ValueError(f"Недостаточно пикселей: нужно {offset + count}, доступно {self.size}")
+        return self._all_indices()[offset:offset + count]
+
+
+class PixelStream:
+    """Последовательное чтение одной перестановки: заголовок, затем данные"""
+
+    def __init__(self, permutation):
+        """
+        Args:
+            permutation: Перестановка с методом take(offset, count)
+        """
+        self.permutation = permutation
+        self.position = 0
+
+    @property
+    def remaining(self) -> int:
+        """Количество еще не прочитанных позиций"""
+        return self.permutation.size - self.position
+
+    def next(self, count: int) -> np.ndarray:
+        """Возвращает следующие count индексов и сдвигает позицию"""
+        indices = self.permutation.take(self.position, count)
+        self.position += count
+        return indices
+
+
+def compact_indices(indices: np.ndarray, size: int) -> np.ndarray:
+    """Приводит индексы к uint32 (uint64, если size больше 2^32)"""
+    return np.ascontiguousarray(indices, dtype=index_dtype(size))
+
+
+class PermutationCache:
+    """
+    LRU-кэш массивов индексов перестановок с ограничением по памяти
+
+    Ключ - (версия формата, хеш seed, количество пикселей), значение -
+    префикс перестановки в компактном виде (uint32). Пароли в кэше не хранятся.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: Максимальный суммарный размер хранимых массивов
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, length: int) -> Optional[np.ndarray]:
+        """
+        Возвращает закэшированный префикс длиной не меньше length
+
+        Args:
+            key: Ключ перестановки
+            length: Требуемая длина префикса
+
+        Returns:
+            Массив индексов или None при промахе
+        """
+        with self._lock:
+            indices = self._entries.get(key)
+            if indices is None or len(indices) < length:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return indices
+
+    def peek(self, key: tuple) -> Optional[np.ndarray]:
+        """Возвращает запись без учета в статистике и без изменения порядка LRU"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: tuple, indices: np.ndarray):
+        """Сохраняет массив индексов, вытесняя давно не использованные записи"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+
+            # Массивы больше всего бюджета не кэшируются
+            if indices.nbytes > self.max_bytes:
+                return
+
+            while self._entries and self.current_bytes + indices.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+
+            self._entries[key] = indices
+            self.current_bytes += indices.nbytes
+
+    def clear(self):
+        """Очищает кэш (статистика сохраняется)"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        """Возвращает статистику использования кэша"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class CachedPermutation:
+    """Перестановка, берущая отрезки из PermutationCache"""
+
+    def __init__(self, permutation, cache: PermutationCache, key: tuple):
+        """
+        Args:
+            permutation: Исходная перестановка с методом take(offset, count)
+            cache: Общий кэш перестановок
+            key: Ключ перестановки в кэше
+        """
+        self.permutation = permutation
+        self.cache = cache
+        self.key = key
+        self.size = permutation.size
+
+    def take(self, offset: int, count: int) -> np.ndarray:
+        """
+        Возвращает элементы перестановки с позиций [offset, offset + count)
+
+        При промахе ленивая перестановка досчитывает только недостающую
+        часть префикса, а полная перестановка вычисляется целиком.
+        """
+        end = offset + count
+        if end > self.size:
+            raise ValueError(f"Недостаточно пикселей: нужно {end}, доступно {self.size}")
+
+        indices = self.cache.get(self.key, end)
+        if indices is None:
+            if self.permutation.lazy:
+                cached = self.cache.peek(self.key)
+                start = 0 if cached is None else len(cached)
+                tail = compact_indices(self.permutation.take(start, end - start), self.size)
+                indices = tail if cached is None else np.concatenate([cached, tail])
+            else:
+                indices = compact_indices(self.permutation.take(0, self.size), self.size)
+            self.cache.put(self.key, indices)
+
+        return indices[offset:end]
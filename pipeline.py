@@ -0,0 +1,293 @@
+"""
+Конвейерная пакетная обработка StegoGhost
+Стадии чтения, внедрения/извлечения и записи перекрываются в отдельных потоках
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+from stego_engine import StegoEngine
+from crypto_module import CryptoModule, CryptoSession
+from batch import BatchJob, BatchResult, extract_payload_file
+
+# Конец потока задач для рабочих потоков стадии
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """Статистика одной стадии конвейера"""
+    name: str
+    threads: int
+    items: int = 0
+    busy_seconds: float = 0.0  # Суммарное время работы потоков стадии
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.items += 1
+            self.busy_seconds += seconds
+
+    def to_dict(self, wall_seconds: float) -> dict:
+        """Статистика с пропускной способностью и загрузкой за wall_seconds"""
+        with self._lock:
+            items, busy = self.items, self.busy_seconds
+        return {
+            'threads': self.threads,
+            'items': items,
+            'busy_seconds': round(busy, 4),
+            'items_per_second': round(items / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+            'utilization': round(busy / (wall_seconds * self.threads), 3) if wall_seconds > 0 else 0.0,
+        }
+
+
+@dataclass
+class _Item:
+    """Задача в конвейере: порядковый номер, промежуточное состояние и результат"""
+    index: int
+    job: BatchJob
+    image: object = None  # Декодированное изображение (StegoImage или PIL)
+    data: dict = field(default_factory=dict)
+    message: Optional[str] = None  # Расшифрованное сообщение для записи
+    result: Optional[BatchResult] = None  # Готовый результат (стадии его пропускают)
+
+
+class PipelineProcessor:
+    """
+    Пакетная обработка конвейером из трех стадий на потоках
+
+    read    - декодирование изображения и проверка вместимости
+    process - шифрование и внедрение или извлечение и расшифровка
+    write   - кодирование PNG и запись файлов
+
+    Между стадиями - очереди ограниченного размера, поэтому в памяти
+    одновременно не больше нескольких декодированных изображений. PIL и
+    zlib отпускают GIL, так что стадии действительно перекрываются.
+    """
+
+    STAGES = ('read', 'process', 'write')
+
+    def __init__(self, password: Optional[str] = None, engine: Optional[StegoEngine] = None,
+                 read_threads: int = 1, process_threads: int = 1, write_threads: int = 1,
+                 queue_size: int = 2, ordered: bool = True):
+        """
+        Args:
+            password: Пароль для всех задач пакета
+            engine: Движок (общий для всех потоков)
+            read_threads: Потоки стадии чтения
+            process_threads: Потоки стадии внедрения/извлечения
+            write_threads: Потоки стадии записи
+            queue_size: Емкость очереди перед каждой стадией (на поток стадии)
+            ordered: Выдавать результаты в порядке задач
+        """
+        self.password = password
+        self.engine = engine or StegoEngine()
+        self.crypto = CryptoModule()
+        self.crypto.enable_key_cache()
+        self.threads = {
+            'read': max(1, read_threads),
+            'process': max(1, process_threads),
+            'write': max(1, write_threads),
+        }
+        self.queue_size = max(1, queue_size)
+        self.ordered = ordered
+        self.stage_stats = {name: StageStats(name, self.threads[name]) for name in self.STAGES}
+        self.wall_seconds = 0.0
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def session(self) -> CryptoSession:
+        """Общая сессия шифрования (ключ PBKDF2 выводится один раз на пакет)"""
+        with self._session_lock:
+            if self._session is None:
+                self._session = self.crypto.session(self.password)
+            return self._session
+
+    def stats(self) -> dict:
+        """Статистика стадий последнего запуска"""
+        report = {name: stage.to_dict(self.wall_seconds) for name, stage in self.stage_stats.items()}
+        report['wall_seconds'] = round(self.wall_seconds, 4)
+        return report
+
+    # Стадии
+
+    def _read(self, item: _Item):
+        """Декодирует изображение один раз; вместимость проверяется до шифрования"""
+        job = item.job
+        if job.kind == 'capacity':
+            overhead = self.crypto.get_encrypted_size(0)
+            item.result = BatchResult(job, 'ok', self.engine.analyze_capacity(job.image_path, overhead).to_dict())
+            return
+
+        if job.kind == 'hide':
+            if job.payload_path is not None:
+                payload_size = Path(job.payload_path).stat().st_size
+                encrypted_size = self.crypto.get_stream_encrypted_size(payload_size)
+            else:
+                encrypted_size = self.crypto.get_encrypted_size(len(job.message.encode()))
+            capacity = self.engine.calculate_capacity(job.image_path)
+            if encrypted_size > capacity:
+                raise ValueError(f"Недостаточная вместимость: {encrypted_size} > {capacity} байт")
+            item.image = self.engine.open_image(job.image_path)
+        elif job.kind == 'extract':
+            # Потоковое извлечение в файл выполняется целиком на стадии записи
+            if not job.binary:
+                item.image = self.engine.open_image(job.image_path, for_embedding=False)
+        else:
+            raise ValueError(f"Неизвестный тип задачи: {job.kind}")
+
+    def _process(self, item: _Item):
+        """Шифрование и внедрение или извлечение и расшифровка"""
+        job = item.job
+        if job.kind == 'hide':
+            if job.payload_path is not None:
+                with open(job.payload_path, 'rb') as source:
+                    chunks = self.session().iter_encrypt(source)
+                    item.image = self.engine.embed_stream(item.image, chunks, self.password)
+                item.data = {'output': job.output_path,
+                             'bytes': self.crypto.get_stream_encrypted_size(Path(job.payload_path).stat().st_size)}
+            else:
+                encrypted_data = self.session().encrypt(job.message)
+                self.engine.embed(item.image, encrypted_data, self.password)
+                item.data = {'output': job.output_path, 'bytes': len(encrypted_data)}
+        elif not job.binary:
+            encrypted_data = self.engine.extract_data(item.image, self.password)
+            item.image = None
+            if not encrypted_data:
+                item.result = BatchResult(job, 'not_found')
+                return
+            message = self.crypto.decrypt(encrypted_data, self.password)
+            if message is None:
+                raise ValueError("Не удалось расшифровать")
+            item.data = {'bytes': len(encrypted_data)}
+            item.message = message
+
+    def _write(self, item: _Item):
+        """Кодирование PNG и запись результатов"""
+        job = item.job
+        if job.kind == 'hide':
+            self.engine.save_png(item.image, job.output_path)
+            item.image = None
+        elif job.binary:
+            data = extract_payload_file(self.engine, self.crypto, job.image_path, self.password, job.output_path)
+            if data is None:
+                item.result = BatchResult(job, 'not_found')
+                return
+            item.data = data
+        elif job.output_path is None:
+            item.data['message'] = item.message
+        else:
+            Path(job.output_path).write_text(item.message, encoding='utf-8')
+            item.data['output'] = job.output_path
+        item.result = BatchResult(job, 'ok', item.data)
+
+    # Механика конвейера
+
+    def run(self, jobs: Iterable[BatchJob]) -> Iterator[BatchResult]:
+        """
+        Выполняет задачи конвейером и выдает результаты
+
+        Args:
+            jobs: Задачи (может быть ленивым итератором)
+
+        Returns:
+            Итератор результатов
+        """
+        self.stage_stats = {name: StageStats(name, self.threads[name]) for name in self.STAGES}
+        stop = threading.Event()
+        queues = [queue.Queue(maxsize=self.queue_size * self.threads[name]) for name in self.STAGES]
+        results = queue.Queue()
+        handlers = {'read': self._read, 'process': self._process, 'write': self._write}
+        outputs = queues[1:] + [results]
+
+        def put(target: queue.Queue, item) -> bool:
+            # Ожидание места в очереди прерывается остановкой конвейера
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def feed():
+            try:
+                for index, job in enumerate(jobs):
+                    if not put(queues[0], _Item(index, job)):
+                        return
+            except Exception as e:
+                put(results, e)
+            finally:
+                for _ in range(self.threads['read']):
+                    put(queues[0], _DONE)
+
+        def stage_worker(name: str, source: queue.Queue, target: queue.Queue, handler: Callable,
+                         remaining: list, lock: threading.Lock, next_threads: int):
+            stats = self.stage_stats[name]
+            while not stop.is_set():
+                try:
+                    item = source.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                if item.result is None:
+                    start = time.perf_counter()
+                    try:
+                        handler(item)
+                    except Exception as e:
+                        item.result = BatchResult(item.job, 'error', error=str(e) or type(e).__name__)
+                        item.image = None
+                    stats.add(time.perf_counter() - start)
+                if not put(target, item):
+                    return
+            # Последний завершившийся поток стадии закрывает следующую
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                for _ in range(next_threads):
+                    put(target, _DONE)
+
+        threads = [threading.Thread(target=feed, name='stego-feed', daemon=True)]
+        for position, name in enumerate(self.STAGES):
+            next_threads = self.threads[self.STAGES[position + 1]] if position + 1 < len(self.STAGES) else 1
+            remaining = [self.threads[name]]
+            lock = threading.Lock()
+            for number in range(self.threads[name]):
+                threads.append(threading.Thread(
+                    target=stage_worker, name=f'stego-{name}-{number}', daemon=True,
+                    args=(name, queues[position], outputs[position], handlers[name], remaining, lock, next_threads),
+                ))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            pending = {}
+            next_index = 0
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if not self.ordered:
+                    yield item.result
+                    continue
+                pending[item.index] = item.result
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+            # Задачи, выпавшие из порядка, не теряются
+            for index in sorted(pending):
+                yield pending[index]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            self.wall_seconds = time.perf_counter() - start
@@ -0,0 +1,361 @@
+"""
+HTTP-сервис StegoGhost
+Локальный сервер на стандартной библиотеке с прогретым пулом и общими кэшами
+"""
+
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from PIL import Image
+
+from permutation import PermutationCache
+from stego_engine import StegoEngine
+from tiling import check_tile_size
+from crypto_module import CryptoModule
+from batch import ENGINE_SETTINGS
+from instrumentation import Instrumentation
+
+DEFAULT_MAX_BODY_SIZE = 64 * 1024 * 1024
+
+
+class RequestError(Exception):
+    """Ошибка запроса с HTTP-статусом"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, Tuple[bytes, Optional[str]]]:
+    """
+    Разбирает тело multipart/form-data
+
+    Returns:
+        Словарь: имя поля -> (содержимое, имя файла или None)
+    """
+    message = BytesParser(policy=HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body
+    )
+    if not message.is_multipart():
+        raise RequestError(400, "Ожидается multipart/form-data")
+
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        if name:
+            fields[name] = (part.get_payload(decode=True) or b'', part.get_filename())
+    return fields
+
+
+class ServiceMetrics:
+    """Счетчики запросов для /metrics"""
+
+    def __init__(self):
+        self.requests = {}  # (путь, статус) -> количество
+        self.seconds = {}  # путь -> суммарное время обработки
+        self.in_flight = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self, path: str, status: int, seconds: float):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[(path, status)] = self.requests.get((path, status), 0) + 1
+            self.seconds[path] = self.seconds.get(path, 0.0) + seconds
+
+
+class StegoService:
+    """
+    Состояние сервиса: настройки движка, общие кэши и пул обработчиков
+
+    Кэш перестановок и кэш ключей PBKDF2 живут весь срок работы сервиса,
+    тяжелые операции выполняются в пуле из workers потоков.
+    """
+
+    ENDPOINTS = ('/hide', '/extract', '/capacity')
+
+    def __init__(self, engine: Optional[StegoEngine] = None, workers: int = 4,
+                 max_body_size: int = DEFAULT_MAX_BODY_SIZE, max_queue: int = 64,
+                 cache_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            engine: Движок с настройками по умолчанию (не изменяется: копируются только настройки)
+            workers: Потоки пула обработки
+            max_body_size: Максимальный размер тела запроса в байтах
+            max_queue: Максимум запросов в пуле (сверх - 503)
+            cache_bytes: Бюджет кэша перестановок
+        """
+        engine = engine or StegoEngine()
+        self.engine_settings = {name: getattr(engine, name) for name in ENGINE_SETTINGS}
+        # Собственный кэш сервиса: движок вызывающего не изменяется
+        self.permutation_cache = PermutationCache(cache_bytes)
+        self.crypto = CryptoModule()
+        self.crypto.enable_key_cache()
+        self.instrumentation = Instrumentation()
+        self.workers = max(1, workers)
+        self.max_body_size = max_body_size
+        self.max_queue = max(1, max_queue)
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='stegoghost')
+        self.metrics = ServiceMetrics()
+        self._queued = threading.BoundedSemaphore(self.max_queue)
+
+    def make_engine(self, fields: dict) -> StegoEngine:
+        """Движок для запроса: настройки сервиса, переопределенные полями формы"""
+        engine = StegoEngine()
+        for name, value in self.engine_settings.items():
+            setattr(engine, name, value)
+        engine.permutation_cache = self.permutation_cache
+        engine.instrumentation = self.instrumentation
+
+        try:
+            if 'format' in fields:
+                engine.format_version = int(_text(fields, 'format'))
+            if 'bits_per_channel' in fields:
+                engine.bits_per_channel = int(_text(fields, 'bits_per_channel'))
+            if 'channels' in fields:
+                engine.channels = _text(fields, 'channels')
+            if 'tile_size' in fields:
+                engine.tile_size = int(_text(fields, 'tile_size'))
+            if 'png_preset' in fields:
+                engine.set_png_preset(_text(fields, 'png_preset'))
+            StegoEngine.header_size_for(engine.format_version)
+            # Схема размещения вместе с ограничениями формата (формат 1 - только 1 бит в R)
+            engine._current_layout()
+            check_tile_size(engine.tile_size)
+        except ValueError as e:
+            raise RequestError(400, f"Неверные параметры: {e}")
+        return engine
+
+    def submit(self, func, *args):
+        """Выполняет функцию в пуле, отклоняя запрос при переполнении очереди"""
+        if not self._queued.acquire(blocking=False):
+            raise RequestError(503, "Сервис перегружен")
+        try:
+            return self.pool.submit(func, *args).result()
+        finally:
+            self._queued.release()
+
+    def handle(self, name: str, fields: dict) -> Tuple[str, bytes]:
+        """
+        Вызывает обработчик конечной точки
+
+        Ошибки декодирования PIL и ValueError движка вызваны содержимым
+        запроса (битое изображение, нет нужных каналов), поэтому это 400, а не 500.
+        """
+        try:
+            return getattr(self, name)(fields)
+        except (ValueError, OSError, SyntaxError, Image.DecompressionBombError) as e:
+            raise RequestError(400, f"Неверное изображение или параметры: {e}")
+
+    # Обработчики
+
+    def hide(self, fields: dict) -> Tuple[str, bytes]:
+        image = _file(fields, 'image')
+        password = _text(fields, 'password')
+        message = fields.get('message', (None, None))[0]
+        if message is None:
+            raise RequestError(400, "Не задано поле message")
+        engine = self.make_engine(fields)
+
+        report = engine.analyze_capacity(image)
+        encrypted_size = self.crypto.get_encrypted_size(len(message))
+        if not report.fits(encrypted_size):
+            raise RequestError(413, f"Недостаточная вместимость: {encrypted_size} > {report.capacity} байт")
+
+        encrypted_data = self.crypto.encrypt(message, password)
+        output = io.BytesIO()
+        engine.save_png(engine.embed(image, encrypted_data, password), output)
+        return 'image/png', output.getvalue()
+
+    def extract(self, fields: dict) -> Tuple[str, bytes]:
+        image = _file(fields, 'image')
+        password = _text(fields, 'password')
+        engine = self.make_engine(fields)
+        # Формат 1 только по запросу: его поиск - полное перемешивание O(N)
+        # на каждое изображение без данных или с неверным паролем
+        engine.legacy_fallback = _text(fields, 'legacy', 'false').lower() in ('1', 'true', 'yes')
+
+        encrypted_data = engine.extract_data(image, password)
+        if not encrypted_data:
+            raise RequestError(404, "Сообщение не найдено")
+        plaintext = self.crypto.decrypt_bytes(encrypted_data, password)
+        if plaintext is None:
+            raise RequestError(422, "Не удалось расшифровать")
+
+        if _text(fields, 'binary', 'false').lower() in ('1', 'true', 'yes'):
+            return 'application/octet-stream', plaintext
+        try:
+            return _json({'message': plaintext.decode('utf-8'), 'bytes': len(encrypted_data)})
+        except UnicodeDecodeError:
+            raise RequestError(422, "Сообщение не является текстом UTF-8, используйте binary=true")
+
+    def capacity(self, fields: dict) -> Tuple[str, bytes]:
+        engine = self.make_engine(fields)
+        report = engine.analyze_capacity(_file(fields, 'image'), self.crypto.get_encrypted_size(0))
+        return _json(report.to_dict())
+
+    def render_metrics(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        lines = [
+            '# TYPE stegoghost_requests_total counter',
+        ]
+        with self.metrics._lock:
+            requests = dict(self.metrics.requests)
+            seconds = dict(self.metrics.seconds)
+            in_flight = self.metrics.in_flight
+        for (path, status), count in sorted(requests.items()):
+            lines.append(f'stegoghost_requests_total{{path="{path}",status="{status}"}} {count}')
+        lines.append('# TYPE stegoghost_request_seconds_total counter')
+        for path, total in sorted(seconds.items()):
+            lines.append(f'stegoghost_request_seconds_total{{path="{path}"}} {total:.6f}')
+        lines += [
+            '# TYPE stegoghost_requests_in_flight gauge',
+            f'stegoghost_requests_in_flight {in_flight}',
+            '# TYPE stegoghost_workers gauge',
+            f'stegoghost_workers {self.workers}',
+            '# TYPE stegoghost_uptime_seconds gauge',
+            f'stegoghost_uptime_seconds {time.time() - self.metrics.started:.3f}',
+        ]
+        for name, value in self.permutation_cache.stats().items():
+            lines.append(f'stegoghost_permutation_cache_{name} {value}')
+        for name, value in self.crypto.key_cache.stats().items():
+            lines.append(f'stegoghost_key_cache_{name} {value}')
+        return '\n'.join(lines) + '\n' + self.instrumentation.to_prometheus()
+
+
+def _text(fields: dict, name: str, default: Optional[str] = None) -> str:
+    """Текстовое поле формы"""
+    if name not in fields:
+        if default is None:
+            raise RequestError(400, f"Не задано поле {name}")
+        return default
+    return fields[name][0].decode('utf-8')
+
+
+def _file(fields: dict, name: str) -> Image.Image:
+    """Изображение из файлового поля формы (пиксели декодируются при обращении)"""
+    if name not in fields or not fields[name][0]:
+        raise RequestError(400, f"Не задан файл {name}")
+    try:
+        return Image.open(io.BytesIO(fields[name][0]))
+    except OSError:
+        raise RequestError(400, f"Поле {name} не является изображением")
+
+
+def _json(data: dict) -> Tuple[str, bytes]:
+    return 'application/json', json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class StegoRequestHandler(BaseHTTPRequestHandler):
+    """Обработчик HTTP-запросов (сервис передается через сервер)"""
+
+    server_version = 'StegoGhost'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self) -> StegoService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        # Журнал запросов без тел и паролей
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str):
+        self._send(status, 'application/json', json.dumps({'error': message}, ensure_ascii=False).encode('utf-8'))
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/metrics':
+            self._send(200, 'text/plain; version=0.0.4', self.service.render_metrics().encode())
+        elif path == '/health':
+            self._send(200, 'application/json', b'{"status": "ok"}')
+        else:
+            self._send_error(404, "Неизвестный путь")
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        start = time.perf_counter()
+        self.service.metrics.begin()
+        status = 500
+        try:
+            if path not in StegoService.ENDPOINTS:
+                raise RequestError(404, "Неизвестный путь")
+            fields = self._read_form()
+            content_type, body = self.service.submit(self.service.handle, path.lstrip('/'), fields)
+            status = 200
+            self._send(status, content_type, body)
+        except RequestError as e:
+            status = e.status
+            self._send_error(status, str(e))
+        except Exception as e:
+            status = 500
+            self._send_error(status, str(e) or type(e).__name__)
+        finally:
+            # Неизвестные пути сводим в одну метку, чтобы не раздувать /metrics
+            label = path if path in StegoService.ENDPOINTS else 'other'
+            self.service.metrics.end(label, status, time.perf_counter() - start)
+
+    def _read_form(self) -> dict:
+        """Читает тело с проверкой размера и разбирает форму"""
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self.close_connection = True
+            raise RequestError(411, "Требуется Content-Length")
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Тело неизвестной длины не читаем
+            self.close_connection = True
+            raise RequestError(400, "Неверный Content-Length")
+        if length > self.service.max_body_size:
+            # Тело не читаем: соединение закрывается после ответа
+            self.close_connection = True
+            raise RequestError(413, f"Тело запроса больше {self.service.max_body_size} байт")
+        body = self.rfile.read(length)
+        return parse_multipart(self.headers.get('Content-Type', ''), body)
+
+
+class StegoHTTPServer(ThreadingHTTPServer):
+    """Многопоточный HTTP-сервер с сервисом StegoGhost"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: StegoService, quiet: bool = False):
+        super().__init__(address, StegoRequestHandler)
+        self.service = service
+        self.quiet = quiet
+
+
+def serve(host: str = '127.0.0.1', port: int = 8080, service: Optional[StegoService] = None,
+          quiet: bool = False):
+    """Запускает сервер и обслуживает запросы до прерывания"""
+    server = StegoHTTPServer((host, port), service or StegoService(), quiet=quiet)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.pool.shutdown()
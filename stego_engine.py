@@ -6,284 +6,1210 @@
 import numpy as np
 from PIL import Image
 import hashlib
+import logging
 import struct
-from typing import Tuple, Optional, List
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import BinaryIO, Iterable, Iterator, Tuple, Optional, Union
 import io
+from pathlib import Path
+
+from crypto_module import DEFAULT_CHUNK_SIZE, check_chunk_size, iter_source_chunks
+from instrumentation import NULL_STAGE, Instrumentation
+
+from permutation import (
+    CachedPermutation, FeistelPermutation, LegacyPermutation, PermutationCache, PixelStream
+)
+from stego_image import MEMMAP_FORMATS, StegoImage, image_has_alpha, open_memmap
+from tiling import HeaderRegion, TileGrid, check_tile_size, plan_segments, segment_indices, tile_key, tile_permutation
+
+
+logger = logging.getLogger('stegoghost.engine')
+
+# Источник изображения: путь, изображение PIL, массив NumPy или уже декодированный StegoImage
+ImageSource = Union[str, Path, Image.Image, np.ndarray, StegoImage]
+
+# Стратегии zlib для PNG (параметр compress_type в Pillow)
+PNG_STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+# Готовые настройки кодирования PNG: скорость или размер
+PNG_PRESETS = {
+    'fast': {'png_compress_level': 1, 'png_compress_type': zlib.Z_RLE, 'png_optimize': False},
+    'balanced': {'png_compress_level': 6, 'png_compress_type': zlib.Z_DEFAULT_STRATEGY, 'png_optimize': False},
+    'small': {'png_compress_level': 9, 'png_compress_type': zlib.Z_DEFAULT_STRATEGY, 'png_optimize': True},
+}
+
+# Версии формата внедрения
+FORMAT_LEGACY = 1   # Полное перемешивание RandomState, заголовок - 4 байта длины
+FORMAT_FEISTEL = 2  # Ленивая перестановка Фейстеля, заголовок с версией и схемой
+FORMAT_CHECKED = 3  # Формат 2 с ключевым контрольным значением в заголовке
+FORMAT_TILED = 4    # Формат 3, данные разложены по плиткам с собственными перестановками
+
+# Заголовок формата 2: версия (1 байт), схема размещения (1 байт), длина данных (4 байта)
+HEADER_V2 = struct.Struct('>BBI')
+
+# Заголовок формата 3: версия (1 байт), контрольное значение (4 байта), схема, длина.
+# Контрольное значение выводится из seed, поэтому неверный пароль или изображение
+# без данных отбрасываются после чтения 40 бит, без чтения данных и PBKDF2
+HEADER_V3 = struct.Struct('>BIBI')
+
+# Схема и длина - общая часть заголовков форматов 2 и 3
+HEADER_TAIL = struct.Struct('>BI')
+
+# Заголовок формата 4: версия, контрольное значение, схема, сторона плитки (2 байта), длина.
+# Заголовок лежит в фиксированной области левого верхнего угла (плитка 0), данные - в плитках
+HEADER_V4 = struct.Struct('>BIBHI')
+HEADER_TILED_TAIL = struct.Struct('>BHI')
+
+# Схема размещения: младшие 2 бита - (бит на канал - 1), биты 2..5 - маска каналов RGBA
+CHANNEL_ORDER = 'RGBA'
+MAX_BITS_PER_CHANNEL = 3
+
+
+def pack_layout(bits_per_channel: int, channels: str) -> int:
+    """
+    Кодирует схему размещения в байт заголовка
+    
+    Args:
+        bits_per_channel: Количество младших бит на канал (1-3)
+        channels: Используемые каналы, например 'R', 'RGB', 'RGBA'
+    """
+    if not 1 <= bits_per_channel <= MAX_BITS_PER_CHANNEL:
+        raise ValueError(f"Бит на канал должно быть от 1 до {MAX_BITS_PER_CHANNEL}: {bits_per_channel}")
+    channels = channels.upper()
+    if not channels or any(c not in CHANNEL_ORDER for c in channels) or len(set(channels)) != len(channels):
+        raise ValueError(f"Недопустимый набор каналов: {channels!r}")
+    mask = sum(1 << CHANNEL_ORDER.index(c) for c in channels)
+    return (bits_per_channel - 1) | (mask << 2)
+
+
+def unpack_layout(layout: int) -> Tuple[int, str]:
+    """
+    Декодирует байт схемы размещения
+    
+    Returns:
+        (бит на канал, каналы в порядке RGBA)
+    """
+    bits_per_channel = (layout & 0x03) + 1
+    mask = layout >> 2
+    if bits_per_channel > MAX_BITS_PER_CHANNEL or mask == 0 or mask > 0x0F:
+        raise ValueError(f"Недопустимая схема размещения: {layout:#04x}")
+    channels = ''.join(c for i, c in enumerate(CHANNEL_ORDER) if mask & (1 << i))
+    return bits_per_channel, channels
+
+
+# 1 бит в красном канале: единственная схема формата 1 и схема заголовка
+LAYOUT_RED_1BIT = pack_layout(1, 'R')
+
+
+@dataclass
+class CapacityReport:
+    """
+    Вместимость изображения, вычисленная только по заголовку файла
+    
+    Пиксели не декодируются: размеры, режим и наличие альфа-канала PIL
+    читает из заголовка, поэтому отчет строится за миллисекунды.
+    """
+    width: int
+    height: int
+    mode: str  # Режим PIL исходного файла
+    image_format: Optional[str]  # Формат файла по данным PIL (PNG, JPEG, ...)
+    has_alpha: bool
+    format_version: int
+    bits_per_channel: int
+    channels: str
+    bits_per_pixel: int  # Бит данных на пиксель для схемы размещения
+    header_bytes: int  # Размер заголовка формата внедрения
+    usable_pixels: int  # Пиксели, доступные для данных после заголовка
+    capacity: int  # Вместимость для зашифрованных данных, байт
+    crypto_overhead: int  # Накладные расходы шифрования (соль, nonce, тег), байт
+    
+    @property
+    def total_pixels(self) -> int:
+        return self.width * self.height
+    
+    @property
+    def max_message_bytes(self) -> int:
+        """Максимальный размер открытого текста, байт"""
+        return max(0, self.capacity - self.crypto_overhead)
+    
+    def fits(self, encrypted_size: int) -> bool:
+        """Помещаются ли зашифрованные данные указанного размера"""
+        return encrypted_size <= self.capacity
+    
+    def capacity_for(self, bits_per_channel: int, channels: str) -> int:
+        """Вместимость того же изображения в том же формате для другой схемы размещения"""
+        return StegoEngine.capacity_for_pixels(self.total_pixels, self.format_version,
+                                               bits_per_channel, channels)
+    
+    def to_dict(self) -> dict:
+        """Преобразует отчет в словарь (например, для JSON)"""
+        record = asdict(self)
+        record['max_message_bytes'] = self.max_message_bytes
+        return record
 
 
 class StegoEngine:
     """Основной класс для внедрения и извлечения данных"""
     
     def __init__(self):
-        self.supported_formats = {'.png', '.jpg', '.jpeg', '.webp'}
+        self.supported_formats = {'.png', '.jpg', '.jpeg', '.webp', '.tif', '.tiff'} | MEMMAP_FORMATS
         self.max_message_length = 4096
         self.header_size = 4  # Размер заголовка для хранения длины сообщения
-        self.debug = False  # Отключаем отладку
+        self.instrumentation = None  # Таймеры стадий и счетчики (по умолчанию отключены)
+        self.format_version = FORMAT_CHECKED  # Формат для новых внедрений
+        self.legacy_fallback = True  # Пробовать формат 1, если заголовок 2/3 не найден
+        self.bits_per_channel = 1  # Младших бит на канал (1-3)
+        self.channels = 'R'  # Каналы для данных: любое сочетание R, G, B, A
+        self.tile_size = 256  # Сторона плитки в пикселях (формат 4)
+        self.tile_workers = 1  # Потоки для обработки плиток (формат 4)
+        self.permutation_cache = None  # Кэш перестановок (по умолчанию отключен)
+        self.png_compress_level = 6  # Уровень zlib для PNG (0-9)
+        self.png_compress_type = zlib.Z_DEFAULT_STRATEGY  # Стратегия zlib (см. PNG_STRATEGIES)
+        self.png_optimize = False  # Дополнительный проход оптимизации размера (медленно)
+        
+    def set_png_preset(self, name: str):
+        """
+        Применяет готовые настройки кодирования PNG
+        
+        Args:
+            name: 'fast', 'balanced' или 'small'
+        """
+        if name not in PNG_PRESETS:
+            raise ValueError(f"Неизвестный профиль PNG: {name}")
+        for attribute, value in PNG_PRESETS[name].items():
+            setattr(self, attribute, value)
+    
+    def png_options(self) -> dict:
+        """Параметры Pillow для сохранения PNG с текущими настройками"""
+        return {
+            'compress_level': self.png_compress_level,
+            'compress_type': self.png_compress_type,
+            'optimize': self.png_optimize,
+        }
+    
+    def save_png(self, image: Union[Image.Image, StegoImage], output_path: Union[str, Path]):
+        """
+        Сохраняет результат внедрения как PNG с настройками движка
         
-    def _generate_pixel_sequence(self, seed: bytes, total_pixels: int, needed_pixels: int, offset: int = 0) -> List[int]:
+        PNG сжимает без потерь при любых настройках, поэтому данные
+        извлекаются из результата независимо от уровня и стратегии.
+        """
+        if isinstance(image, StegoImage):
+            image = image.to_pil()
+        image.save(output_path, "PNG", **self.png_options())
+    
+    def enable_permutation_cache(self, max_bytes: int = 256 * 1024 * 1024) -> PermutationCache:
+        """
+        Включает кэширование перестановок для пакетной обработки
+        
+        Полезно, когда много изображений одного разрешения обрабатываются
+        с одним паролем: перестановка вычисляется один раз.
+        
+        Args:
+            max_bytes: Бюджет памяти кэша в байтах
+            
+        Returns:
+            Созданный кэш (доступна статистика hits/misses)
+        """
+        self.permutation_cache = PermutationCache(max_bytes)
+        return self.permutation_cache
+    
+    def enable_instrumentation(self, instrumentation: Optional[Instrumentation] = None) -> Instrumentation:
+        """
+        Включает сбор таймеров стадий и счетчиков байт и пикселей
+        
+        Стадии: load, convert, permutation, bit_pack, embed, extract, build_image.
+        Выключенное инструментирование не выполняет замеров.
+        
+        Args:
+            instrumentation: Сборщик (по умолчанию - новый)
+            
+        Returns:
+            Подключенный сборщик (экспорт через to_dict, to_prometheus, log)
+        """
+        self.instrumentation = instrumentation or Instrumentation()
+        return self.instrumentation
+    
+    @contextmanager
+    def collect_stats(self):
+        """
+        Собирает статистику операций внутри блока with в новый сборщик
+        
+        Сборщик временно подключается к самому движку, поэтому метод
+        подходит только для движка, которым владеет один поток (потоки
+        tile_workers внутри одной операции пишут в тот же сборщик).
+        Для параллельных операций используйте отдельную копию движка
+        на поток: copy.copy(engine).enable_instrumentation(collector).
+        
+        Пример:
+            with engine.collect_stats() as stats:
+                engine.embed_data(path, data, password)
+            print(stats.to_dict())
+        """
+        previous = self.instrumentation
+        collector = self.enable_instrumentation()
+        try:
+            yield collector
+        finally:
+            self.instrumentation = previous
+    
+    def _stage(self, name: str):
+        """Таймер стадии или заглушка, если инструментирование выключено"""
+        if self.instrumentation is None:
+            return NULL_STAGE
+        return self.instrumentation.stage(name)
+    
+    def _count(self, name: str, value: int = 1):
+        if self.instrumentation is not None:
+            self.instrumentation.count(name, value)
+        
+    def _create_permutation(self, seed: bytes, total_pixels: int, version: int):
+        """
+        Создает перестановку пикселей для заданного формата
+        
+        Args:
+            seed: Seed для генерации
+            total_pixels: Общее количество пикселей
+            version: Версия формата (FORMAT_LEGACY, FORMAT_FEISTEL или FORMAT_CHECKED)
+            
+        Returns:
+            Перестановка с методом take(offset, count)
+        """
+        # Используем SHA-256 для генерации детерминированной последовательности
+        seed_hash = hashlib.sha256(seed).digest()
+        logger.debug("Permutation: format %d, %d pixels", version, total_pixels)
+        
+        if version == FORMAT_LEGACY:
+            seed_int = int.from_bytes(seed_hash[:4], 'big')
+            permutation = LegacyPermutation(seed_int, total_pixels)
+            kind = FORMAT_LEGACY
+        elif version in (FORMAT_FEISTEL, FORMAT_CHECKED):
+            # Форматы 2 и 3 используют одну и ту же перестановку
+            permutation = FeistelPermutation(seed_hash, total_pixels)
+            kind = FORMAT_FEISTEL
+        else:
+            raise ValueError(f"Неизвестная версия формата: {version}")
+        
+        if self.permutation_cache is not None:
+            return CachedPermutation(permutation, self.permutation_cache, (kind, seed_hash, total_pixels))
+        return permutation
+    
+    def _tile_permutation(self, seed_hash: bytes, grid: TileGrid, tile: int):
+        """Перестановка плитки формата 4, через кэш перестановок, если он включен"""
+        permutation = tile_permutation(seed_hash, grid, tile)
+        if self.permutation_cache is not None:
+            key = (FORMAT_TILED, tile_key(seed_hash, tile), permutation.size)
+            return CachedPermutation(permutation, self.permutation_cache, key)
+        return permutation
+    
+    def _check_value(self, seed: bytes) -> int:
+        """Ключевое контрольное значение заголовка формата 3 (32 бита)"""
+        seed_hash = hashlib.sha256(seed).digest()
+        return int.from_bytes(hashlib.sha256(seed_hash + b'check').digest()[:4], 'big')
+    
+    def _generate_pixel_sequence(self, seed: bytes, total_pixels: int, needed_pixels: int,
+                                 offset: int = 0) -> np.ndarray:
         """
         Генерирует псевдослучайную последовательность индексов пикселей
-        на основе seed для равномерного распределения
+        на основе seed для равномерного распределения (формат 1)
         
         Args:
             seed: Seed для генерации
             total_pixels: Общее количество пикселей
             needed_pixels: Количество нужных пикселей
             offset: Смещение в последовательности
+            
+        Returns:
+            Массив индексов uint32 (uint64 для изображений больше 2^32 пикселей)
         """
-        # Используем SHA-256 для генерации детерминированной последовательности
-        seed_hash = hashlib.sha256(seed).digest()
-        seed_int = int.from_bytes(seed_hash[:4], 'big')
+        permutation = self._create_permutation(seed, total_pixels, FORMAT_LEGACY)
+        
+        # ВАЖНО: НЕ сортируем индексы, чтобы сохранить последовательность
+        return permutation.take(offset, needed_pixels)
+    
+    def _bits_to_bytes(self, bits: np.ndarray) -> bytes:
+        """
+        Упаковывает биты (по одному на элемент, старший бит байта - первым) в байты
         
-        if self.debug:
-            print(f"[DEBUG] Seed hash: {seed_hash.hex()[:16]}...")
-            print(f"[DEBUG] Seed int: {seed_int}")
-            print(f"[DEBUG] Total pixels: {total_pixels}, needed: {needed_pixels}, offset: {offset}")
+        Неполный последний байт дополняется нулями.
+        """
+        return np.packbits(np.asarray(bits, dtype=np.uint8)).tobytes()
+    
+    def _bytes_to_bits(self, data: bytes) -> np.ndarray:
+        """Распаковывает байты в массив битов uint8 (старший бит байта - первым)"""
+        return np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    
+    def _write_bits(self, flat_pixels: np.ndarray, pixel_indices: np.ndarray, bits: np.ndarray,
+                    bits_per_channel: int = 1, channels: str = 'R'):
+        """
+        Записывает биты в младшие разряды выбранных пикселей
         
-        rng = np.random.RandomState(seed_int)
+        Каждый пиксель принимает bits_per_channel бит в каждый канал из channels
+        (старший бит группы - первым). Неполная последняя группа дополняется нулями.
         
-        # ВАЖНО: Всегда генерируем ВСЕ индексы для консистентности
-        # Это гарантирует одинаковую последовательность независимо от offset
-        all_pixel_indices = np.arange(total_pixels)
-        rng.shuffle(all_pixel_indices)
+        Args:
+            flat_pixels: Пиксели формы (N, C), изменяются на месте
+            pixel_indices: Индексы пикселей (уникальные)
+            bits: Массив битов uint8
+            bits_per_channel: Младших бит на канал
+            channels: Используемые каналы
+        """
+        channel_idx = np.array([CHANNEL_ORDER.index(c) for c in channels])
+        count = len(pixel_indices)
+        group = bits_per_channel * len(channel_idx)
+        if len(bits) == count * group:
+            padded = bits
+        else:
+            padded = np.zeros(count * group, dtype=np.uint8)
+            padded[:len(bits)] = bits
         
-        # Берем нужную часть с учетом offset
-        start_idx = offset
-        end_idx = offset + needed_pixels
+        if bits_per_channel == 1:
+            # Один бит на канал: биты сразу являются значениями младших разрядов
+            values = padded.reshape(count, len(channel_idx))
+        else:
+            # Собираем группы по bits_per_channel бит в значения младших разрядов
+            weights = (1 << np.arange(bits_per_channel - 1, -1, -1)).astype(np.uint8)
+            values = (padded.reshape(count, len(channel_idx), bits_per_channel) * weights).sum(
+                axis=2, dtype=np.uint8)
         
-        if end_idx > total_pixels:
-            raise ValueError(f"Недостаточно пикселей: нужно {end_idx}, доступно {total_pixels}")
+        # Индексы уникальны, поэтому присваивание по массиву индексов
+        # эквивалентно поэлементному циклу
+        keep_mask = np.uint8(0xFF ^ ((1 << bits_per_channel) - 1))
+        rows = pixel_indices[:, None]
+        flat_pixels[rows, channel_idx] = (flat_pixels[rows, channel_idx] & keep_mask) | values
+    
+    def _read_bits(self, flat_pixels: np.ndarray, pixel_indices: np.ndarray, bit_count: int,
+                   bits_per_channel: int = 1, channels: str = 'R') -> np.ndarray:
+        """
+        Читает биты из младших разрядов выбранных пикселей (обратно к _write_bits)
         
-        # ВАЖНО: НЕ сортируем индексы, чтобы сохранить последовательность
-        result = all_pixel_indices[start_idx:end_idx].tolist()
+        Returns:
+            Массив из bit_count битов uint8
+        """
+        channel_idx = np.array([CHANNEL_ORDER.index(c) for c in channels])
+        values = flat_pixels[pixel_indices[:, None], channel_idx] & ((1 << bits_per_channel) - 1)
+        if bits_per_channel == 1:
+            return values.reshape(-1)[:bit_count]
+        bits = np.unpackbits(values[..., None], axis=-1)[..., 8 - bits_per_channel:]
+        return bits.reshape(-1)[:bit_count]
+    
+    def _open_image(self, image: ImageSource, with_alpha: Optional[bool]) -> StegoImage:
+        """
+        Приводит источник к StegoImage, декодируя его не более одного раза
         
-        if self.debug and len(result) <= 5:
-            print(f"[DEBUG] Indices (offset {offset}): {result}")
-        elif self.debug:
-            print(f"[DEBUG] First 5 indices (offset {offset}): {result[:5]}")
+        Переданный StegoImage используется как есть (альфа-канал добавляется
+        только если он нужен схеме); остальные источники декодируются в RGB
+        или RGBA. Красный канал совпадает в обоих режимах, поэтому заголовок
+        читается одинаково независимо от наличия альфа-канала.
         
-        return result
+        Args:
+            image: Путь, изображение PIL, массив NumPy или StegoImage
+            with_alpha: True - нужен RGBA, False - RGB, None - RGBA при наличии альфа-канала
+        """
+        if isinstance(image, StegoImage):
+            if with_alpha and not image.has_alpha:
+                with self._stage('convert'):
+                    image.ensure_alpha()
+            return image
+        if isinstance(image, np.ndarray):
+            with self._stage('convert'):
+                return StegoImage.from_array(image, with_alpha)
+        if isinstance(image, Image.Image):
+            with self._stage('load'):
+                image.load()
+            with self._stage('convert'):
+                return StegoImage.from_pil(image, with_alpha)
+        
+        # Несжатые носители отображаются в память: чтение только для чтения,
+        # внедрение - копирование при записи, исходный файл не меняется
+        with self._stage('load'):
+            mapped = open_memmap(image, 'r' if with_alpha is None else 'c')
+        if mapped is not None:
+            self._count('images_mapped')
+            if with_alpha and not mapped.has_alpha:
+                with self._stage('convert'):
+                    return StegoImage.from_array(mapped.pixels, with_alpha=True)
+            return mapped
+        
+        # Декодирование и конвертация режима замеряются раздельно
+        with self._stage('load'):
+            img = Image.open(image)
+            img.load()
+        self._count('images_decoded')
+        try:
+            with self._stage('convert'):
+                return StegoImage.from_pil(img, with_alpha, source_path=str(image))
+        finally:
+            img.close()
+    
+    def open_image(self, image: ImageSource, for_embedding: bool = True) -> StegoImage:
+        """
+        Декодирует изображение один раз для последующих операций движка
+        
+        Args:
+            image: Путь, изображение PIL, массив NumPy или StegoImage
+            for_embedding: True - режим для текущей схемы размещения (как в embed_data),
+                False - с альфа-каналом при его наличии (как в extract_data)
+        """
+        if for_embedding:
+            _, _, channels = self._current_layout()
+            return self._open_image(image, with_alpha='A' in channels)
+        return self._open_image(image, with_alpha=None)
+    
+    def _check_channels(self, image: StegoImage, channels: str):
+        """Проверяет, что в буфере есть все каналы схемы размещения"""
+        if max(CHANNEL_ORDER.index(c) for c in channels) >= image.channel_count:
+            raise ValueError(f"В изображении {image.mode} нет каналов для схемы {channels}")
+    
+    def _build_header(self, seed: bytes, layout: int, data_length: int) -> bytes:
+        """Собирает заголовок текущего формата"""
+        if data_length >= 2 ** 32:
+            raise ValueError(f"Слишком большие данные: {data_length} байт")
+        if self.format_version == FORMAT_LEGACY:
+            return struct.pack('>I', data_length)  # 4 байта для длины
+        if self.format_version == FORMAT_FEISTEL:
+            return HEADER_V2.pack(FORMAT_FEISTEL, layout, data_length)
+        if self.format_version == FORMAT_CHECKED:
+            return HEADER_V3.pack(FORMAT_CHECKED, self._check_value(seed), layout, data_length)
+        if self.format_version == FORMAT_TILED:
+            check_tile_size(self.tile_size)
+            return HEADER_V4.pack(FORMAT_TILED, self._check_value(seed), layout, self.tile_size, data_length)
+        raise ValueError(f"Неизвестная версия формата: {self.format_version}")
+    
+    def _header_size(self) -> int:
+        """Размер заголовка текущего формата в байтах"""
+        if self.format_version == FORMAT_LEGACY:
+            return self.header_size
+        return self.header_size_for(self.format_version)
+    
+    def _current_layout(self) -> Tuple[int, int, str]:
+        """Возвращает (байт схемы, бит на канал, каналы) для текущих настроек"""
+        layout = pack_layout(self.bits_per_channel, self.channels)
+        bits_per_channel, channels = unpack_layout(layout)
+        if self.format_version == FORMAT_LEGACY and layout != LAYOUT_RED_1BIT:
+            raise ValueError("Формат 1 поддерживает только 1 бит в красном канале")
+        return layout, bits_per_channel, channels
+    
+    def _check_capacity(self, total_pixels: int, data_length: int, bits_per_channel: int, channels: str):
+        """
+        Проверяет, что данные помещаются в изображение при текущем формате
+        
+        Raises:
+            ValueError: Данные не помещаются
+        """
+        if self.format_version == FORMAT_LEGACY:
+            # Запас capacity_for_pixels - рекомендация; пределом формата 1
+            # остается число пикселей после заголовка
+            capacity = max(0, total_pixels - self.header_size * 8) // 8
+        else:
+            # Формат 4 раскладывает данные по всем пикселям, кроме пикселей
+            # заголовка, поэтому вместимость плиток совпадает с общей
+            capacity = self.capacity_for_pixels(total_pixels, self.format_version, bits_per_channel, channels)
+        if data_length > capacity:
+            raise ValueError(f"Недостаточная вместимость: {data_length} байт, доступно {capacity}")
     
-    def _bits_to_bytes(self, bits: List[int]) -> bytes:
-        """Преобразует список битов в байты"""
-        bytes_data = bytearray()
-        for i in range(0, len(bits), 8):
-            byte_bits = bits[i:i+8]
-            if len(byte_bits) < 8:
-                byte_bits.extend([0] * (8 - len(byte_bits)))
-            byte_val = sum(bit << (7 - j) for j, bit in enumerate(byte_bits))
-            bytes_data.append(byte_val)
-        return bytes(bytes_data)
-    
-    def _bytes_to_bits(self, data: bytes) -> List[int]:
-        """Преобразует байты в список битов"""
-        bits = []
-        for byte in data:
-            for i in range(7, -1, -1):
-                bits.append((byte >> i) & 1)
-        return bits
-    
-    def embed_data(self, image_path: str, data: bytes, password: str) -> Image.Image:
+    def _block_pixels(self, chunk_size: int, bits_per_pixel: int) -> int:
+        """
+        Число пикселей в блоке потоковой обработки
+        
+        Кратно 8, поэтому каждый блок несет целое число байт и границы
+        блоков не разрывают группы бит пикселя.
+        """
+        return max(8, chunk_size * 8 // bits_per_pixel // 8 * 8)
+    
+    def _write_payload(self, flat_pixels: np.ndarray, stream: PixelStream, data: bytes,
+                       bits_per_channel: int, channels: str):
+        """Записывает данные в следующие пиксели потока по схеме размещения"""
+        with self._stage('bit_pack'):
+            bits = self._bytes_to_bits(data)
+        pixel_count = -(-len(bits) // (bits_per_channel * len(channels)))
+        with self._stage('permutation'):
+            indices = stream.next(pixel_count)
+        with self._stage('embed'):
+            self._write_bits(flat_pixels, indices, bits, bits_per_channel, channels)
+        self._count('bytes_embedded', len(data))
+        self._count('pixels_written', pixel_count)
+    
+    def _read_payload(self, flat_pixels: np.ndarray, stream: PixelStream, length: int,
+                      bits_per_channel: int, channels: str) -> bytes:
+        """Читает length байт из следующих пикселей потока по схеме размещения"""
+        pixel_count = -(-length * 8 // (bits_per_channel * len(channels)))
+        with self._stage('permutation'):
+            indices = stream.next(pixel_count)
+        with self._stage('extract'):
+            bits = self._read_bits(flat_pixels, indices, length * 8, bits_per_channel, channels)
+        with self._stage('bit_pack'):
+            data = self._bits_to_bytes(bits)
+        self._count('bytes_extracted', length)
+        self._count('pixels_read', pixel_count)
+        return data
+    
+    def _map_tiles(self, func, segments: list) -> list:
+        """Применяет func к частям данных, параллельно при tile_workers > 1"""
+        workers = min(self.tile_workers, len(segments))
+        if workers <= 1:
+            return [func(segment) for segment in segments]
+        # Плитки не пересекаются, поэтому потоки пишут в разные пиксели
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stegoghost-tile') as pool:
+            return list(pool.map(func, segments))
+    
+    def _write_tiled(self, flat_pixels: np.ndarray, seed_hash: bytes, grid: TileGrid, segments: list,
+                     data: bytes, bits_per_channel: int, channels: str):
+        """
+        Записывает данные по плиткам (формат 4)
+        
+        Args:
+            segments: Раскладка данных по плиткам (plan_segments)
+        """
+        with self._stage('bit_pack'):
+            bits = self._bytes_to_bits(data)
+        
+        def write(segment):
+            with self._stage('permutation'):
+                indices = segment_indices(grid, self._tile_permutation(seed_hash, grid, segment.tile), segment)
+            with self._stage('embed'):
+                self._write_bits(flat_pixels, indices,
+                                 bits[segment.bit_offset:segment.bit_offset + segment.bit_count],
+                                 bits_per_channel, channels)
+        
+        self._map_tiles(write, segments)
+        self._count('bytes_embedded', len(data))
+        self._count('pixels_written', sum(segment.pixel_count for segment in segments))
+        logger.debug("Embed: %d of %d tiles used", len(segments), grid.count)
+    
+    def _read_tiled(self, flat_pixels: np.ndarray, seed_hash: bytes, grid: TileGrid, segments: list,
+                    length: int, bits_per_channel: int, channels: str) -> bytes:
+        """Читает length байт из плиток (обратно к _write_tiled)"""
+        def read(segment):
+            with self._stage('permutation'):
+                indices = segment_indices(grid, self._tile_permutation(seed_hash, grid, segment.tile), segment)
+            with self._stage('extract'):
+                return self._read_bits(flat_pixels, indices, segment.bit_count, bits_per_channel, channels)
+        
+        parts = self._map_tiles(read, segments)
+        with self._stage('bit_pack'):
+            data = self._bits_to_bytes(np.concatenate(parts))
+        self._count('bytes_extracted', length)
+        self._count('pixels_read', sum(segment.pixel_count for segment in segments))
+        logger.debug("Extract: %d of %d tiles read", len(segments), grid.count)
+        return data
+    
+    def _embed_tiled(self, stego_image: StegoImage, seed: bytes, header: bytes, data: bytes,
+                     bits_per_channel: int, channels: str):
+        """
+        Внедряет заголовок в область заголовка, а данные - по плиткам (формат 4)
+        
+        Раскладка по плиткам строится до записи, поэтому при нехватке места
+        пиксели не изменяются.
+        """
+        seed_hash = hashlib.sha256(seed).digest()
+        width, height = stego_image.width, stego_image.height
+        region = HeaderRegion(seed_hash, width, height)
+        if len(header) * 8 > region.size:
+            raise ValueError(f"Изображение {width}x{height} слишком мало для заголовка формата 4")
+        
+        grid = TileGrid(width, height, self.tile_size)
+        with self._stage('permutation'):
+            reserved = region.take(0, len(header) * 8)
+        segments = plan_segments(grid, reserved, len(data) * 8, bits_per_channel * len(channels))
+        
+        flat_pixels = stego_image.flat
+        self._write_payload(flat_pixels, PixelStream(region), header, 1, 'R')
+        self._write_tiled(flat_pixels, seed_hash, grid, segments, data, bits_per_channel, channels)
+    
+    def embed_data(self, image: ImageSource, data: bytes, password: str) -> Image.Image:
         """
         Внедряет зашифрованные данные в изображение
         
         Args:
-            image_path: Путь к исходному изображению
+            image: Путь к исходному изображению, изображение PIL, массив или StegoImage
             data: Зашифрованные данные для внедрения
             password: Пароль для генерации seed
             
         Returns:
             Модифицированное изображение
         """
-        if self.debug:
-            print(f"\n[DEBUG EMBED] Starting embedding...")
-            print(f"[DEBUG EMBED] Data length: {len(data)} bytes")
-            print(f"[DEBUG EMBED] Password: {password}")
+        stego_image = self.embed(image, data, password)
+        with self._stage('build_image'):
+            return stego_image.to_pil()
+    
+    def embed(self, image: ImageSource, data: bytes, password: str) -> StegoImage:
+        """
+        Внедряет зашифрованные данные, возвращая буфер пикселей без конвертации в PIL
+        
+        Переданный StegoImage изменяется на месте: проверка вместимости,
+        внедрение и сохранение работают с одним декодированным буфером.
+        
+        Args:
+            image: Путь к исходному изображению, изображение PIL, массив или StegoImage
+            data: Зашифрованные данные для внедрения
+            password: Пароль для генерации seed
+            
+        Returns:
+            Изображение с внедренными данными
+        """
+        layout, bits_per_channel, channels = self._current_layout()
         
         # Загружаем изображение
-        img = Image.open(image_path)
+        stego_image = self._open_image(image, with_alpha=True if 'A' in channels else False)
+        self._check_channels(stego_image, channels)
+        width, height = stego_image.width, stego_image.height
+        total_pixels = stego_image.total_pixels
+        logger.debug("Embed: %d bytes into %dx%d, %d bit(s) in %s",
+                     len(data), width, height, bits_per_channel, channels)
+        
+        # Вместимость проверяется до записи: буфер вызывающего или файл
+        # на месте не должны остаться с частично записанными данными
+        self._check_capacity(total_pixels, len(data), bits_per_channel, channels)
+        
+        # Подготавливаем заголовок
+        seed = password.encode() + b'stegoghost'
+        header = self._build_header(seed, layout, len(data))
+        
+        if self.format_version == FORMAT_TILED:
+            # Формат 4: заголовок в области заголовка, данные в плитках
+            self._embed_tiled(stego_image, seed, header, data, bits_per_channel, channels)
+            return stego_image
+        
+        # Генерируем последовательность пикселей
+        permutation = self._create_permutation(seed, total_pixels, self.format_version)
+        stream = PixelStream(permutation)
         
-        # ВАЖНО: Всегда конвертируем в RGB для консистентности
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-            if self.debug:
-                print(f"[DEBUG EMBED] Converted image mode from {img.mode} to RGB")
+        # Внедряем биты: заголовок всегда 1 бит в красном канале,
+        # данные - по выбранной схеме размещения
+        flat_pixels = stego_image.flat
+        self._write_payload(flat_pixels, stream, header, 1, 'R')
+        self._write_payload(flat_pixels, stream, data, bits_per_channel, channels)
+        logger.debug("Embed: %d pixels used", stream.position)
+        
+        return stego_image
+    
+    def embed_into(self, array: np.ndarray, data: bytes, password: str):
+        """
+        Внедряет данные прямо в буфер вызывающего без выделения памяти под копию
+        
+        Изменяются только пиксели, выбранные перестановкой. Результат
+        совпадает с embed_data для того же изображения.
+        
+        Args:
+            array: Записываемый массив uint8 формы (H, W, 3) или (H, W, 4)
+                с непрерывными строками пикселей
+            data: Зашифрованные данные для внедрения
+            password: Пароль для генерации seed
+        """
+        _, _, channels = self._current_layout()
+        if not isinstance(array, np.ndarray) or not array.flags.writeable:
+            raise ValueError("embed_into требует записываемый массив NumPy")
+        image = StegoImage(array)
+        if 'A' in channels and not image.has_alpha:
+            raise ValueError("Схема использует альфа-канал, а в буфере его нет")
+        
+        # Плоское представление должно быть видом на буфер, а не копией
+        flat = array.view()
+        try:
+            flat.shape = (-1, array.shape[2])
+        except AttributeError:
+            raise ValueError("Буфер должен хранить пиксели непрерывно (C-порядок)") from None
+        
+        self.embed(image, data, password)
+    
+    def extract_from(self, buffer, password: str, shape: Optional[Tuple[int, ...]] = None) -> Optional[bytes]:
+        """
+        Извлекает данные из буфера вызывающего без копирования
+        
+        Args:
+            buffer: Массив uint8 формы (H, W, 3|4) или объект с протоколом буфера
+                (в том числе memoryview только для чтения)
+            password: Пароль для генерации seed
+            shape: Форма (H, W, C) для плоских буферов
             
-        # Получаем массив пикселей
-        pixels = np.array(img, dtype=np.uint8)
-        height, width = pixels.shape[:2]
-        total_pixels = height * width
+        Returns:
+            Извлеченные зашифрованные данные или None
+        """
+        array = np.asarray(buffer) if isinstance(buffer, np.ndarray) else np.frombuffer(buffer, dtype=np.uint8)
+        if shape is not None:
+            array = array.reshape(shape)
+        elif array.ndim != 3 and isinstance(buffer, memoryview) and buffer.ndim == 3:
+            array = array.reshape(buffer.shape)
+        return self.extract_data(StegoImage(array), password)
+    
+    def embed_in_place(self, image_path: str, data: bytes, password: str):
+        """
+        Внедряет данные прямо в несжатый файл-носитель (PPM/PGM, BMP, NPY)
+        
+        Файл отображается в память, и на диск записываются только пиксели
+        из префикса перестановки: память растет с размером данных, а не
+        изображения. Результат совпадает с embed_data для того же файла.
         
-        if self.debug:
-            print(f"[DEBUG EMBED] Image size: {width}x{height} = {total_pixels} pixels")
+        Args:
+            image_path: Путь к файлу-носителю (изменяется на месте)
+            data: Зашифрованные данные для внедрения
+            password: Пароль для генерации seed
+        """
+        image = open_memmap(image_path, 'r+')
+        if image is None:
+            raise ValueError(f"Формат не поддерживает запись на месте: {image_path}")
+        _, _, channels = self._current_layout()
+        self._check_channels(image, channels)
+        self.embed(image, data, password)
+        image.flush()
+    
+    def embed_stream(self, image: ImageSource, source: Union[BinaryIO, Iterable[bytes]], password: str,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Image.Image:
+        """
+        Потоково внедряет данные произвольного размера (форматы 2-4)
         
-        # Подготавливаем данные с заголовком длины
-        data_length = len(data)
-        header = struct.pack('>I', data_length)  # 4 байта для длины
-        full_data = header + data
+        Данные читаются и записываются в пиксели блоками; заголовок с итоговой
+        длиной записывается последним в заранее зарезервированные пиксели.
+        Результат совпадает с embed_data для тех же данных.
         
-        if self.debug:
-            print(f"[DEBUG EMBED] Header bytes: {header.hex()}")
-            print(f"[DEBUG EMBED] Full data length: {len(full_data)} bytes")
+        В формате 4 раскладка по плиткам зависит от итоговой длины, поэтому
+        данные сначала собираются целиком и внедряются через embed.
         
-        # Преобразуем в биты
-        bits = self._bytes_to_bits(full_data)
-        needed_pixels = len(bits)
+        Args:
+            image: Путь к исходному изображению, изображение PIL, массив или StegoImage
+                (StegoImage изменяется на месте)
+            source: Файлоподобный объект или итерируемое байтовых блоков
+                (например, CryptoModule.iter_encrypt)
+            password: Пароль для генерации seed
+            chunk_size: Примерный размер блока обработки в байтах
+            
+        Returns:
+            Модифицированное изображение
+        """
+        check_chunk_size(chunk_size)
+        if self.format_version == FORMAT_LEGACY:
+            raise ValueError("Потоковое внедрение поддерживается только в форматах 2-4")
+        if self.format_version == FORMAT_TILED:
+            data = b''.join(iter_source_chunks(source, chunk_size))
+            stego_image = self.embed(image, data, password)
+            with self._stage('build_image'):
+                return stego_image.to_pil()
+        layout, bits_per_channel, channels = self._current_layout()
         
-        if self.debug:
-            print(f"[DEBUG EMBED] Total bits to embed: {needed_pixels}")
-            print(f"[DEBUG EMBED] First 32 bits: {bits[:32]}")
+        stego_image = self._open_image(image, with_alpha=True if 'A' in channels else False)
+        self._check_channels(stego_image, channels)
+        flat_pixels = stego_image.flat
         
-        # Генерируем последовательность пикселей
         seed = password.encode() + b'stegoghost'
-        pixel_indices = self._generate_pixel_sequence(seed, total_pixels, needed_pixels)
-        
-        # Внедряем биты
-        flat_pixels = pixels.reshape(-1, 3).copy()  # Важно: делаем копию
-        
-        if self.debug:
-            # Проверяем первые несколько пикселей до изменения
-            print(f"[DEBUG EMBED] First 5 pixel indices: {pixel_indices[:5]}")
-            for i in range(min(5, len(pixel_indices))):
-                idx = pixel_indices[i]
-                print(f"[DEBUG EMBED] Pixel {idx} before: R={flat_pixels[idx][0]}")
-        
-        for bit_idx, pixel_idx in enumerate(pixel_indices):
-            # Используем красный канал для LSB
-            red_value = flat_pixels[pixel_idx][0]
-            # Очищаем LSB и устанавливаем новый бит
-            new_red = (red_value & 0xFE) | bits[bit_idx]
-            flat_pixels[pixel_idx][0] = new_red
+        stream = PixelStream(self._create_permutation(seed, stego_image.total_pixels, self.format_version))
+        
+        # Резервируем пиксели заголовка: длина станет известна в конце
+        header_stream = PixelStream(stream.permutation)
+        stream.next(self._header_size() * 8)
+        
+        block_bytes = self._block_pixels(chunk_size, bits_per_channel * len(channels)) \
+            * bits_per_channel * len(channels) // 8
+        buffer = bytearray()
+        total_length = 0
+        for chunk in iter_source_chunks(source, chunk_size):
+            buffer += chunk
+            total_length += len(chunk)
+            while len(buffer) >= block_bytes:
+                self._write_payload(flat_pixels, stream, bytes(buffer[:block_bytes]), bits_per_channel, channels)
+                del buffer[:block_bytes]
+        self._write_payload(flat_pixels, stream, bytes(buffer), bits_per_channel, channels)
+        
+        header = self._build_header(seed, layout, total_length)
+        self._write_payload(flat_pixels, header_stream, header, 1, 'R')
+        
+        logger.debug("Embed stream: %d bytes into %d pixels", total_length, stream.position)
+        
+        with self._stage('build_image'):
+            return stego_image.to_pil()
+    
+    def _read_header_bytes(self, flat_pixels: np.ndarray, stream: PixelStream, count: int) -> Optional[bytes]:
+        """Читает count байт заголовка (1 бит в красном канале) или None, если не хватает пикселей"""
+        if count * 8 > stream.remaining:
+            return None
+        return self._read_payload(flat_pixels, stream, count, 1, 'R')
+    
+    def _read_feistel_header(self, flat_pixels: np.ndarray, stream: PixelStream,
+                             check_value: int) -> Optional[Tuple[int, str, int]]:
+        """
+        Читает заголовок формата 2 или 3 (перестановка Фейстеля)
+        
+        Заголовок читается по частям, чтобы отбросить чужое изображение как
+        можно раньше: версия (8 бит), затем контрольное значение (32 бита).
+        
+        Args:
+            flat_pixels: Пиксели изображения формы (N, C)
+            stream: Поток индексов перестановки Фейстеля
+            check_value: Ожидаемое контрольное значение для формата 3
             
-        if self.debug:
-            # Проверяем первые несколько пикселей после изменения
-            for i in range(min(5, len(pixel_indices))):
-                idx = pixel_indices[i]
-                print(f"[DEBUG EMBED] Pixel {idx} after: R={flat_pixels[idx][0]}, embedded bit: {bits[i]}")
+        Returns:
+            (бит на канал, каналы, длина данных) или None, если заголовок не найден
+        """
+        version_bytes = self._read_header_bytes(flat_pixels, stream, 1)
+        if version_bytes is None:
+            return None
+        version = version_bytes[0]
+        
+        if version == FORMAT_CHECKED:
+            check_bytes = self._read_header_bytes(flat_pixels, stream, 4)
+            if check_bytes is None or int.from_bytes(check_bytes, 'big') != check_value:
+                logger.debug("Extract: format 3 check value mismatch")
+                return None
+        elif version != FORMAT_FEISTEL:
+            return None
+        
+        tail = self._read_header_bytes(flat_pixels, stream, HEADER_TAIL.size)
+        if tail is None:
+            return None
+        layout, data_length = HEADER_TAIL.unpack(tail)
+        
+        logger.debug("Extract: format %d header, layout %#04x, length %d", version, layout, data_length)
+        
+        layout = self._check_header_layout(flat_pixels, layout, data_length, stream.remaining)
+        if layout is None:
+            return None
+        return layout + (data_length,)
+    
+    def _check_header_layout(self, flat_pixels: np.ndarray, layout: int, data_length: int,
+                             available_pixels: int) -> Optional[Tuple[int, str]]:
+        """
+        Проверяет схему размещения и длину из заголовка
+        
+        Returns:
+            (бит на канал, каналы) или None, если заголовок неправдоподобен
+        """
+        try:
+            bits_per_channel, channels = unpack_layout(layout)
+        except ValueError:
+            return None
+        if max(CHANNEL_ORDER.index(c) for c in channels) >= flat_pixels.shape[1]:
+            return None
+        
+        data_pixels = -(-data_length * 8 // (bits_per_channel * len(channels)))
+        if data_length <= 0 or data_pixels > available_pixels:
+            return None
+        return bits_per_channel, channels
+    
+    def _read_tiled_header(self, flat_pixels: np.ndarray, region: HeaderRegion, total_pixels: int,
+                           check_value: int) -> Optional[Tuple[int, str, int, int]]:
+        """
+        Читает заголовок формата 4 из области заголовка
+        
+        Проверка стоит 8 пикселей для изображений других форматов
+        и 40 пикселей при неверном пароле.
+        
+        Returns:
+            (бит на канал, каналы, длина данных, сторона плитки) или None
+        """
+        stream = PixelStream(region)
+        version_bytes = self._read_header_bytes(flat_pixels, stream, 1)
+        if version_bytes is None or version_bytes[0] != FORMAT_TILED:
+            return None
+        check_bytes = self._read_header_bytes(flat_pixels, stream, 4)
+        if check_bytes is None or int.from_bytes(check_bytes, 'big') != check_value:
+            logger.debug("Extract: format 4 check value mismatch")
+            return None
+        tail = self._read_header_bytes(flat_pixels, stream, HEADER_TILED_TAIL.size)
+        if tail is None:
+            return None
+        layout, tile_size, data_length = HEADER_TILED_TAIL.unpack(tail)
+        
+        logger.debug("Extract: format 4 header, layout %#04x, tile %d, length %d", layout, tile_size, data_length)
+        
+        try:
+            check_tile_size(tile_size)
+        except ValueError:
+            return None
+        # Плитки вмещают все пиксели изображения, кроме пикселей заголовка
+        layout = self._check_header_layout(flat_pixels, layout, data_length, total_pixels - stream.position)
+        if layout is None:
+            return None
+        return layout + (data_length, tile_size)
+    
+    def _extract_tiled(self, stego_image: StegoImage, seed: bytes, check_value: int) -> Optional[bytes]:
+        """
+        Извлекает данные, внедренные в формате 4
+        
+        Returns:
+            Извлеченные данные или None, если заголовок формата 4 не найден
+        """
+        seed_hash = hashlib.sha256(seed).digest()
+        width, height = stego_image.width, stego_image.height
+        region = HeaderRegion(seed_hash, width, height)
+        flat_pixels = stego_image.flat
+        header = self._read_tiled_header(flat_pixels, region, stego_image.total_pixels, check_value)
+        if header is None:
+            return None
+        bits_per_channel, channels, data_length, tile_size = header
+        
+        grid = TileGrid(width, height, tile_size)
+        reserved = region.take(0, self.header_size_for(FORMAT_TILED) * 8)
+        segments = plan_segments(grid, reserved, data_length * 8, bits_per_channel * len(channels))
+        return self._read_tiled(flat_pixels, seed_hash, grid, segments, data_length, bits_per_channel, channels)
+    
+    def _extract_feistel(self, flat_pixels: np.ndarray, stream: PixelStream, check_value: int) -> Optional[bytes]:
+        """
+        Извлекает данные, внедренные в формате 2 или 3 (перестановка Фейстеля)
+        
+        Returns:
+            Извлеченные данные или None, если заголовок не найден
+        """
+        # Заголовок и данные читаются из одного потока перестановки
+        header = self._read_feistel_header(flat_pixels, stream, check_value)
+        if header is None:
+            return None
+        bits_per_channel, channels, data_length = header
+        return self._read_payload(flat_pixels, stream, data_length, bits_per_channel, channels)
+    
+    def _extract_legacy(self, flat_pixels: np.ndarray, stream: PixelStream) -> Optional[bytes]:
+        """
+        Извлекает данные, внедренные в старом формате (формат 1)
+        
+        Args:
+            flat_pixels: Пиксели изображения формы (N, C)
+            stream: Поток индексов перестановки формата 1
+            
+        Returns:
+            Извлеченные данные или None
+        """
+        # Сначала извлекаем заголовок (4 байта = 32 бита)
+        header_bits_count = self.header_size * 8
+        
+        # ВАЖНО: Перестановка вычисляется один раз, заголовок и данные
+        # читаются из нее последовательно
+        with self._stage('permutation'):
+            header_indices = stream.next(header_bits_count)
+        
+        # Читаем LSB красного канала сразу для всех пикселей заголовка
+        with self._stage('extract'):
+            header_bits = flat_pixels[header_indices, 0] & 1
+            
+        # Преобразуем в длину данных
+        header_bytes = self._bits_to_bytes(header_bits)
+        data_length = struct.unpack('>I', header_bytes)[0]
+        
+        # Проверяем разумность длины
+        if data_length <= 0 or data_length > self.max_message_length * 10:
+            logger.debug("Extract: invalid legacy data length %d", data_length)
+            return None
             
-        # Восстанавливаем форму и создаем новое изображение
-        modified_pixels = flat_pixels.reshape(height, width, 3)
-        result_img = Image.fromarray(modified_pixels, mode='RGB')
+        # Теперь извлекаем данные с правильным offset
+        data_bits_count = data_length * 8
         
-        if self.debug:
-            print(f"[DEBUG EMBED] Embedding completed successfully")
-            print(f"[DEBUG EMBED] Result image mode: {result_img.mode}")
+        # Данные следуют в потоке сразу за заголовком
+        with self._stage('permutation'):
+            data_indices = stream.next(data_bits_count)
         
-        return result_img
+        # Извлекаем биты данных одной операцией
+        with self._stage('extract'):
+            data_bits = flat_pixels[data_indices, 0] & 1
+            
+        # Преобразуем биты в байты и возвращаем только нужное количество байт
+        with self._stage('bit_pack'):
+            result = self._bits_to_bytes(data_bits)
+        self._count('bytes_extracted', self.header_size + data_length)
+        self._count('pixels_read', header_bits_count + data_bits_count)
+        logger.debug("Extract: legacy format, %d bytes", data_length)
+        
+        return result
     
-    def extract_data(self, image_path: str, password: str) -> Optional[bytes]:
+    def extract_data(self, image: ImageSource, password: str) -> Optional[bytes]:
         """
         Извлекает данные из изображения
         
         Args:
-            image_path: Путь к изображению с данными
+            image: Путь к изображению с данными, изображение PIL, массив или StegoImage
             password: Пароль для генерации seed
             
         Returns:
             Извлеченные зашифрованные данные или None
         """
         try:
-            if self.debug:
-                print(f"\n[DEBUG EXTRACT] Starting extraction...")
-                print(f"[DEBUG EXTRACT] Password: {password}")
-            
-            # Загружаем изображение
-            img = Image.open(image_path)
-            
-            # ВАЖНО: Всегда конвертируем в RGB для консистентности
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-                if self.debug:
-                    print(f"[DEBUG EXTRACT] Converted image mode from {img.mode} to RGB")
-                
-            pixels = np.array(img, dtype=np.uint8)
-            height, width = pixels.shape[:2]
-            total_pixels = height * width
-            
-            if self.debug:
-                print(f"[DEBUG EXTRACT] Image size: {width}x{height} = {total_pixels} pixels")
-                print(f"[DEBUG EXTRACT] Image mode: {img.mode}")
+            # Загружаем изображение (с альфа-каналом, если он есть:
+            # схема размещения может его использовать)
+            stego_image = self._open_image(image, with_alpha=None)
+            width, height = stego_image.width, stego_image.height
+            total_pixels = stego_image.total_pixels
+            logger.debug("Extract: %dx%d image", width, height)
             
             # Генерируем seed
             seed = password.encode() + b'stegoghost'
             
-            # Сначала извлекаем заголовок (4 байта = 32 бита)
-            header_bits_count = self.header_size * 8
-            
-            # ВАЖНО: Получаем индексы для заголовка с offset=0
-            header_indices = self._generate_pixel_sequence(seed, total_pixels, header_bits_count, offset=0)
-            
-            # Извлекаем биты заголовка
-            flat_pixels = pixels.reshape(-1, 3)
-            header_bits = []
-            
-            if self.debug:
-                print(f"[DEBUG EXTRACT] First 5 header pixel indices: {header_indices[:5]}")
+            flat_pixels = stego_image.flat
             
-            for i, pixel_idx in enumerate(header_indices):
-                red_value = flat_pixels[pixel_idx][0]
-                bit = red_value & 1
-                header_bits.append(bit)
-                
-                if self.debug and i < 5:
-                    print(f"[DEBUG EXTRACT] Pixel {pixel_idx}: R={red_value}, extracted bit: {bit}")
-                
-            if self.debug:
-                print(f"[DEBUG EXTRACT] Header bits: {header_bits}")
-                
-            # Преобразуем в длину данных
-            header_bytes = self._bits_to_bytes(header_bits)
-            data_length = struct.unpack('>I', header_bytes)[0]
+            # Сначала пробуем форматы 4, 3 и 2: их заголовки читаются за O(1),
+            # и только при несовпадении переходим к старому формату
+            check_value = self._check_value(seed)
+            result = self._extract_tiled(stego_image, seed, check_value)
+            if result is None:
+                permutation = self._create_permutation(seed, total_pixels, FORMAT_CHECKED)
+                result = self._extract_feistel(flat_pixels, PixelStream(permutation), check_value)
+            if result is None and self.legacy_fallback:
+                logger.debug("Extract: no format 2-4 header, trying legacy format")
+                permutation = self._create_permutation(seed, total_pixels, FORMAT_LEGACY)
+                result = self._extract_legacy(flat_pixels, PixelStream(permutation))
             
-            if self.debug:
-                print(f"[DEBUG EXTRACT] Header bytes: {header_bytes.hex()}")
-                print(f"[DEBUG EXTRACT] Extracted data length: {data_length}")
-            
-            # Проверяем разумность длины
-            if data_length <= 0 or data_length > self.max_message_length * 10:
-                if self.debug:
-                    print(f"[DEBUG EXTRACT] Invalid data length: {data_length}")
-                return None
-                
-            # Теперь извлекаем данные с правильным offset
-            data_bits_count = data_length * 8
+            return result
             
-            # ВАЖНО: Получаем индексы для данных с offset=header_bits_count
-            data_indices = self._generate_pixel_sequence(seed, total_pixels, data_bits_count, offset=header_bits_count)
+        except Exception as e:
+            # Трассировка - только при включенном уровне DEBUG
+            self._count('extract_errors')
+            logger.warning("Ошибка извлечения: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return None
+    
+    def iter_extract(self, image: ImageSource, password: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Потоково извлекает данные блоками (пара к embed_stream)
+        
+        Одновременно в памяти находится только один блок данных и его индексы
+        (в формате 4 плитки читаются целиком, данные выдаются одним блоком).
+        Если данные не найдены, итератор ничего не выдает.
+        
+        Args:
+            image: Путь к изображению с данными, изображение PIL, массив или StegoImage
+            password: Пароль для генерации seed
+            chunk_size: Примерный размер блока в байтах
             
-            # Извлекаем биты данных
-            data_bits = []
-            for pixel_idx in data_indices:
-                red_value = flat_pixels[pixel_idx][0]
-                bit = red_value & 1
-                data_bits.append(bit)
-                
-            if self.debug:
-                print(f"[DEBUG EXTRACT] Extracted {len(data_bits)} data bits")
-                if len(data_bits) >= 8:
-                    print(f"[DEBUG EXTRACT] First 8 data bits: {data_bits[:8]}")
-                
-            # Преобразуем биты в байты
-            extracted_data = self._bits_to_bytes(data_bits)
+        Returns:
+            Итератор блоков извлеченных данных (например, для CryptoModule.iter_decrypt)
+        """
+        check_chunk_size(chunk_size)
+        stego_image = self._open_image(image, with_alpha=None)
+        flat_pixels = stego_image.flat
+        total_pixels = stego_image.total_pixels
+        seed = password.encode() + b'stegoghost'
+        
+        check_value = self._check_value(seed)
+        
+        data = self._extract_tiled(stego_image, seed, check_value)
+        if data is not None:
+            yield data
+            return
+        
+        stream = PixelStream(self._create_permutation(seed, total_pixels, FORMAT_CHECKED))
+        header = self._read_feistel_header(flat_pixels, stream, check_value)
+        if header is None:
+            if self.legacy_fallback:
+                data = self._extract_legacy(flat_pixels, PixelStream(
+                    self._create_permutation(seed, total_pixels, FORMAT_LEGACY)))
+                if data:
+                    yield data
+            return
+        
+        bits_per_channel, channels, remaining = header
+        block_bytes = self._block_pixels(chunk_size, bits_per_channel * len(channels)) \
+            * bits_per_channel * len(channels) // 8
+        while remaining > 0:
+            length = min(block_bytes, remaining)
+            yield self._read_payload(flat_pixels, stream, length, bits_per_channel, channels)
+            remaining -= length
+    
+    @staticmethod
+    def header_size_for(format_version: int) -> int:
+        """Размер заголовка указанного формата в байтах"""
+        if format_version == FORMAT_LEGACY:
+            return struct.calcsize('>I')
+        if format_version == FORMAT_FEISTEL:
+            return HEADER_V2.size
+        if format_version == FORMAT_CHECKED:
+            return HEADER_V3.size
+        if format_version == FORMAT_TILED:
+            return HEADER_V4.size
+        raise ValueError(f"Неизвестная версия формата: {format_version}")
+    
+    @staticmethod
+    def capacity_for_pixels(total_pixels: int, format_version: int,
+                            bits_per_channel: int = 1, channels: str = 'R') -> int:
+        """
+        Вместимость в байтах для заданного числа пикселей, формата и схемы размещения
+        
+        Args:
+            total_pixels: Количество пикселей изображения
+            format_version: Версия формата внедрения
+            bits_per_channel: Младших бит на канал
+            channels: Каналы для данных
             
-            # Возвращаем только нужное количество байт
-            result = extracted_data[:data_length]
+        Returns:
+            Максимальный размер зашифрованных данных в байтах
+        """
+        bits_per_channel, channels = unpack_layout(pack_layout(bits_per_channel, channels))
+        header_size = StegoEngine.header_size_for(format_version)
+        
+        if format_version == FORMAT_LEGACY:
+            if (bits_per_channel, channels) != (1, 'R'):
+                raise ValueError("Формат 1 поддерживает только 1 бит в красном канале")
+            # Вычитаем заголовок и оставляем запас
+            return (total_pixels - header_size * 8) // 8 // 2
+        
+        # Форматы 2-4 используют точную вместимость: заголовок занимает
+        # по одному пикселю на бит, остальные пиксели несут данные по схеме
+        # (в формате 4 плитки пропускают только пиксели заголовка)
+        usable_pixels = max(0, total_pixels - header_size * 8)
+        return usable_pixels * bits_per_channel * len(channels) // 8
+    
+    def analyze_capacity(self, image: ImageSource, crypto_overhead: int = 0) -> CapacityReport:
+        """
+        Строит отчет о вместимости изображения для текущих настроек
+        
+        Для файла читается только заголовок, пиксели не декодируются;
+        для уже декодированного источника используются его размеры.
+        
+        Args:
+            image: Путь к изображению, изображение PIL, массив или StegoImage
+            crypto_overhead: Накладные расходы шифрования
+                (например, CryptoModule.get_encrypted_size(0))
             
-            if self.debug:
-                print(f"[DEBUG EXTRACT] Successfully extracted {len(result)} bytes")
-                
-            return result
+        Returns:
+            Отчет о вместимости
             
-        except Exception as e:
-            print(f"[DEBUG EXTRACT] Error: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
+        Raises:
+            ValueError: В несжатом носителе нет каналов схемы размещения
+        """
+        if isinstance(image, (str, Path)):
+            # Несжатые форматы: размеры из заголовка отображенного файла
+            image = open_memmap(image, 'r') or image
+        
+        if isinstance(image, StegoImage):
+            width, height = image.width, image.height
+            mode, image_format, has_alpha = image.mode, image.source_format, image.has_alpha
+        elif isinstance(image, np.ndarray):
+            height, width = image.shape[:2]
+            has_alpha = image.ndim == 3 and image.shape[2] == 4
+            mode, image_format = 'RGBA' if has_alpha else 'RGB', None
+        elif isinstance(image, Image.Image):
+            width, height = image.size
+            mode, image_format, has_alpha = image.mode, image.format, image_has_alpha(image)
+        else:
+            with Image.open(image) as img:
+                width, height = img.size
+                mode, image_format, has_alpha = img.mode, img.format, image_has_alpha(img)
+        
+        _, bits_per_channel, channels = self._current_layout()
+        if isinstance(image, StegoImage) and not ('A' in channels and not image.has_alpha):
+            # Буфер используется при внедрении как есть (например, PGM с одним
+            # каналом), поэтому каналов схемы в нем может не быть
+            self._check_channels(image, channels)
+        header_bytes = self._header_size()
+        return CapacityReport(
+            width=width,
+            height=height,
+            mode=mode,
+            image_format=image_format,
+            has_alpha=has_alpha,
+            format_version=self.format_version,
+            bits_per_channel=bits_per_channel,
+            channels=channels,
+            bits_per_pixel=bits_per_channel * len(channels),
+            header_bytes=header_bytes,
+            usable_pixels=max(0, width * height - header_bytes * 8),
+            capacity=self.capacity_for_pixels(width * height, self.format_version, bits_per_channel, channels),
+            crypto_overhead=crypto_overhead,
+        )
     
-    def calculate_capacity(self, image_path: str) -> int:
-        """Вычисляет максимальную вместимость изображения в байтах"""
-        img = Image.open(image_path)
-        width, height = img.size
-        total_pixels = width * height
-        # Вычитаем заголовок и оставляем запас
-        return (total_pixels - self.header_size * 8) // 8 // 2 
\ No newline at end of file
+    def calculate_capacity(self, image: ImageSource) -> int:
+        """Вычисляет максимальную вместимость изображения в байтах для текущей схемы размещения"""
+        return self.analyze_capacity(image).capacity
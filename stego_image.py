@@ -0,0 +1,285 @@
+"""
+Изображение-носитель StegoGhost
+Однократное декодирование и единый изменяемый буфер пикселей
+"""
+
+import struct
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+
+# Режимы PIL, в которых есть альфа-канал
+ALPHA_MODES = ('RGBA', 'LA', 'PA')
+
+# Несжатые форматы, которые открываются через np.memmap без декодирования
+MEMMAP_FORMATS = {'.ppm', '.pgm', '.bmp', '.npy'}
+
+# Режим буфера по количеству каналов
+CHANNEL_MODES = {1: 'L', 3: 'RGB', 4: 'RGBA'}
+
+
+def image_has_alpha(img: Image.Image) -> bool:
+    """Проверяет, есть ли в изображении PIL альфа-канал (без декодирования пикселей)"""
+    return img.mode in ALPHA_MODES or 'transparency' in img.info
+
+
+class StridedPixels:
+    """
+    Плоский доступ (N, C) к буферу, который нельзя развернуть без копии
+
+    Например, BMP хранит строки снизу вверх и каналы в порядке BGR: вид
+    на отображенный файл имеет отрицательные шаги. Индекс пикселя
+    переводится в (строка, столбец), поэтому запись идет прямо в буфер.
+    """
+
+    def __init__(self, pixels: np.ndarray):
+        self.pixels = pixels
+        self.width = pixels.shape[1]
+        self.shape = (pixels.shape[0] * pixels.shape[1], pixels.shape[2])
+
+    def _locate(self, key) -> tuple:
+        rows, channel = key
+        rows = np.asarray(rows)
+        return rows // self.width, rows % self.width, channel
+
+    def __getitem__(self, key) -> np.ndarray:
+        return self.pixels[self._locate(key)]
+
+    def __setitem__(self, key, value):
+        self.pixels[self._locate(key)] = value
+
+
+class StegoImage:
+    """
+    Декодированное изображение с одним изменяемым буфером пикселей
+
+    Буфер имеет форму (высота, ширина, 3 или 4) и тип uint8. Проверка
+    вместимости, внедрение, извлечение и сохранение работают с этим
+    буфером напрямую, без повторного декодирования, конвертации и копий.
+    """
+
+    def __init__(self, pixels: np.ndarray, source_format: Optional[str] = None,
+                 source_path: Optional[str] = None):
+        """
+        Args:
+            pixels: Массив uint8 формы (H, W, 3) или (H, W, 4), используется без копирования
+                (форма (H, W, 1) - только для отображенных в память файлов PGM и NPY)
+            source_format: Формат исходного файла по данным PIL
+            source_path: Путь к исходному файлу
+        """
+        if pixels.dtype != np.uint8 or pixels.ndim != 3 or pixels.shape[2] not in CHANNEL_MODES:
+            raise ValueError(f"Ожидается массив uint8 формы (H, W, 3|4), получено {pixels.dtype} {pixels.shape}")
+        self.pixels = pixels
+        self.source_format = source_format
+        self.source_path = source_path
+
+    @classmethod
+    def open(cls, image_path: Union[str, Path], with_alpha: Optional[bool] = None) -> 'StegoImage':
+        """
+        Открывает и декодирует файл один раз
+
+        Args:
+            image_path: Путь к изображению
+            with_alpha: True - RGBA, False - RGB, None - RGBA только при наличии альфа-канала
+        """
+        with Image.open(image_path) as img:
+            return cls.from_pil(img, with_alpha, source_path=str(image_path))
+
+    @classmethod
+    def from_pil(cls, img: Image.Image, with_alpha: Optional[bool] = None,
+                 source_path: Optional[str] = None) -> 'StegoImage':
+        """Декодирует изображение PIL, конвертируя режим только при необходимости"""
+        if with_alpha is None:
+            with_alpha = image_has_alpha(img)
+        mode = 'RGBA' if with_alpha else 'RGB'
+        converted = img if img.mode == mode else img.convert(mode)
+        return cls(np.array(converted, dtype=np.uint8), img.format, source_path)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray, with_alpha: Optional[bool] = None) -> 'StegoImage':
+        """
+        Создает изображение из массива (копия; исходный массив не изменяется)
+
+        Args:
+            array: Массив uint8 формы (H, W), (H, W, 3) или (H, W, 4)
+            with_alpha: True - добавить альфа-канал, False - отбросить, None - как есть
+        """
+        array = np.asarray(array)
+        if array.dtype != np.uint8:
+            raise ValueError(f"Ожидается массив uint8, получено {array.dtype}")
+        if array.ndim == 3 and array.shape[2] == 1:
+            array = array[:, :, 0]
+        if array.ndim == 2:
+            array = np.repeat(array[:, :, None], 3, axis=2)
+        elif array.ndim != 3 or array.shape[2] not in (3, 4):
+            raise ValueError(f"Неподдерживаемая форма массива: {array.shape}")
+        else:
+            array = array.copy()
+
+        image = cls(array)
+        if with_alpha:
+            image.ensure_alpha()
+        elif with_alpha is False and image.has_alpha:
+            image.pixels = np.ascontiguousarray(image.pixels[:, :, :3])
+        return image
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def channel_count(self) -> int:
+        return self.pixels.shape[2]
+
+    @property
+    def total_pixels(self) -> int:
+        return self.width * self.height
+
+    @property
+    def has_alpha(self) -> bool:
+        return self.channel_count == 4
+
+    @property
+    def mode(self) -> str:
+        return CHANNEL_MODES[self.channel_count]
+
+    @property
+    def flat(self) -> Union[np.ndarray, StridedPixels]:
+        """Представление буфера формы (N, C) без копирования"""
+        flat = self.pixels.view()
+        try:
+            flat.shape = (-1, self.channel_count)
+        except AttributeError:
+            # Развернуть без копии нельзя - адресуем пиксели через строку и столбец
+            return StridedPixels(self.pixels)
+        return flat
+
+    def ensure_alpha(self):
+        """Добавляет непрозрачный альфа-канал, если его нет (единственная копия буфера)"""
+        if self.channel_count == 1:
+            raise ValueError("Нельзя добавить альфа-канал к одноканальному изображению")
+        if not self.has_alpha:
+            alpha = np.full(self.pixels.shape[:2] + (1,), 255, dtype=np.uint8)
+            self.pixels = np.concatenate([self.pixels, alpha], axis=2)
+
+    def to_pil(self) -> Image.Image:
+        """Создает изображение PIL из буфера"""
+        if self.channel_count == 1:
+            return Image.fromarray(np.ascontiguousarray(self.pixels[:, :, 0]), mode='L')
+        return Image.fromarray(np.ascontiguousarray(self.pixels), mode=self.mode)
+
+    def flush(self):
+        """Сбрасывает изменения отображенного в память файла на диск"""
+        base = self.pixels
+        while base is not None:
+            if isinstance(base, np.memmap):
+                base.flush()
+                return
+            base = base.base
+
+    def save(self, output_path: Union[str, Path], format: str = "PNG", **params):
+        """Сохраняет буфер в файл"""
+        self.to_pil().save(output_path, format, **params)
+
+
+def _read_pnm_header(f) -> Optional[Tuple[int, int, int]]:
+    """Читает заголовок бинарного PPM/PGM: (каналы, ширина, высота) или None"""
+    channels = {b'P6': 3, b'P5': 1}.get(f.read(2))
+    if channels is None:
+        return None
+
+    values = []
+    token = b''
+    while len(values) < 3:
+        char = f.read(1)
+        if not char:
+            return None
+        if char == b'#':
+            f.readline()
+        elif char.isspace():
+            if token:
+                values.append(int(token))
+                token = b''
+        else:
+            token += char
+    # После maxval ровно один пробельный символ (уже прочитан)
+
+    width, height, maxval = values
+    # Отображаются только 8-битные образцы без масштабирования
+    if maxval != 255:
+        return None
+    return channels, width, height
+
+
+def _map_pnm(path: str, mode: str) -> Optional[np.ndarray]:
+    with open(path, 'rb') as f:
+        header = _read_pnm_header(f)
+        offset = f.tell()
+    if header is None:
+        return None
+    channels, width, height = header
+    return np.memmap(path, dtype=np.uint8, mode=mode, offset=offset, shape=(height, width, channels))
+
+
+def _map_bmp(path: str, mode: str) -> Optional[np.ndarray]:
+    with open(path, 'rb') as f:
+        header = f.read(34)
+    if len(header) < 34 or header[:2] != b'BM':
+        return None
+    offset, dib_size, width, height, _, bits, compression = struct.unpack('<I I i i H H I', header[10:34])
+    # Отображаются только несжатые 24-битные BMP
+    if dib_size < 40 or bits != 24 or compression != 0 or width <= 0 or height == 0:
+        return None
+
+    row_stride = (width * 3 + 3) & ~3
+    rows = np.memmap(path, dtype=np.uint8, mode=mode, offset=offset, shape=(abs(height), row_stride))
+    # Строки в файле хранятся снизу вверх (если высота положительна), каналы - BGR
+    pixels = rows[:, :width * 3].reshape(abs(height), width, 3)[:, :, ::-1]
+    return pixels[::-1] if height > 0 else pixels
+
+
+def _map_npy(path: str, mode: str) -> Optional[np.ndarray]:
+    array = np.load(path, mmap_mode=mode, allow_pickle=False)
+    if array.dtype != np.uint8:
+        return None
+    if array.ndim == 2:
+        return array[:, :, None]
+    if array.ndim == 3 and array.shape[2] in CHANNEL_MODES:
+        return array
+    return None
+
+
+_MAPPERS = {'.ppm': (_map_pnm, 'PPM'), '.pgm': (_map_pnm, 'PPM'), '.bmp': (_map_bmp, 'BMP'), '.npy': (_map_npy, 'NPY')}
+
+
+def open_memmap(image_path: Union[str, Path], mode: str = 'r') -> Optional[StegoImage]:
+    """
+    Отображает несжатый файл-носитель в память без декодирования
+
+    Пиксели читаются с диска по мере обращения, поэтому память растет
+    с числом затронутых пикселей, а не с размером изображения. Порядок
+    пикселей и каналов совпадает с декодированием через PIL.
+
+    Args:
+        image_path: Путь к PPM/PGM, BMP или NPY
+        mode: 'r' - только чтение, 'c' - копирование при записи (файл не меняется),
+            'r+' - запись прямо в файл
+
+    Returns:
+        Изображение на отображенном буфере или None, если формат не поддерживается
+    """
+    mapper = _MAPPERS.get(Path(image_path).suffix.lower())
+    if mapper is None:
+        return None
+    open_map, source_format = mapper
+    pixels = open_map(str(image_path), mode)
+    if pixels is None:
+        return None
+    return StegoImage(pixels, source_format, str(image_path))
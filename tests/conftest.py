@@ -0,0 +1,68 @@
+"""
+Общие фикстуры тестов StegoGhost
+Одна параметризованная фикстура на версию формата и одна на несжатый носитель
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from stego_engine import FORMAT_CHECKED, FORMAT_FEISTEL, FORMAT_LEGACY, FORMAT_TILED, StegoEngine
+
+FORMATS = [FORMAT_LEGACY, FORMAT_FEISTEL, FORMAT_CHECKED, FORMAT_TILED]
+
+# Схемы размещения (бит на канал, каналы); формат 1 допускает только первую
+LAYOUTS = [(1, 'R'), (2, 'RGB'), (3, 'RGBA'), (1, 'GB')]
+
+# Плитки меньше носителя, чтобы данные занимали несколько плиток
+TEST_TILE_SIZE = 32
+
+PASSWORD = 'correct horse'
+
+
+def make_engine(format_version: int, bits_per_channel: int = 1, channels: str = 'R') -> StegoEngine:
+    """Движок с указанным форматом и схемой размещения"""
+    engine = StegoEngine()
+    engine.format_version = format_version
+    engine.bits_per_channel = bits_per_channel
+    engine.channels = channels
+    engine.tile_size = TEST_TILE_SIZE
+    return engine
+
+
+def make_carrier(height: int = 90, width: int = 130, channels: int = 3) -> np.ndarray:
+    """Детерминированный носитель, не зависящий от генератора случайных чисел NumPy"""
+    values = np.arange(height * width * channels, dtype=np.uint64) * 7919 % 251
+    return values.astype(np.uint8).reshape(height, width, channels)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(20240611)
+
+
+@pytest.fixture(params=FORMATS, ids=lambda version: f'format{version}')
+def format_version(request) -> int:
+    return request.param
+
+
+@pytest.fixture
+def engine(format_version) -> StegoEngine:
+    """Движок каждой версии формата со схемой по умолчанию (1 бит в красном)"""
+    return make_engine(format_version)
+
+
+@pytest.fixture
+def carrier() -> np.ndarray:
+    return make_carrier()
+
+
+@pytest.fixture(params=['bmp', 'ppm', 'npy'])
+def memmap_path(request, tmp_path, carrier):
+    """Несжатый носитель, который движок отображает в память"""
+    path = tmp_path / f'carrier.{request.param}'
+    if request.param == 'npy':
+        np.save(path, carrier)
+    else:
+        Image.fromarray(carrier).save(path)
+    return path
@@ -0,0 +1,53 @@
+"""
+Асинхронный интерфейс AsyncStegoEngine
+"""
+
+import asyncio
+import io
+
+from PIL import Image
+
+from async_engine import AsyncStegoEngine
+from tests.conftest import PASSWORD, make_carrier
+
+
+def png_bytes() -> bytes:
+    output = io.BytesIO()
+    Image.fromarray(make_carrier()).save(output, 'PNG')
+    return output.getvalue()
+
+
+class AsyncReader:
+    """Источник с асинхронным read, как у загрузок веб-фреймворков"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def read(self) -> bytes:
+        return self.data
+
+
+def test_hide_extract(engine):
+    async def scenario():
+        async with AsyncStegoEngine(engine, max_concurrency=2) as stego:
+            image = await stego.hide(png_bytes(), 'привет', PASSWORD)
+            results = await asyncio.gather(
+                stego.extract(image, PASSWORD),
+                stego.extract(AsyncReader(image), PASSWORD),
+                stego.extract(io.BytesIO(image), PASSWORD, binary=True),
+            )
+            report = await stego.capacity(png_bytes())
+            return results, report
+
+    results, report = asyncio.run(scenario())
+    assert results == ['привет', 'привет', 'привет'.encode()]
+    assert report.max_message_bytes > 0
+
+
+def test_raw_data_round_trip(engine):
+    async def scenario():
+        async with AsyncStegoEngine(engine) as stego:
+            image = await stego.embed_data(make_carrier(), b'raw bytes', PASSWORD)
+            return await stego.extract_data(image, PASSWORD)
+
+    assert asyncio.run(scenario()) == b'raw bytes'
@@ -0,0 +1,61 @@
+"""
+Пакетная обработка на пуле процессов: порядок результатов, ошибки задач, ограничение нагрузки
+"""
+
+import pytest
+from PIL import Image
+
+from batch import BatchJob, BatchProcessor
+from tests.conftest import PASSWORD, make_carrier
+
+IMAGE_COUNT = 6
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for index in range(IMAGE_COUNT):
+        path = tmp_path / f'image{index}.png'
+        Image.fromarray(make_carrier(40 + index, 60)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_ordered_round_trip(tmp_path, images):
+    processor = BatchProcessor(PASSWORD, workers=2)
+    hide_jobs = [BatchJob('hide', path, message=f'message {index}', output_path=str(tmp_path / f'out{index}.png'))
+                 for index, path in enumerate(images)]
+    hidden = list(processor.run(hide_jobs))
+    assert [result.job for result in hidden] == hide_jobs
+    assert all(result.ok for result in hidden)
+
+    extracted = list(processor.run(BatchJob('extract', result.data['output']) for result in hidden))
+    assert [result.data['message'] for result in extracted] == [f'message {i}' for i in range(IMAGE_COUNT)]
+
+
+def test_error_isolated(tmp_path, images):
+    broken = tmp_path / 'broken.png'
+    broken.write_bytes(b'not an image')
+    jobs = [BatchJob('capacity', path) for path in images[:2]] + [BatchJob('capacity', str(broken))] \
+        + [BatchJob('capacity', path) for path in images[2:]]
+    results = list(BatchProcessor(workers=2, ordered=False).run(jobs))
+    assert len(results) == len(jobs)
+    errors = [result for result in results if not result.ok]
+    assert [result.job.image_path for result in errors] == [str(broken)]
+    assert errors[0].status == 'error' and errors[0].error
+
+
+def test_backpressure(images):
+    pulled = []
+
+    def jobs():
+        for path in images * 3:
+            pulled.append(path)
+            yield BatchJob('capacity', path)
+
+    results = BatchProcessor(workers=2, max_in_flight=3).run(jobs())
+    first = next(results)
+    assert first.ok
+    # Пока первый результат не получен, из источника взято не больше max_in_flight задач
+    assert len(pulled) == 3
+    assert len(list(results)) == len(images) * 3 - 1
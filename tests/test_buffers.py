@@ -0,0 +1,23 @@
+"""
+Буферы вызывающего: embed_into и extract_from без копирования
+"""
+
+import numpy as np
+import pytest
+
+from tests.conftest import PASSWORD
+
+
+def test_caller_buffers(engine, carrier):
+    buffer = carrier.copy()
+    engine.embed_into(buffer, b'in place', PASSWORD)
+    assert np.array_equal(buffer, np.asarray(engine.embed_data(carrier, b'in place', PASSWORD)))
+    view = memoryview(buffer).toreadonly()
+    assert engine.extract_from(view, PASSWORD) == b'in place'
+
+
+def test_over_capacity_leaves_buffer(engine, carrier):
+    buffer = carrier.copy()
+    with pytest.raises(ValueError):
+        engine.embed_into(buffer, bytes(carrier.shape[0] * carrier.shape[1]), PASSWORD)
+    assert np.array_equal(buffer, carrier)
@@ -0,0 +1,79 @@
+"""
+Отчет о вместимости по заголовку файла
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from crypto_module import CryptoModule
+from stego_engine import FORMAT_CHECKED, StegoEngine
+from tests.conftest import make_carrier
+
+
+@pytest.fixture
+def png_path(tmp_path):
+    path = tmp_path / 'carrier.png'
+    Image.fromarray(make_carrier()).save(path)
+    return path
+
+
+@pytest.fixture
+def pgm_path(tmp_path):
+    path = tmp_path / 'gray.pgm'
+    Image.fromarray(make_carrier()[:, :, 0]).save(path)
+    return path
+
+
+def test_report_from_header(png_path):
+    engine = StegoEngine()
+    engine.channels = 'RGB'
+    engine.bits_per_channel = 2
+    overhead = CryptoModule().get_encrypted_size(0)
+    with engine.collect_stats() as stats:
+        report = engine.analyze_capacity(png_path, overhead)
+    assert 'images_decoded' not in stats.counters  # Пиксели не декодируются
+
+    header_bits = engine.header_size_for(FORMAT_CHECKED) * 8
+    assert (report.width, report.height, report.mode, report.image_format) == (130, 90, 'RGB', 'PNG')
+    assert report.bits_per_pixel == 6
+    assert report.usable_pixels == 130 * 90 - header_bits
+    assert report.capacity == report.usable_pixels * 6 // 8
+    assert report.max_message_bytes == report.capacity - overhead
+    assert report.fits(report.capacity) and not report.fits(report.capacity + 1)
+    assert report.capacity_for(1, 'R') == report.usable_pixels // 8
+
+    record = report.to_dict()
+    assert record['max_message_bytes'] == report.max_message_bytes
+    assert record['channels'] == 'RGB'
+
+
+def test_report_matches_embed(png_path):
+    engine = StegoEngine()
+    engine.channels = 'RGBA'
+    report = engine.analyze_capacity(png_path)
+    assert report.capacity == engine.analyze_capacity(make_carrier()).capacity
+    engine.embed(png_path, bytes(report.capacity), 'pw')
+    with pytest.raises(ValueError):
+        engine.embed(png_path, bytes(report.capacity + 1), 'pw')
+
+
+def test_missing_channels(pgm_path):
+    engine = StegoEngine()
+    engine.channels = 'RGB'
+    with pytest.raises(ValueError):
+        engine.analyze_capacity(pgm_path)
+    with pytest.raises(ValueError):
+        engine.embed(pgm_path, b'x', 'pw')
+
+    # Красный канал и схемы с альфа-каналом (буфер расширяется до RGBA) доступны
+    for channels in ('R', 'RGBA'):
+        engine.channels = channels
+        report = engine.analyze_capacity(pgm_path)
+        assert (report.mode, report.capacity > 0) == ('L', True)
+        engine.embed(pgm_path, bytes(report.capacity), 'pw')
+
+
+def test_small_image_has_no_capacity():
+    report = StegoEngine().analyze_capacity(np.zeros((4, 4, 3), dtype=np.uint8))
+    assert (report.usable_pixels, report.capacity, report.max_message_bytes) == (0, 0, 0)
@@ -0,0 +1,96 @@
+"""
+Командная строка: hide, extract и capacity через cli.main
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import cli
+from tests.conftest import PASSWORD, make_carrier
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def cover(tmp_path):
+    path = tmp_path / 'cover.png'
+    Image.fromarray(make_carrier()).save(path)
+    return path
+
+
+def run(capsys, *argv) -> list:
+    """Запускает CLI и возвращает записи JSON Lines из stdout"""
+    assert cli.main([str(arg) for arg in argv]) == 0
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+@pytest.mark.parametrize('layout', [['--format', '1'], ['--format', '3', '--channels', 'RGB'],
+                                    ['--format', '4', '--tile-size', '32', '--tile-workers', '2']],
+                         ids=['format1', 'format3-rgb', 'format4'])
+def test_hide_extract(capsys, tmp_path, cover, layout):
+    [hidden] = run(capsys, 'hide', cover, '--message', 'привет', '--password', PASSWORD,
+                   '--output-dir', tmp_path / 'out', *layout)
+    assert hidden['status'] == 'ok'
+    # Формат 1 при сканировании ищется только по --legacy
+    legacy = ['--legacy'] if layout[1] == '1' else []
+    [extracted] = run(capsys, 'extract', hidden['output'], '--password', PASSWORD, *legacy)
+    assert extracted['message'] == 'привет'
+
+
+def test_payload_file(capsys, tmp_path, cover, rng):
+    payload = tmp_path / 'payload.bin'
+    payload.write_bytes(rng.integers(0, 256, 2000, dtype=np.uint8).tobytes())
+    [hidden] = run(capsys, 'hide', cover, '--payload-file', payload, '--password', PASSWORD,
+                   '--channels', 'RGB', '--bits-per-channel', '2', '--output-dir', tmp_path / 'out')
+    [extracted] = run(capsys, 'extract', hidden['output'], '--password', PASSWORD, '--binary',
+                      '--output-dir', tmp_path / 'restored')
+    assert extracted['status'] == 'ok'
+    restored = list((tmp_path / 'restored').iterdir())
+    assert [path.read_bytes() for path in restored] == [payload.read_bytes()]
+
+
+def test_wrong_password_fails(capsys, tmp_path, cover):
+    [hidden] = run(capsys, 'hide', cover, '--message', 'x', '--password', PASSWORD,
+                   '--output-dir', tmp_path / 'out')
+    assert cli.main(['extract', hidden['output'], '--password', 'wrong', '--no-legacy']) == 1
+
+
+def test_capacity(capsys, cover):
+    [report] = run(capsys, 'capacity', cover, '--channels', 'RGB', '--bits-per-channel', '2')
+    assert report['bits_per_pixel'] == 6
+    assert report['capacity'] > 0
+
+
+@pytest.mark.parametrize('value', ['2,2', '0,1,1', 'a,b,c'])
+def test_pipeline_counts_validated(value):
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(['hide', '--pipeline', value])
+
+
+def test_closed_pipe_exits_cleanly(tmp_path, cover):
+    # Результатов больше буфера канала: запись упирается в закрытый канал
+    for index in range(400):
+        os.symlink(cover, tmp_path / f'copy{index}.png')
+    process = subprocess.Popen([sys.executable, str(ROOT / 'main.py'), 'capacity', str(tmp_path)],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert json.loads(process.stdout.readline())['status'] == 'ok'
+    process.stdout.close()  # Как head -1
+    stderr = process.stderr.read().decode()
+    process.stderr.close()
+    assert process.wait(timeout=60) == 1
+    assert 'Traceback' not in stderr
+
+
+def test_batch_commands_skip_server_imports(tmp_path, cover):
+    code = ('import sys, cli; cli.main(["capacity", sys.argv[1]]); '
+            'print(sorted(name for name in ("server", "pipeline") if name in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', code, str(cover)], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.splitlines()[-1] == '[]'
@@ -0,0 +1,65 @@
+"""
+Кэш ключей PBKDF2 и сессии шифрования
+"""
+
+import pytest
+
+from crypto_module import CryptoModule, KeyCache
+from tests.conftest import PASSWORD
+
+
+@pytest.fixture
+def crypto() -> CryptoModule:
+    crypto = CryptoModule()
+    crypto.iterations = 1000  # Формат данных не зависит от числа итераций
+    return crypto
+
+
+def test_zeroize_on_eviction_and_clear():
+    cache = KeyCache(max_entries=2)
+    cache.put(PASSWORD, b'salt-1', b'\x11' * 32)
+    first = next(iter(cache._entries.values()))
+    cache.put(PASSWORD, b'salt-2', b'\x22' * 32)
+    cache.put(PASSWORD, b'salt-3', b'\x33' * 32)
+    assert first == bytearray(32)  # Вытесненный ключ обнулен
+    assert cache.get(PASSWORD, b'salt-1') is None
+
+    kept = list(cache._entries.values())
+    cache.clear()
+    assert all(key == bytearray(32) for key in kept)
+    assert cache.stats()['entries'] == 0
+
+
+def test_returned_key_is_a_copy():
+    cache = KeyCache()
+    cache.put(PASSWORD, b'salt', b'\x42' * 32)
+    key = cache.get(PASSWORD, b'salt')
+    cache.clear()
+    assert key == b'\x42' * 32
+
+
+def test_same_salt_reuses_key(crypto):
+    cache = crypto.enable_key_cache()
+    session = crypto.session(PASSWORD)
+    messages = [session.encrypt(f'сообщение {index}') for index in range(3)]
+    assert cache.stats()['misses'] == 1  # Один PBKDF2 на сессию
+
+    # Все сообщения сессии используют одну соль: ключ берется из кэша
+    assert [crypto.decrypt(message, PASSWORD) for message in messages] == \
+        [f'сообщение {index}' for index in range(3)]
+    assert cache.stats() == {'entries': 1, 'hits': 3, 'misses': 1}
+
+    crypto.encrypt('other salt', PASSWORD)
+    assert cache.stats()['entries'] == 2
+
+
+def test_session_round_trip(crypto):
+    with crypto.session(PASSWORD) as session:
+        text = session.encrypt('привет')
+        binary = session.encrypt(b'\x00\xff')
+        assert text != session.encrypt('привет')  # Свежий nonce на каждое сообщение
+    assert crypto.decrypt(text, PASSWORD) == 'привет'
+    assert crypto.decrypt_bytes(binary, PASSWORD) == b'\x00\xff'
+    assert crypto.decrypt(text, 'wrong') is None
+    with pytest.raises(ValueError):
+        session.encrypt('closed')
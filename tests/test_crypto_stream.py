@@ -0,0 +1,107 @@
+"""
+Потоковое шифрование сегментами AES-256-GCM и обнаружение повреждений
+"""
+
+import io
+
+import numpy as np
+import pytest
+
+from crypto_module import CryptoModule
+from tests.conftest import PASSWORD
+
+CHUNK_SIZE = 64
+
+
+@pytest.fixture
+def crypto() -> CryptoModule:
+    return CryptoModule()
+
+
+@pytest.fixture
+def plaintext(rng) -> bytes:
+    # Четыре полных сегмента и неполный пятый
+    return rng.integers(0, 256, CHUNK_SIZE * 4 + 10, dtype=np.uint8).tobytes()
+
+
+@pytest.fixture
+def parts(crypto, plaintext) -> list:
+    """Заголовок потока и зашифрованные сегменты по отдельности"""
+    return list(crypto.iter_encrypt(io.BytesIO(plaintext), PASSWORD, chunk_size=CHUNK_SIZE))
+
+
+def decrypt(crypto: CryptoModule, parts: list, password: str = PASSWORD) -> bytes:
+    return b''.join(crypto.iter_decrypt([b''.join(parts)], password))
+
+
+@pytest.mark.parametrize('size', [0, 1, CHUNK_SIZE, CHUNK_SIZE * 3 + 1])
+def test_round_trip(crypto, rng, size):
+    data = rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+    # Границы блоков источника не совпадают с границами сегментов
+    source = [data[i:i + 37] for i in range(0, len(data), 37)]
+    encrypted = b''.join(crypto.iter_encrypt(source, PASSWORD, chunk_size=CHUNK_SIZE))
+    assert len(encrypted) == crypto.get_stream_encrypted_size(size, CHUNK_SIZE)
+    assert b''.join(crypto.iter_decrypt(io.BytesIO(encrypted), PASSWORD)) == data
+
+
+def test_session_stream(crypto, plaintext):
+    with crypto.session(PASSWORD) as session:
+        encrypted = list(session.iter_encrypt([plaintext], chunk_size=CHUNK_SIZE))
+    assert decrypt(crypto, encrypted) == plaintext
+
+
+def test_segment_layout(crypto, parts):
+    header, *segments = parts
+    assert len(header) == crypto.get_stream_header_size()
+    assert len(segments) == 5
+    assert all(len(segment) == CHUNK_SIZE + crypto.tag_size for segment in segments[:-1])
+
+
+def test_wrong_password(crypto, parts):
+    with pytest.raises(ValueError):
+        decrypt(crypto, parts, 'wrong')
+
+
+def test_flipped_bit(crypto, parts):
+    damaged = bytearray(parts[2])
+    damaged[5] ^= 0x01
+    with pytest.raises(ValueError):
+        decrypt(crypto, parts[:2] + [bytes(damaged)] + parts[3:])
+
+
+def test_reordered_segments(crypto, parts):
+    with pytest.raises(ValueError):
+        decrypt(crypto, [parts[0], parts[2], parts[1]] + parts[3:])
+
+
+def test_dropped_segment(crypto, parts):
+    with pytest.raises(ValueError):
+        decrypt(crypto, parts[:2] + parts[3:])
+
+
+def test_truncated_stream(crypto, parts):
+    # Без последнего сегмента предпоследний не помечен как последний
+    with pytest.raises(ValueError):
+        decrypt(crypto, parts[:-1])
+
+
+def test_damaged_header(crypto, parts):
+    with pytest.raises(ValueError):
+        decrypt(crypto, [b'\xff' + parts[0][1:]] + parts[1:])
+
+
+def test_authenticated_prefix_before_damage(crypto, parts, plaintext):
+    damaged = parts[:-1] + [parts[-1][:-1] + bytes([parts[-1][-1] ^ 1])]
+    stream = crypto.iter_decrypt([b''.join(damaged)], PASSWORD)
+    assert next(stream) == plaintext[:CHUNK_SIZE]
+    with pytest.raises(ValueError):
+        list(stream)
+
+
+@pytest.mark.parametrize('chunk_size', [0, -1])
+def test_chunk_size_validated(crypto, chunk_size):
+    with pytest.raises(ValueError):
+        crypto.iter_encrypt([b'data'], PASSWORD, chunk_size=chunk_size)
+    with crypto.session(PASSWORD) as session:
+        with pytest.raises(ValueError):
+            session.iter_encrypt([b'data'], chunk_size=chunk_size)
@@ -0,0 +1,63 @@
+"""
+Инструментирование: таймеры стадий, экспорт Prometheus и обработчики событий
+"""
+
+import logging
+
+from instrumentation import Instrumentation, log_hook
+from stego_engine import StegoEngine
+from tests.conftest import PASSWORD
+
+
+def test_engine_stage_timings(engine, carrier):
+    with engine.collect_stats() as stats:
+        stego = engine.embed(carrier.copy(), b'measured', PASSWORD)
+        assert engine.extract_data(stego, PASSWORD) == b'measured'
+    assert engine.instrumentation is None  # Сборщик отключается после блока
+
+    snapshot = stats.to_dict()
+    assert {'permutation', 'embed', 'extract', 'bit_pack'} <= set(snapshot['stages'])
+    for stage in snapshot['stages'].values():
+        assert stage['calls'] > 0
+        assert 0 <= stage['max_seconds'] <= stage['seconds']
+    assert snapshot['counters']['bytes_embedded'] >= len(b'measured')
+    assert snapshot['counters']['pixels_read'] > 0
+
+
+def test_disabled_by_default(carrier):
+    engine = StegoEngine()
+    engine.embed(carrier, b'quiet', PASSWORD)
+    assert engine.instrumentation is None
+
+
+def test_prometheus_text():
+    collector = Instrumentation()
+    collector.record('embed', 0.5)
+    collector.record('embed', 0.25)
+    collector.count('bytes_embedded', 42)
+    lines = collector.to_prometheus(prefix='test').splitlines()
+    assert '# TYPE test_stage_seconds_total counter' in lines
+    assert 'test_stage_seconds_total{stage="embed"} 0.750000' in lines
+    assert 'test_stage_calls_total{stage="embed"} 2' in lines
+    assert lines[-2:] == ['# TYPE test_bytes_embedded_total counter', 'test_bytes_embedded_total 42']
+    assert collector.to_dict()['stages']['embed']['max_seconds'] == 0.5
+
+    collector.reset()
+    assert collector.to_dict() == {'stages': {}, 'counters': {}}
+
+
+def test_hooks(carrier, caplog):
+    collector = Instrumentation()
+    events = []
+    collector.add_hook(lambda kind, name, value: events.append((kind, name, value)))
+    collector.add_hook(log_hook(level=logging.INFO))
+
+    engine = StegoEngine()
+    engine.enable_instrumentation(collector)
+    with caplog.at_level(logging.INFO, logger='stegoghost.engine'):
+        engine.embed(carrier, b'hooked', PASSWORD)
+
+    assert ('counter', 'bytes_embedded', len(b'hooked')) in events
+    timers = [name for kind, name, _ in events if kind == 'timer']
+    assert timers.count('embed') == collector.to_dict()['stages']['embed']['calls']
+    assert any('counter bytes_embedded' in message for message in caplog.messages)
@@ -0,0 +1,48 @@
+"""
+Несжатые носители (BMP, PPM, NPY), отображаемые в память
+"""
+
+import numpy as np
+import pytest
+
+from stego_engine import StegoEngine
+from stego_image import open_memmap
+from tests.conftest import PASSWORD
+
+
+def test_pixels_match_decoder(memmap_path, carrier):
+    image = open_memmap(memmap_path)
+    assert image is not None
+    assert np.array_equal(np.asarray(image.to_pil()), carrier)
+
+
+def test_embed_in_place(engine, memmap_path, carrier):
+    engine.embed_in_place(str(memmap_path), b'mapped payload', PASSWORD)
+
+    reader = StegoEngine()
+    with reader.collect_stats() as stats:
+        assert reader.extract_data(memmap_path, PASSWORD) == b'mapped payload'
+    assert stats.counters['images_mapped'] == 1
+    assert b''.join(reader.iter_extract(memmap_path, PASSWORD)) == b'mapped payload'
+    # Запись на месте совпадает с обычным внедрением
+    expected = np.asarray(engine.embed_data(carrier, b'mapped payload', PASSWORD))
+    assert np.array_equal(np.asarray(open_memmap(memmap_path).to_pil()), expected)
+
+
+def test_over_capacity_leaves_file(engine, memmap_path, carrier):
+    before = memmap_path.read_bytes()
+    with pytest.raises(ValueError):
+        engine.embed_in_place(str(memmap_path), bytes(carrier.shape[0] * carrier.shape[1]), PASSWORD)
+    assert memmap_path.read_bytes() == before
+
+
+def test_embed_data_keeps_file(engine, memmap_path):
+    before = memmap_path.read_bytes()
+    stego = engine.embed_data(memmap_path, b'copy on write', PASSWORD)
+    assert memmap_path.read_bytes() == before
+    assert StegoEngine().extract_data(stego, PASSWORD) == b'copy on write'
+
+
+def test_capacity_from_header(memmap_path, carrier):
+    report = StegoEngine().analyze_capacity(memmap_path)
+    assert (report.height, report.width) == carrier.shape[:2]
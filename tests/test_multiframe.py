@@ -0,0 +1,73 @@
+"""
+Многокадровые носители: шарды по кадрам, частичное извлечение, контейнеры
+"""
+
+import numpy as np
+import pytest
+
+from multiframe import FrameCarrier, MultiFrameEngine
+from stego_engine import FORMAT_LEGACY
+from tests.conftest import PASSWORD, make_carrier, make_engine
+
+FRAME_COUNT = 4
+
+
+def make_frames(container: str = 'apng') -> FrameCarrier:
+    # Кадры различаются: APNG объединяет одинаковые соседние кадры
+    return FrameCarrier.from_images([make_carrier(60, 80) ^ np.uint8(index + 1)
+                                     for index in range(FRAME_COUNT)], container)
+
+
+@pytest.fixture
+def frames(engine) -> MultiFrameEngine:
+    if engine.format_version == FORMAT_LEGACY:
+        pytest.skip("многокадровые носители не поддерживают формат 1")
+    return MultiFrameEngine(engine, workers=2)
+
+
+@pytest.fixture
+def payload(frames, rng) -> bytes:
+    # Почти вся вместимость: данные попадают во все кадры
+    return rng.integers(0, 256, frames.capacity(make_frames()) - 3, dtype=np.uint8).tobytes()
+
+
+def test_legacy_rejected():
+    with pytest.raises(ValueError):
+        MultiFrameEngine(make_engine(FORMAT_LEGACY))
+
+
+def test_round_trip(frames, payload):
+    carrier = make_frames()
+    index = frames.embed(carrier, payload, PASSWORD)
+    assert index.total_length == len(payload)
+    assert all(length > 0 for length in index.lengths)
+    assert frames.extract(carrier, PASSWORD) == payload
+    assert frames.extract(carrier, 'wrong') is None
+
+
+def test_extract_range(frames, payload):
+    carrier = make_frames()
+    index = frames.embed(carrier, payload, PASSWORD)
+    boundary = index.lengths[0]
+    for offset, length in [(0, 10), (boundary - 5, 10), (100, len(payload) - 200), (len(payload) - 1, 1)]:
+        assert frames.extract_range(carrier, PASSWORD, offset, length) == payload[offset:offset + length]
+    assert frames.extract_shard(carrier, PASSWORD, 1) == payload[boundary:boundary + index.lengths[1]]
+
+
+def test_oversized_payload(frames):
+    carrier = make_frames()
+    with pytest.raises(ValueError):
+        frames.embed(carrier, bytes(frames.capacity(carrier) + 1), PASSWORD)
+
+
+@pytest.mark.parametrize('container, name', [('apng', 'clip.png'), ('tiff', 'clip.tiff'),
+                                             ('webp', 'clip.webp'), ('frames', 'clip')])
+def test_container_round_trip(frames, payload, tmp_path, container, name):
+    carrier = make_frames(container)
+    frames.embed(carrier, payload, PASSWORD)
+    carrier.save(tmp_path / name, frames.engine)
+
+    reopened = FrameCarrier.open(tmp_path / name)
+    assert len(reopened) == FRAME_COUNT
+    assert frames.extract_range(reopened, PASSWORD, 0, 16) == payload[:16]
+    assert frames.extract(reopened, PASSWORD) == payload
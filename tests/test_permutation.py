@@ -0,0 +1,64 @@
+"""
+Ключевые перестановки: биективность сети Фейстеля с cycle-walking и отрезки перестановок
+"""
+
+import hashlib
+
+import numpy as np
+import pytest
+
+from permutation import FeistelPermutation, LegacyPermutation, PixelStream
+
+KEY = hashlib.sha256(b'permutation key').digest()
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 17, 100, 257, 1000, 4097, 65536, 70001])
+def test_feistel_is_bijection(size):
+    permutation = FeistelPermutation(KEY, size)
+    indices = permutation.take(0, size)
+    assert indices.dtype == np.uint32
+    assert np.array_equal(np.sort(indices), np.arange(size))
+
+
+@pytest.mark.parametrize('size', [5, 100, 4097])
+def test_cycle_walking_used(size):
+    # Домен сети - четная степень двойки; для этих размеров часть значений выходит за size
+    permutation = FeistelPermutation(KEY, size)
+    domain = int(permutation.half_mask + np.uint64(1)) ** 2
+    assert domain > size
+    single_pass = permutation._encrypt(np.arange(size, dtype=np.uint64))
+    assert (single_pass >= size).any()
+    assert (permutation.permute(np.arange(size, dtype=np.uint64)) < size).all()
+
+
+def test_key_changes_order():
+    first = FeistelPermutation(KEY, 1000).take(0, 1000)
+    second = FeistelPermutation(hashlib.sha256(b'other key').digest(), 1000).take(0, 1000)
+    assert not np.array_equal(first, second)
+
+
+@pytest.mark.parametrize('permutation', [FeistelPermutation(KEY, 3001), LegacyPermutation(1234, 3001)],
+                         ids=['feistel', 'legacy'])
+def test_slices_match_prefix(permutation):
+    full = permutation.take(0, permutation.size)
+    for offset, count in [(0, 1), (17, 100), (2999, 2), (1000, 0)]:
+        assert np.array_equal(permutation.take(offset, count), full[offset:offset + count])
+    stream = PixelStream(permutation)
+    assert np.array_equal(np.concatenate([stream.next(40), stream.next(60)]), full[:100])
+    assert stream.remaining == permutation.size - 100
+    with pytest.raises(ValueError):
+        permutation.take(permutation.size - 1, 2)
+
+
+def test_feistel_blocks_match(monkeypatch):
+    permutation = FeistelPermutation(KEY, 10000)
+    expected = permutation.take(123, 5000)
+    monkeypatch.setattr(FeistelPermutation, 'BLOCK', 64)
+    assert np.array_equal(permutation.take(123, 5000), expected)
+
+
+def test_legacy_matches_random_state():
+    # Формат 1 хранится на диске: порядок должен совпадать с исходным перемешиванием
+    expected = np.arange(500)
+    np.random.RandomState(42).shuffle(expected)
+    assert np.array_equal(LegacyPermutation(42, 500).take(0, 500), expected)
@@ -0,0 +1,72 @@
+"""
+Кэш перестановок: вытеснение LRU, бюджет памяти, статистика и передача в процессы пакета
+"""
+
+import numpy as np
+
+from batch import BatchProcessor, _Worker
+from permutation import PermutationCache
+from stego_engine import StegoEngine
+from tests.conftest import PASSWORD
+
+
+def entry(value: int) -> np.ndarray:
+    return np.full(10, value, dtype=np.uint32)  # 40 байт
+
+
+def test_lru_eviction():
+    cache = PermutationCache(max_bytes=120)
+    for name in 'abc':
+        cache.put((name,), entry(ord(name)))
+    assert cache.get(('a',), 10) is not None  # 'a' становится самой свежей
+    cache.put(('d',), entry(0))
+    assert cache.peek(('b',)) is None
+    assert all(cache.peek((name,)) is not None for name in 'acd')
+    assert cache.stats()['evictions'] == 1
+
+
+def test_byte_budget():
+    cache = PermutationCache(max_bytes=100)
+    for value in range(5):
+        cache.put((value,), entry(value))
+        assert cache.stats()['bytes'] <= 100
+    assert cache.stats()['entries'] == 2
+    # Массив больше всего бюджета не кэшируется и не вытесняет остальные
+    cache.put(('big',), np.zeros(100, dtype=np.uint32))
+    assert cache.peek(('big',)) is None
+    assert cache.stats()['entries'] == 2
+
+
+def test_hit_miss_counters():
+    cache = PermutationCache()
+    assert cache.get(('key',), 10) is None
+    cache.put(('key',), entry(1))
+    assert cache.get(('key',), 5) is not None
+    assert cache.get(('key',), 11) is None  # Префикс короче запрошенного - промах
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+    cache.clear()
+    assert cache.stats()['entries'] == 0 and cache.stats()['hits'] == 1
+
+
+def test_cached_output_matches(engine, carrier):
+    cached = StegoEngine()
+    for name in ('format_version', 'tile_size'):
+        setattr(cached, name, getattr(engine, name))
+    cache = cached.enable_permutation_cache(1024 * 1024)
+
+    for data in (b'short', bytes(range(150))):
+        expected = engine.embed(carrier.copy(), data, PASSWORD).pixels
+        assert np.array_equal(cached.embed(carrier.copy(), data, PASSWORD).pixels, expected)
+        assert cached.extract_data(expected, PASSWORD) == data
+    assert cache.stats()['hits'] > 0
+
+
+def test_batch_workers_get_cache():
+    engine = StegoEngine()
+    engine.enable_permutation_cache(4096)
+    processor = BatchProcessor(PASSWORD, engine=engine)
+    assert processor.cache_bytes == 4096
+    worker = _Worker(PASSWORD, processor.engine_settings, processor.cache_bytes)
+    assert worker.engine.permutation_cache.max_bytes == 4096
+    assert _Worker(PASSWORD, processor.engine_settings).engine.permutation_cache is None
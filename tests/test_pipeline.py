@@ -0,0 +1,60 @@
+"""
+Конвейер чтение -> обработка -> запись на потоках
+"""
+
+import pytest
+from PIL import Image
+
+from batch import BatchJob
+from pipeline import PipelineProcessor
+from tests.conftest import PASSWORD, make_carrier
+
+IMAGE_COUNT = 8
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for index in range(IMAGE_COUNT):
+        path = tmp_path / f'image{index}.png'
+        # Разные размеры: задачи завершаются не в порядке поступления
+        Image.fromarray(make_carrier(30 + 10 * (index % 3), 50)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def make_processor(ordered: bool = True) -> PipelineProcessor:
+    return PipelineProcessor(PASSWORD, read_threads=2, process_threads=2, write_threads=2, ordered=ordered)
+
+
+def test_round_trip_in_order(tmp_path, images):
+    processor = make_processor()
+    hide_jobs = [BatchJob('hide', path, message=f'message {index}', output_path=str(tmp_path / f'out{index}.png'))
+                 for index, path in enumerate(images)]
+    hidden = list(processor.run(hide_jobs))
+    assert [result.job for result in hidden] == hide_jobs
+    assert all(result.ok for result in hidden)
+    stats = processor.stats()
+    assert all(stats[stage]['items'] == IMAGE_COUNT for stage in PipelineProcessor.STAGES)
+
+    extracted = list(make_processor(ordered=False).run(
+        BatchJob('extract', result.data['output']) for result in hidden))
+    assert sorted(result.data['message'] for result in extracted) == \
+        sorted(f'message {index}' for index in range(IMAGE_COUNT))
+
+
+def test_failing_stages(tmp_path, images):
+    broken = tmp_path / 'broken.png'
+    broken.write_bytes(b'not an image')
+    jobs = [
+        BatchJob('hide', images[0], message='ok', output_path=str(tmp_path / 'ok.png')),
+        BatchJob('hide', str(broken), message='read fails', output_path=str(tmp_path / 'broken-out.png')),
+        BatchJob('hide', images[1], message='x' * 10000, output_path=str(tmp_path / 'big.png')),
+        BatchJob('hide', images[2], message='write fails', output_path=str(tmp_path / 'missing' / 'out.png')),
+        BatchJob('extract', images[3]),
+        BatchJob('hide', images[4], message='ok', output_path=str(tmp_path / 'ok2.png')),
+    ]
+    results = list(make_processor().run(jobs))
+    assert [result.job for result in results] == jobs
+    assert [result.status for result in results] == ['ok', 'error', 'error', 'error', 'not_found', 'ok']
+    assert all(result.error for result in results if result.status == 'error')
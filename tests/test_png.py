@@ -0,0 +1,42 @@
+"""
+Сохранение результата в PNG: профили и стратегии сжатия без потерь
+"""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from stego_engine import PNG_PRESETS, PNG_STRATEGIES, StegoEngine
+from tests.conftest import PASSWORD
+
+
+def save(engine: StegoEngine, image) -> bytes:
+    output = io.BytesIO()
+    engine.save_png(image, output)
+    return output.getvalue()
+
+
+def test_png_round_trip(engine, carrier):
+    encoded = save(engine, engine.embed(carrier, b'through png', PASSWORD))
+    assert StegoEngine().extract_data(Image.open(io.BytesIO(encoded)), PASSWORD) == b'through png'
+
+
+def test_settings_keep_pixels(carrier):
+    engine = StegoEngine()
+    stego = engine.embed(carrier, b'lossless', PASSWORD)
+    sizes = {}
+    for preset in PNG_PRESETS:
+        engine.set_png_preset(preset)
+        for strategy, compress_type in PNG_STRATEGIES.items():
+            engine.png_compress_type = compress_type
+            encoded = save(engine, stego)
+            sizes[preset, strategy] = len(encoded)
+            assert np.array_equal(np.asarray(Image.open(io.BytesIO(encoded))), stego.pixels)
+    assert len(set(sizes.values())) > 1  # Настройки действительно влияют на сжатие
+
+
+def test_unknown_preset():
+    with pytest.raises(ValueError):
+        StegoEngine().set_png_preset('fastest')
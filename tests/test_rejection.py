@@ -0,0 +1,36 @@
+"""
+Быстрый отказ: неверный пароль и изображение без данных
+"""
+
+import pytest
+
+from stego_engine import FORMAT_LEGACY, StegoEngine
+from tests.conftest import PASSWORD
+
+
+def test_wrong_password(engine, carrier):
+    stego = engine.embed_data(carrier, b'secret payload', PASSWORD)
+    assert StegoEngine().extract_data(stego, 'wrong') != b'secret payload'
+    if engine.format_version != FORMAT_LEGACY:
+        # Контрольное значение (форматы 3, 4) или неверная длина отбрасывают чужой заголовок
+        reader = StegoEngine()
+        reader.legacy_fallback = False
+        assert reader.extract_data(stego, 'wrong') is None
+
+
+def test_clean_image_has_no_payload(carrier):
+    reader = StegoEngine()
+    reader.legacy_fallback = False
+    assert reader.extract_data(carrier, PASSWORD) is None
+
+
+@pytest.mark.parametrize('marked', [True, False], ids=['wrong-password', 'clean'])
+def test_rejection_reads_header_only(carrier, marked):
+    image = StegoEngine().embed(carrier, bytes(500), PASSWORD) if marked else carrier
+    reader = StegoEngine()
+    reader.legacy_fallback = False
+    with reader.collect_stats() as stats:
+        assert reader.extract_data(image, 'wrong') is None
+    # Прочитаны только заголовки: версия формата 4 (8 бит), версия и контрольное
+    # значение формата 3 (40 бит), но не данные
+    assert stats.counters.get('pixels_read', 0) <= 48
@@ -0,0 +1,174 @@
+"""
+HTTP-сервис: круговая проверка hide/extract и коды ошибок
+"""
+
+import http.client
+import io
+import json
+import socket
+import threading
+import time
+import uuid
+
+import pytest
+from PIL import Image
+
+from server import StegoHTTPServer, StegoService
+from stego_engine import StegoEngine
+from tests.conftest import PASSWORD, make_carrier
+
+MAX_BODY_SIZE = 256 * 1024
+
+
+@pytest.fixture
+def service():
+    service = StegoService(workers=2, max_body_size=MAX_BODY_SIZE, max_queue=2, cache_bytes=1024 * 1024)
+    server = StegoHTTPServer(('127.0.0.1', 0), service, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    service.port = server.server_address[1]
+    yield service
+    server.shutdown()
+    server.server_close()
+    service.pool.shutdown()
+
+
+def png_bytes() -> bytes:
+    output = io.BytesIO()
+    Image.fromarray(make_carrier()).save(output, 'PNG')
+    return output.getvalue()
+
+
+def multipart(fields: dict) -> tuple:
+    """Тело multipart/form-data: значения bytes передаются как файлы"""
+    boundary = uuid.uuid4().hex
+    body = b''
+    for name, value in fields.items():
+        disposition = f'form-data; name="{name}"'
+        if isinstance(value, bytes):
+            disposition += f'; filename="{name}.png"'
+        else:
+            value = str(value).encode()
+        body += (f'--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n').encode() + value + b'\r\n'
+    body += f'--{boundary}--\r\n'.encode()
+    return f'multipart/form-data; boundary={boundary}', body
+
+
+def post(service, path: str, fields: dict) -> tuple:
+    content_type, body = multipart(fields)
+    connection = http.client.HTTPConnection('127.0.0.1', service.port, timeout=30)
+    try:
+        connection.request('POST', path, body, {'Content-Type': content_type})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def get(service, path: str) -> str:
+    connection = http.client.HTTPConnection('127.0.0.1', service.port, timeout=10)
+    try:
+        connection.request('GET', path)
+        return connection.getresponse().read().decode()
+    finally:
+        connection.close()
+
+
+def raw_post(service, headers: str) -> int:
+    """Отправляет только заголовки запроса и возвращает статус ответа"""
+    with socket.create_connection(('127.0.0.1', service.port), timeout=10) as sock:
+        sock.sendall(f'POST /hide HTTP/1.1\r\nHost: test\r\n{headers}\r\n'.encode())
+        response = b''
+        while b'\r\n' not in response:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            response += chunk
+    return int(response.split(b' ', 2)[1])
+
+
+def test_hide_and_extract(service):
+    status, image = post(service, '/hide', {'image': png_bytes(), 'password': PASSWORD,
+                                            'message': 'привет', 'format': 4, 'tile_size': 32})
+    assert status == 200
+    status, body = post(service, '/extract', {'image': image, 'password': PASSWORD})
+    assert status == 200
+    assert json.loads(body)['message'] == 'привет'
+    status, _ = post(service, '/extract', {'image': image, 'password': 'wrong', 'legacy': 'false'})
+    assert status == 404
+
+
+def test_legacy_opt_in(service):
+    status, image = post(service, '/hide', {'image': png_bytes(), 'password': PASSWORD,
+                                            'message': 'old', 'format': 1})
+    assert status == 200
+    assert post(service, '/extract', {'image': image, 'password': PASSWORD})[0] == 404
+    status, body = post(service, '/extract', {'image': image, 'password': PASSWORD, 'legacy': 'true'})
+    assert status == 200
+    assert json.loads(body)['message'] == 'old'
+
+
+def test_capacity(service):
+    status, body = post(service, '/capacity', {'image': png_bytes(), 'channels': 'RGB'})
+    assert status == 200
+    assert json.loads(body)['bits_per_pixel'] == 3
+
+
+@pytest.mark.parametrize('fields', [
+    {'password': PASSWORD, 'message': 'no image'},
+    {'image': b'not an image', 'password': PASSWORD, 'message': 'x'},
+    {'image': png_bytes(), 'password': PASSWORD, 'message': 'x', 'channels': 'RX'},
+    {'image': png_bytes(), 'password': PASSWORD, 'message': 'x', 'format': 9},
+    {'image': png_bytes(), 'password': PASSWORD, 'message': 'x', 'tile_size': 2},
+    {'image': png_bytes(), 'password': PASSWORD, 'message': 'x', 'format': 1, 'channels': 'RGB'},
+    {'image': png_bytes()[:len(png_bytes()) // 2], 'password': PASSWORD, 'message': 'x'},
+], ids=['missing-image', 'not-image', 'bad-channels', 'bad-format', 'bad-tile-size',
+        'legacy-layout', 'truncated-png'])
+def test_bad_request(service, fields):
+    assert post(service, '/hide', fields)[0] == 400
+
+
+def test_length_required(service):
+    assert raw_post(service, '') == 411
+
+
+@pytest.mark.parametrize('length', ['-1', 'abc'])
+def test_invalid_content_length(service, length):
+    assert raw_post(service, f'Content-Length: {length}\r\n') == 400
+
+
+def test_body_too_large(service):
+    # Тело не отправляется: сервис отвечает по заголовку, не читая его
+    assert raw_post(service, f'Content-Length: {MAX_BODY_SIZE + 1}\r\n') == 413
+
+
+def test_queue_full(service):
+    for _ in range(service.max_queue):
+        service._queued.acquire()
+    try:
+        assert post(service, '/capacity', {'image': png_bytes()})[0] == 503
+    finally:
+        for _ in range(service.max_queue):
+            service._queued.release()
+    assert post(service, '/capacity', {'image': png_bytes()})[0] == 200
+
+
+def test_unknown_path_and_metrics(service):
+    assert post(service, '/nope', {})[0] == 404
+    # Метрика записывается после отправки ответа
+    deadline = time.monotonic() + 5
+    while 'path="other"' not in get(service, '/metrics'):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert json.loads(get(service, '/health')) == {'status': 'ok'}
+
+
+def test_caller_engine_untouched():
+    engine = StegoEngine()
+    service = StegoService(engine, workers=1, cache_bytes=1024)
+    try:
+        assert engine.permutation_cache is None
+        assert service.make_engine({}).permutation_cache is service.permutation_cache
+        assert service.permutation_cache.max_bytes == 1024
+    finally:
+        service.pool.shutdown()
@@ -0,0 +1,44 @@
+"""
+Потоковое внедрение и извлечение данных произвольного размера
+"""
+
+import io
+
+import numpy as np
+import pytest
+
+from crypto_module import CryptoModule
+from stego_engine import FORMAT_LEGACY, StegoEngine
+from tests.conftest import PASSWORD
+
+
+def test_stream_matches_embed(engine, carrier, rng):
+    if engine.format_version == FORMAT_LEGACY:
+        with pytest.raises(ValueError):
+            engine.embed_stream(carrier, [b'data'], PASSWORD)
+        return
+    data = rng.integers(0, 256, 1000, dtype=np.uint8).tobytes()
+    chunks = [data[i:i + 77] for i in range(0, len(data), 77)]
+    streamed = engine.embed_stream(carrier.copy(), chunks, PASSWORD, chunk_size=64)
+    assert np.array_equal(np.asarray(streamed), np.asarray(engine.embed_data(carrier, data, PASSWORD)))
+    assert b''.join(StegoEngine().iter_extract(streamed, PASSWORD, chunk_size=64)) == data
+
+
+def test_encrypted_stream_round_trip(carrier, rng):
+    engine = StegoEngine()
+    engine.channels = 'RGB'
+    engine.bits_per_channel = 2
+    crypto = CryptoModule()
+    crypto.iterations = 1000
+    payload = rng.integers(0, 256, 5000, dtype=np.uint8).tobytes()
+
+    stego = engine.embed_stream(carrier, crypto.iter_encrypt(io.BytesIO(payload), PASSWORD, 256), PASSWORD)
+    restored = crypto.iter_decrypt(StegoEngine().iter_extract(stego, PASSWORD, chunk_size=300), PASSWORD)
+    assert b''.join(restored) == payload
+
+
+def test_chunk_size_validated(engine, carrier):
+    with pytest.raises(ValueError):
+        engine.embed_stream(carrier, [b'data'], PASSWORD, chunk_size=0)
+    with pytest.raises(ValueError):
+        next(StegoEngine().iter_extract(carrier, PASSWORD, chunk_size=-1))
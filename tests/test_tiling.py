@@ -0,0 +1,132 @@
+"""
+Плиточная схема (формат 4): разбиение, раскладка данных, параллельная обработка
+"""
+
+import hashlib
+
+import numpy as np
+import pytest
+
+from stego_engine import FORMAT_TILED, StegoEngine
+from stego_image import StegoImage
+from tiling import (
+    HEADER_REGION_SIZE, HeaderRegion, TileGrid, check_tile_size, plan_segments, segment_indices, tile_permutation
+)
+from tests.conftest import PASSWORD, TEST_TILE_SIZE, make_carrier, make_engine
+
+
+def test_grid_edges():
+    grid = TileGrid(130, 90, 32)
+    assert (grid.columns, grid.rows, grid.count) == (5, 3, 15)
+    assert grid.bounds(4) == (128, 0, 2, 32)
+    assert grid.bounds(14) == (128, 64, 2, 26)
+    assert sum(grid.pixel_count(tile) for tile in range(grid.count)) == 130 * 90
+    assert grid.tile_of(np.array([0, 129, 130 * 32, 130 * 90 - 1])).tolist() == [0, 4, 5, 14]
+
+
+@pytest.mark.parametrize('tile_size', [0, HEADER_REGION_SIZE - 1, 0x10000])
+def test_tile_size_validated(tile_size):
+    with pytest.raises(ValueError):
+        check_tile_size(tile_size)
+
+
+def test_segments_cover_tiles():
+    grid = TileGrid(130, 90, 32)
+    seed_hash = hashlib.sha256(b'seed').digest()
+    reserved = np.array([5, 40 * 130 + 3, 130 + 3])
+    segments = plan_segments(grid, reserved, 32 * 32 * 3 * 2 + 100, 3)
+
+    assert [segment.tile for segment in segments] == [0, 1, 2]
+    assert segments[0].pixel_count == 32 * 32 - 2  # Два пикселя заголовка в плитке 0
+    seen = set()
+    for segment in segments:
+        indices = segment_indices(grid, tile_permutation(seed_hash, grid, segment.tile), segment)
+        assert len(indices) == segment.pixel_count
+        assert set(grid.tile_of(indices).tolist()) == {segment.tile}
+        assert not np.isin(indices, reserved).any()
+        seen.update(indices.tolist())
+    assert len(seen) == sum(segment.pixel_count for segment in segments)
+
+    with pytest.raises(ValueError):
+        plan_segments(grid, reserved, (130 * 90 - len(reserved)) * 3 + 1, 3)
+
+
+@pytest.mark.parametrize('size', [(130, 90), (10, 40), (300, 12)])
+def test_header_region_in_first_tile(size):
+    width, height = size
+    region = HeaderRegion(hashlib.sha256(b'seed').digest(), width, height)
+    indices = region.take(0, region.size)
+    assert len(np.unique(indices)) == region.size == min(width, 16) * min(height, 16)
+    for tile_size in (16, 32, 256):
+        assert (TileGrid(width, height, tile_size).tile_of(indices) == 0).all()
+
+
+def test_small_payload_stays_in_first_tile():
+    engine = make_engine(FORMAT_TILED)
+    carrier = make_carrier()
+    stego = np.asarray(engine.embed(carrier.copy(), b'tiny', PASSWORD).pixels)
+    changed = np.flatnonzero((stego != carrier).any(axis=2).reshape(-1))
+    assert len(changed)
+    # Заголовок и данные - в плитке 0
+    assert (TileGrid(130, 90, TEST_TILE_SIZE).tile_of(changed) == 0).all()
+
+
+def test_partial_decode_from_first_tile(rng):
+    engine = make_engine(FORMAT_TILED)
+    carrier = make_carrier()
+    stego = np.asarray(engine.embed(carrier, b'corner only', PASSWORD).pixels).copy()
+    # Остальные плитки не читаются: их содержимое не влияет на извлечение
+    stego[:, TEST_TILE_SIZE:] = rng.integers(0, 256, stego[:, TEST_TILE_SIZE:].shape, dtype=np.uint8)
+    stego[TEST_TILE_SIZE:] = rng.integers(0, 256, stego[TEST_TILE_SIZE:].shape, dtype=np.uint8)
+    assert StegoEngine().extract_data(stego, PASSWORD) == b'corner only'
+
+
+def test_too_small_for_header():
+    engine = make_engine(FORMAT_TILED)
+    carrier = make_carrier(5, 16)  # 80 пикселей области заголовка меньше 96 бит заголовка
+    image = carrier.copy()
+    with pytest.raises(ValueError):
+        engine.embed_into(image, b'x', PASSWORD)
+    assert np.array_equal(image, carrier)
+
+
+@pytest.mark.parametrize('layout', [(1, 'R'), (3, 'RGBA')])
+def test_output_independent_of_workers(layout, rng):
+    carrier = make_carrier(channels=4)
+    engine = make_engine(FORMAT_TILED, *layout)
+    data = rng.integers(0, 256, 1200, dtype=np.uint8).tobytes()
+    serial = engine.embed(carrier.copy(), data, PASSWORD).pixels
+    engine.tile_workers = 4
+    parallel = engine.embed(carrier.copy(), data, PASSWORD).pixels
+    assert np.array_equal(serial, parallel)
+
+    reader = StegoEngine()
+    reader.tile_workers = 4
+    assert reader.extract_data(parallel, PASSWORD) == data
+    assert b''.join(reader.iter_extract(parallel, PASSWORD)) == data
+
+
+def test_tile_permutations_cached(rng):
+    carrier = make_carrier()
+    data = rng.integers(0, 256, 1000, dtype=np.uint8).tobytes()
+    engine = make_engine(FORMAT_TILED)
+    expected = engine.embed(carrier.copy(), data, PASSWORD).pixels
+
+    cache = engine.enable_permutation_cache(1024 * 1024)
+    engine.tile_workers = 2
+    assert np.array_equal(engine.embed(carrier.copy(), data, PASSWORD).pixels, expected)
+    tiles = cache.stats()['entries']
+    assert tiles > 1 and cache.stats()['hits'] == 0
+    assert engine.extract_data(StegoImage(expected), PASSWORD) == data
+    assert cache.stats()['hits'] == tiles
+
+
+def test_header_records_tile_size():
+    carrier = make_carrier()
+    writer = make_engine(FORMAT_TILED)
+    writer.tile_size = 48
+    stego = writer.embed(carrier, bytes(1200), PASSWORD)
+    # Читатель с другим размером плитки берет размер из заголовка
+    reader = StegoEngine()
+    reader.tile_size = 16
+    assert reader.extract_data(stego, PASSWORD) == bytes(1200)
@@ -0,0 +1,167 @@
+"""
+Плиточная схема размещения StegoGhost (формат 4)
+Изображение делится на плитки, у каждой - своя ключевая перестановка
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+from permutation import FeistelPermutation, index_dtype
+
+# Допустимые размеры стороны плитки (размер хранится в заголовке как uint16)
+MIN_TILE_SIZE = 16
+MAX_TILE_SIZE = 0xFFFF
+
+# Сторона области заголовка в левом верхнем углу. Не больше минимальной
+# плитки, поэтому заголовок при любом размере плитки лежит в плитке 0
+HEADER_REGION_SIZE = MIN_TILE_SIZE
+
+
+def check_tile_size(tile_size: int):
+    """Проверяет размер стороны плитки"""
+    if not MIN_TILE_SIZE <= tile_size <= MAX_TILE_SIZE:
+        raise ValueError(f"Размер плитки должен быть от {MIN_TILE_SIZE} до {MAX_TILE_SIZE}: {tile_size}")
+
+
+def tile_key(seed_hash: bytes, tile: int) -> bytes:
+    """Ключ перестановки плитки: выводится из хеша seed и номера плитки"""
+    return hashlib.sha256(seed_hash + b'tile' + tile.to_bytes(4, 'big')).digest()
+
+
+def tile_permutation(seed_hash: bytes, grid: 'TileGrid', tile: int) -> FeistelPermutation:
+    """Перестановка пикселей плитки (локальные индексы внутри плитки)"""
+    return FeistelPermutation(tile_key(seed_hash, tile), grid.pixel_count(tile))
+
+
+class TileGrid:
+    """
+    Разбиение изображения width x height на плитки tile_size x tile_size
+
+    Плитки нумеруются по строкам слева направо; крайние плитки справа
+    и снизу могут быть меньше.
+    """
+
+    def __init__(self, width: int, height: int, tile_size: int):
+        check_tile_size(tile_size)
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.columns = -(-width // tile_size)
+        self.rows = -(-height // tile_size)
+
+    @property
+    def count(self) -> int:
+        return self.columns * self.rows
+
+    def bounds(self, tile: int) -> Tuple[int, int, int, int]:
+        """Возвращает (x, y, ширина, высота) плитки"""
+        x = tile % self.columns * self.tile_size
+        y = tile // self.columns * self.tile_size
+        return x, y, min(self.tile_size, self.width - x), min(self.tile_size, self.height - y)
+
+    def pixel_count(self, tile: int) -> int:
+        _, _, tile_width, tile_height = self.bounds(tile)
+        return tile_width * tile_height
+
+    def tile_of(self, indices: np.ndarray) -> np.ndarray:
+        """Номера плиток для плоских индексов пикселей изображения"""
+        indices = np.asarray(indices, dtype=np.int64)
+        return indices // self.width // self.tile_size * self.columns + indices % self.width // self.tile_size
+
+    def to_global(self, tile: int, local: np.ndarray) -> np.ndarray:
+        """Переводит индексы пикселей внутри плитки в плоские индексы изображения"""
+        x, y, tile_width, _ = self.bounds(tile)
+        local = local.astype(index_dtype(self.width * self.height), copy=False)
+        return (local // tile_width + y) * self.width + local % tile_width + x
+
+
+class HeaderRegion:
+    """
+    Перестановка пикселей области заголовка формата 4
+
+    Область - квадрат HEADER_REGION_SIZE в левом верхнем углу (обрезанный
+    по размеру изображения). Она не зависит от размера плитки, который
+    читатель узнает только из самого заголовка, и лежит в плитке 0:
+    заголовок и начало данных читаются из одного угла изображения.
+    """
+
+    lazy = True
+
+    def __init__(self, seed_hash: bytes, width: int, height: int):
+        """
+        Args:
+            seed_hash: Хеш seed
+            width: Ширина изображения
+            height: Высота изображения
+        """
+        self._grid = TileGrid(width, height, HEADER_REGION_SIZE)
+        self.size = self._grid.pixel_count(0)
+        self._permutation = FeistelPermutation(hashlib.sha256(seed_hash + b'header').digest(), self.size)
+
+    def take(self, offset: int, count: int) -> np.ndarray:
+        """Плоские индексы изображения для позиций [offset, offset + count) области"""
+        return self._grid.to_global(0, self._permutation.take(offset, count))
+
+
+@dataclass
+class TileSegment:
+    """Часть данных, которая приходится на одну плитку"""
+    tile: int
+    bit_offset: int  # Смещение части в битах данных
+    bit_count: int
+    pixel_count: int  # Пикселей плитки под эту часть
+    reserved: np.ndarray  # Пиксели заголовка внутри плитки (плоские индексы)
+
+
+def plan_segments(grid: TileGrid, reserved: np.ndarray, bit_count: int,
+                  bits_per_pixel: int) -> List[TileSegment]:
+    """
+    Раскладывает bit_count бит данных по плиткам в порядке номеров
+
+    Каждая плитка заполняется целиком, прежде чем данные перейдут
+    в следующую, поэтому небольшие данные занимают только первые плитки.
+    Пиксели заголовка (reserved) в плитках не используются.
+
+    Raises:
+        ValueError: Данные не помещаются в изображение
+    """
+    reserved = np.asarray(reserved)
+    reserved_tiles = grid.tile_of(reserved)
+    segments = []
+    offset = 0
+    for tile in range(grid.count):
+        if offset >= bit_count:
+            break
+        tile_reserved = reserved[reserved_tiles == tile]
+        capacity = (grid.pixel_count(tile) - len(tile_reserved)) * bits_per_pixel
+        count = min(capacity, bit_count - offset)
+        if count <= 0:
+            continue
+        segments.append(TileSegment(tile, offset, count, -(-count // bits_per_pixel), tile_reserved))
+        offset += count
+    if offset < bit_count:
+        raise ValueError(f"Недостаточно пикселей: нужно {bit_count} бит, доступно {offset}")
+    return segments
+
+
+def segment_indices(grid: TileGrid, permutation, segment: TileSegment) -> np.ndarray:
+    """
+    Плоские индексы пикселей части данных в порядке перестановки плитки
+
+    Берется префикс перестановки плитки без пикселей заголовка, поэтому
+    индексы вычисляются за O(K) от размера части, а не изображения.
+
+    Args:
+        grid: Разбиение изображения
+        permutation: Перестановка плитки (tile_permutation, возможно из кэша)
+        segment: Часть данных в этой плитке
+    """
+    size = grid.pixel_count(segment.tile)
+    local = permutation.take(0, min(size, segment.pixel_count + len(segment.reserved)))
+    indices = grid.to_global(segment.tile, local)
+    if len(segment.reserved):
+        indices = indices[~np.isin(indices, segment.reserved)]
+    return indices[:segment.pixel_count]